@@ -1,31 +1,94 @@
-import instructor
-from groq import Groq
-from pydantic import BaseModel
-from typing import Literal
-import os
-from dotenv import load_dotenv
+import argparse
+import json
+import time
+from pydantic import Field
+from typing import Literal, Optional
+from core import clients
+from core.cache import llm_cache
+from core.config import env
+from core.fastpath import FastRouter
+from core.history import ConversationHistory, llm_summarizer
+from core.models import is_confirmation, model_router
+from core.prompts import register
+from core.repair import Repairable, repairs
+from core.remote import chat_loop
+from core.scheduler import scheduler
+from core.streaming import new_text, streamable
+from core.tenants import DEFAULT_USER, check_user
+from core.tracing import span
+from core.usage import UsageCounter
 
-# client intialization
-groq = Groq(api_key=os.getenv("GROQ_API_KEY"))
-client = instructor.from_groq(groq, instructor.Mode.JSON)
+# the Groq clients are built on the first LLM call (core/clients.py)
+history = ConversationHistory(summarize=llm_summarizer())
+usage = UsageCounter()
+router = FastRouter()
 
+# below this the small model's label is checked again by the next tier
+MIN_CONFIDENCE = float(env("MODEL_MIN_CONFIDENCE", "0.7"))
 
-load_dotenv()
 
-messages = []
+class QueryValidator(Repairable):
+    label: Literal["low_context", "restrict_action", "response_action"]
+    response: str
+    confidence: float = Field(1.0, description="How sure you are of the label, from 0 to 1")
+
+
+class LowContextResponse(Repairable):
+    res: str
+
+
+def structured_call(stage, response_model, messages, task="respond", accept=None):
+    """Cached structured LLM call, usage is only counted when the model is actually hit.
+
+    The model comes from the `task`'s tiers in core/models.py.
+    """
+
+    def create(**kwargs):
+        res, completion = clients.structured().chat.completions.create_with_completion(max_retries=scheduler.retrying(), **kwargs)
+        usage.record(stage, completion)
+        return res
+
+    with usage.track(stage), span(stage, task=task):
+        return llm_cache.cached_call(
+            model_router.route(task, create, accept),
+            model=model_router.model_name(task),
+            response_model=response_model,
+            messages=messages,
+        )
+
 
+def streamed_call(stage, response_model, messages, task="respond"):
+    """Streaming twin of `structured_call`, yields partial `response_model` objects."""
+    start = time.perf_counter()
+    with usage.track(stage), span(stage, task=task) as s:
+        for i, partial in enumerate(
+            llm_cache.cached_stream(
+                model_router.route_stream(task, lambda **kw: clients.structured().chat.completions.create_partial(**kw)),
+                model=model_router.model_name(task),
+                response_model=response_model,
+                messages=messages,
+            )
+        ):
+            if i == 0:
+                usage.first_token(stage, time.perf_counter() - start)
+                s.set(first_token_ms=(time.perf_counter() - start) * 1000)
+            yield partial
+
+
+class TurnResponse(Repairable):
+    """Single-call result: the label plus whatever the user should see."""
 
-class QueryValidator(BaseModel):
     label: Literal["low_context", "restrict_action", "response_action"]
     response: str
+    follow_up_question: Optional[str] = None
 
 
-class LowContextResponse(BaseModel):
-    res: str
+StreamedTurnResponse = streamable(TurnResponse)
 
 
-def handle_low_context(input_prompt):
-    system_prompt = f"""
+LOW_CONTEXT_PROMPT = register(
+    "handle_low_context",
+    """
    You are an intelligent expense-tracking assistant. Your job is to identify incomplete user inputs and ask relevant follow-up questions to gather full expense details.
 
 ### Objective:
@@ -38,26 +101,26 @@ If the user's input lacks key details (like amount and item_name ), ask a clarif
 3. **Use Perivious Conversation** → To understand full context you can use previous chat as well and ask for confirmation if you get deatils for tools
 
 #### User's recent input:
-{input_prompt}
+The last user message.
 
 Generate a relevant question to complete the intent.
-    """
-    res = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        response_model=LowContextResponse,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt},
-        ],
-    )
+    """,
+)
+
 
-    messages.append({"role":"assitant","content":res})
+def handle_low_context(input_prompt):
+    res = structured_call(
+        "handle_low_context",
+        LowContextResponse,
+        [*history.messages(LOW_CONTEXT_PROMPT), {"role": "user", "content": input_prompt}],
+    )
 
     return res
 
 
-def query_validator(prompt) -> QueryValidator:
-    system_prompt = """
+QUERY_VALIDATOR_PROMPT = register(
+    "query_validator",
+    """
 You are an advanced NLP expert named Ritesh. Your task is to classify user queries in an expense tracker chat system into one of the following categories:
 
 1. **low_context** → The query lacks details. Ask a follow-up question to complete it.
@@ -71,32 +134,198 @@ You are an advanced NLP expert named Ritesh. Your task is to classify user queri
    - Example: "Hi" → "Hello! How can I help you track your expenses?"  
 
 Additionally, always provide a relevant response in **response_action** queries and a clarifying question for **low_context** queries.
-"""
-
-    res = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        response_model=QueryValidator,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt},
-        ],
+Set `confidence` to how sure you are of the label, from 0 to 1.
+""",
+)
+
+
+def query_validator(prompt) -> QueryValidator:
+    # labelling is cheap, the small model does it unless it isn't sure
+    res = structured_call(
+        "query_validator",
+        QueryValidator,
+        [*history.messages(QUERY_VALIDATOR_PROMPT), {"role": "user", "content": prompt}],
+        task="classify",
+        accept=lambda res: res.confidence >= MIN_CONFIDENCE,
     )
 
     return res
 
 
-while True:
-    prompt = input("User : ")
-    messages.append({'role':'user','content':prompt})
-    res = query_validator(prompt)
+CLASSIFY_PROMPT = register(
+    "classify_and_respond",
+    """
+You are an advanced NLP expert named Ritesh, working as an intelligent expense-tracking assistant. Classify the user's query in an expense tracker chat system and answer it in the same step.
+
+### Labels:
+1. **low_context** → The query lacks key details (like amount and item_name).
+   - Put a natural, conversational clarifying question in `follow_up_question`.
+   - Example: "I bought jeans from Zara." → "How much did you spend?"
+   - Example: "Dinner expense" → "How much did you spend and when?"
+
+2. **restrict_action** → The query involves a restricted or invalid action.
+   - Example: "Delete all expenses!"
+
+3. **response_action** → The query is clear and should be answered directly.
+   - Example: "Get my expenses from last week." → Provide the requested data.
+   - Example: "Hi" → "Hello! How can I help you track your expenses?"
+
+Always fill `response` with what the user should read. For **low_context** it is the same text as `follow_up_question`.
+""",
+)
+
+
+def classify_and_respond(prompt, stream=False) -> TurnResponse:
+    """Classifies the query and writes the reply (or follow-up question) in one call.
+
+    With `stream=True` it returns an iterator of partial TurnResponse objects.
+    """
+    messages = [*history.messages(CLASSIFY_PROMPT), {"role": "user", "content": prompt}]
+    task = "confirm" if is_confirmation(prompt) else "respond"
+    if stream:
+        return streamed_call("classify_and_respond", StreamedTurnResponse, messages, task)
+
+    res = structured_call("classify_and_respond", TurnResponse, messages, task)
+
+    return res
+
+
+def fast_reply(prompt):
+    """Canned reply for greetings without an LLM call (this agent has no tools for the other intents)."""
+    start = time.perf_counter()
+    route = router.route(prompt)
+    if route is None or route.intent != "greeting":
+        return None
+
+    history.append("user", prompt)
+    history.append("assistant", route.reply)
+    router.stats.record("fast", time.perf_counter() - start, route.intent)
+    return route.reply
+
+
+def respond(prompt, mode="single") -> str:
+    """Runs one user turn and returns the assistant's reply.
+
+    `mode="single"` uses one structured call, `mode="two-stage"` keeps the
+    original classify-then-ask pipeline for comparison.
+    """
+    usage.turns += 1
+
+    with span("turn", mode=mode) as s:
+        reply = fast_reply(prompt)
+        if reply:
+            s.set(path="fast")
+            return reply
+
+        s.set(path="llm")
+        with router.timed("llm"):
+            reply = _llm_reply(prompt, mode)
 
-   
+    history.append("user", prompt)
+    history.append("assistant", reply)
+    return reply
 
-    if res.label == "low_context":
-        context = handle_low_context(prompt)
-        messages.append({'role':'assistant','content': context.res})
-        print("🤖 : ", context.res)
 
+def _llm_reply(prompt, mode) -> str:
+    if mode == "single":
+        res = classify_and_respond(prompt)
+        if res.label == "low_context" and res.follow_up_question:
+            reply = res.follow_up_question
+        else:
+            reply = res.response
     else:
-        print("🤖 : ", res.response)
-        messages.append({'role':'assistant','content': res.response})
+        res = query_validator(prompt)
+        if res.label == "low_context":
+            reply = handle_low_context(prompt).res
+        else:
+            reply = res.response
+    return reply
+
+
+def respond_stream(prompt):
+    """Single-call `respond` that yields the reply text as it is generated."""
+    usage.turns += 1
+
+    reply = fast_reply(prompt)
+    if reply:
+        yield reply
+        return
+
+    reply = ""
+    with router.timed("llm"), span("turn", mode="single", path="llm", stream=True):
+        for res in classify_and_respond(prompt, stream=True):
+            delta = new_text(reply, res.response)
+            if delta:
+                reply += delta
+                yield delta
+
+    history.append("user", prompt)
+    history.append("assistant", reply)
+
+
+def read_transcript(path):
+    """Yields user turns from a .jsonl transcript ({"role", "content"} per line) or a plain text file."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                turn = json.loads(line)
+                if turn.get("role", "user") == "user":
+                    yield turn["content"]
+            else:
+                yield line
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expense assistant CLI")
+    parser.add_argument(
+        "--mode",
+        choices=["single", "two-stage"],
+        default=env("AGENT_MODE", "single"),
+        help="single structured call per turn, or the old classify-then-ask pipeline",
+    )
+    parser.add_argument("--replay", help="run the user turns of a recorded transcript")
+    parser.add_argument(
+        "--no-stream", action="store_true", help="wait for the full reply instead of streaming it"
+    )
+    parser.add_argument(
+        "--service",
+        default=env("AGENT_SERVICE_URL"),
+        help="chat with a running `python -m core.service` instead of running the agent here",
+    )
+    parser.add_argument("--user", default=env("AGENT_USER", DEFAULT_USER), help="user id for --service")
+    args = parser.parse_args()
+    if args.service:
+        chat_loop(args.service, check_user(args.user))
+        raise SystemExit
+    stream = args.mode == "single" and not args.no_stream and env("LLM_STREAM", "1") == "1"
+
+    def turn(prompt):
+        if not stream:
+            print("🤖 : ", respond(prompt, args.mode))
+            return
+        print("🤖 : ", end="", flush=True)
+        for delta in respond_stream(prompt):
+            print(delta, end="", flush=True)
+        print()
+
+    try:
+        if args.replay:
+            for prompt in read_transcript(args.replay):
+                print("User : ", prompt)
+                turn(prompt)
+        else:
+            while True:
+                turn(input("User : "))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        print(f"\n[{args.mode}]")
+        print(usage.summary())
+        print(router.stats.summary())
+        print(model_router.summary())
+        print(scheduler.summary())
+        print("cache:", llm_cache.stats)
+        print(repairs.summary())
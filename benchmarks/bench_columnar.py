@@ -0,0 +1,56 @@
+"""
+Memory per row and query times of ColumnarExpenseStore vs the dict-based ExpenseStore.
+
+Usage: python -m benchmarks.bench_columnar [rows ...]   (default: 10000 100000 1000000)
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from benchmarks.bench_store import generate, timed
+from tools.columnar import ColumnarExpenseStore, np
+from tools.store import ExpenseStore
+
+
+def build(cls, rows):
+    gc.collect()
+    tracemalloc.start()
+    store = cls()
+    for amount, category, date, note in rows:
+        store.add(amount, category, date, note)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return store, size
+
+
+def run(n):
+    rows = list(generate(n))
+    old, old_bytes = build(ExpenseStore, rows)
+    new, new_bytes = build(ColumnarExpenseStore, rows)
+
+    print(f"\n{n:,} rows (numpy: {'yes' if np is not None else 'no'})")
+    print(f"{'bytes per row':<28}{old_bytes / n:>12.0f}{new_bytes / n:>14.0f}{old_bytes / new_bytes:>9.1f}x")
+
+    queries = {
+        "read(filter='coffee')": lambda s: s.read("coffee"),
+        "read(date_range=1 week)": lambda s: s.read(None, ("2022-03-01", "2022-03-07")),
+        "read('cab', 1 month)": lambda s: s.read("cab", ("2023-06-01", "2023-06-30")),
+        "query(Food, 2023, page)": lambda s: s.query("Food", "2023-01-01", "2023-12-31", 50),
+        "summary(by category)": lambda s: s.summary(),
+        "summary(Food, 2022)": lambda s: s.summary("category", "Food", "2022-01-01", "2022-12-31"),
+    }
+    print(f"{'operation':<28}{'dicts (ms)':>12}{'columns (ms)':>14}{'speedup':>10}")
+    for name, query in queries.items():
+        repeat = 3 if n >= 1_000_000 else 10
+        old_ms, old_res = timed(lambda: query(old), repeat)
+        new_ms, new_res = timed(lambda: query(new), repeat)
+        if name.startswith("read"):
+            assert [e["id"] for e in old_res] == [e["id"] for e in new_res], name
+        print(f"{name:<28}{old_ms:>12.3f}{new_ms:>14.3f}{old_ms / max(new_ms, 1e-9):>9.1f}x")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,87 @@
+"""
+Onboarding a user from a bank statement: tools/importer.py vs one add per row.
+
+Writes a synthetic statement CSV (`rows` lines, a few years of history, a
+mix of known and unknown merchants) and imports it into a fresh SQLite
+store with the pipeline, against a mock Groq server for the categories.
+The baseline adds the same rows one `add` (= one commit) at a time, as the
+add_expense tool does, and doesn't count the LLM turn each of those would
+need. A second import of the same file shows the cost of the dedupe pass.
+
+Usage: python -m benchmarks.bench_import [rows ...] [--latency 300]   (default: 20000 100000)
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.mock_groq import MockGroq
+
+MERCHANTS = ["UPI/SWIGGY/{}", "POS {} STARBUCKS MUMBAI", "UBER TRIP {}", "AMAZON PAY {}", "NETFLIX.COM",
+             "ELECTRICITY BILL {}", "APOLLO PHARMACY {}", "BIGBASKET ORDER {}"]
+UNKNOWN = ["ACME WIDGETS {}", "KRISHNA TRADERS {}", "SHREE ENTERPRISES", "BLUE TOKAI {}", "RAJ & SONS"]
+
+
+def write_statement(path: str, n: int):
+    rng = random.Random(42)
+    day = date(2020, 1, 1)
+    with open(path, "w", newline="") as f:
+        f.write("Account statement\nDate,Narration,Withdrawal Amt.,Deposit Amt.\n")
+        for i in range(n):
+            day += timedelta(days=rng.random() < 0.3)
+            if i % 40 == 0:
+                f.write(f"{day:%d/%m/%Y},SALARY,,85000.00\n")
+                continue
+            # a long tail of unknown merchants, like a real statement
+            pool = UNKNOWN if rng.random() < 0.1 else MERCHANTS
+            name = rng.choice(pool).format(rng.randint(1, 40 if pool is UNKNOWN else 9999))
+            f.write(f'{day:%d/%m/%Y},{name},"{rng.uniform(20, 5000):,.2f}",\n')
+
+
+def run(n: int, tmp: str):
+    from core.tenants import as_user
+    from tools.importer import StoreSink, import_expenses, normalize, read_csv
+    from tools.sqlite_store import SQLiteExpenseStore
+    from tools.tenants import TenantStores
+
+    path = os.path.join(tmp, f"statement-{n}.csv")
+    write_statement(path, n)
+
+    store = SQLiteExpenseStore(os.path.join(tmp, f"one-by-one-{n}.db"))
+    rows = [e for e in (normalize(raw) for raw in read_csv(open(path, newline=""))) if e]
+    start = time.perf_counter()
+    for row in rows:
+        store.add(**{**row, "category": row["category"] or "Other"})
+    single = time.perf_counter() - start
+    store.close()
+
+    tenants = TenantStores(1, "sqlite", directory=os.path.join(tmp, f"import-{n}"))
+    with as_user("bench"):
+        first = import_expenses(open(path, newline=""), StoreSink(tenants))
+        again = import_expenses(open(path, newline=""), StoreSink(tenants))
+    tenants.close()
+
+    print(f"\n{n:,} statement lines, {len(rows):,} expenses")
+    print(f"one add per row     : {single:8.2f}s ({len(rows) / single:,.0f} rows/s), no categories")
+    print(f"import              : {first.seconds:8.2f}s  {first.summary()}")
+    print(f"import again        : {again.seconds:8.2f}s  {again.summary()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("rows", nargs="*", type=int, default=[20_000, 100_000])
+    parser.add_argument("--latency", type=float, default=300, help="mock LLM latency in ms")
+    args = parser.parse_args()
+
+    groq = MockGroq(latency=args.latency / 1000).start()
+    os.environ["GROQ_BASE_URL"] = groq.url
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ["TRACE_EXPORT"] = "none"
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.rows:
+            run(size, tmp)
@@ -0,0 +1,104 @@
+"""
+Per-turn request preparation: rebuilding prompts and tool schemas every call
+(the old way) vs the prebuilt ones from core/prompts.py.
+
+Also reports the tokens of static prefix sent per request and how much of
+it stays byte-identical across turns, which is what provider-side prompt
+caching can reuse.
+
+Usage: python -m benchmarks.bench_prompts [turns]   (default: 2000)
+"""
+
+import copy
+import os
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "bench")  # clients are created at import, no request is made
+
+import agents
+import chatbot
+from core import agent
+from core.history import estimate_tokens
+from core.prompts import render
+
+TURNS = ["coffee 80", "I bought jeans from Zara", "2000 rs", "show my travel expenses", "thanks!"]
+
+
+# The old code built the schemas as dict literals on every call, deepcopy stands in for that.
+def old_tracker_request(prompt):
+    # main.py: tool_schema rebuilt and str()-ed into the prompt on every rerun
+    schema = copy.deepcopy(agent.tool_schema)
+    system = agent.system_prompt.replace(render(agent.tool_schema), str(schema))
+    return system + prompt
+
+
+def new_tracker_request(prompt):
+    return agent.system_prompt + prompt
+
+
+def old_chatbot_request(prompt):
+    # chatbot.py: prompt string and the whole tools list built inside call_llm
+    tools = copy.deepcopy(chatbot.TOOLS)
+    return tools, chatbot.SYSTEM_PROMPT + prompt
+
+
+def new_chatbot_request(prompt):
+    return chatbot.TOOLS, chatbot.SYSTEM_PROMPT + prompt
+
+
+def old_low_context_request(prompt):
+    # agents.py: the user's input was interpolated into the system prompt
+    return agents.LOW_CONTEXT_PROMPT.replace("The last user message.", prompt) + prompt
+
+
+def new_low_context_request(prompt):
+    return agents.LOW_CONTEXT_PROMPT + prompt
+
+
+def timed(build, n):
+    start = time.perf_counter()
+    for i in range(n):
+        build(TURNS[i % len(TURNS)])
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def payload(request) -> str:
+    """What goes over the wire: tools are serialized as JSON by the client either way."""
+    if isinstance(request, tuple):
+        tools, text = request
+        return render(tools) + text
+    return request
+
+
+def shared_prefix(build):
+    requests = [payload(build(prompt)) for prompt in TURNS]
+    first = requests[0]
+    size = min(len(r) for r in requests)
+    for other in requests[1:]:
+        size = min(size, next((i for i, (a, b) in enumerate(zip(first, other)) if a != b), size))
+    return size
+
+
+def run(n):
+    cases = [
+        ("main.py / core.agent", old_tracker_request, new_tracker_request),
+        ("chatbot.call_llm", old_chatbot_request, new_chatbot_request),
+        ("agents.handle_low_context", old_low_context_request, new_low_context_request),
+    ]
+    print(f"{'request':<28}{'prep us/turn':>22}{'static tokens':>18}{'cacheable prefix':>24}")
+    for name, old, new in cases:
+        old_us, new_us = timed(old, n), timed(new, n)
+        old_tokens = estimate_tokens(payload(old("")))
+        new_tokens = estimate_tokens(payload(new("")))
+        old_prefix = estimate_tokens(payload(old(""))[: shared_prefix(old)])
+        new_prefix = estimate_tokens(payload(new(""))[: shared_prefix(new)])
+        print(
+            f"{name:<28}{old_us:>10.1f} -> {new_us:>7.1f}"
+            f"{old_tokens:>9} -> {new_tokens:>5}"
+            f"{old_prefix:>13} -> {new_prefix:>7}"
+        )
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
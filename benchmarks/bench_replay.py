@@ -0,0 +1,233 @@
+"""
+Replays recorded conversations through the agents against local mocks, no network needed.
+
+Each conversation in the corpus (JSONL, {"id", "turns": [...]}) is run
+through every target with a mock Groq server (benchmarks/mock_groq.py) and
+the local expense API (tools/server.py) standing in for the real services:
+
+    agents-single      agents.respond(mode="single")
+    agents-two-stage   agents.respond(mode="two-stage")
+    chatbot            chatbot.py's turn: fast path or call_llm + tools
+    main               core.agent.ExpenseAgent.turn (main.py's get_response path)
+    main-stream        the same with streaming
+
+It reports throughput, turn latency percentiles, and LLM calls, tokens and
+tool calls per turn. Save a run with --save and compare later runs with
+--baseline to fail (exit 1) when calls per turn or p95 latency regress.
+What the numbers rest on (the fast path turning down deletes and questions,
+cache hits and misses, amount and date coercion, the store backends giving
+the same answers) is checked on its own by `python -m pytest tests`.
+
+Usage: python -m benchmarks.bench_replay [--latency 50] [--repeat 3] [--concurrency 4] [--targets main,chatbot]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_groq import MockGroq
+from tools.server import serve_in_background
+from tools.store import ExpenseStore
+
+CORPUS = os.path.join(os.path.dirname(__file__), "conversations.jsonl")
+TARGETS = ["agents-single", "agents-two-stage", "chatbot", "main", "main-stream"]
+
+
+def load_corpus(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class SpanCounter:
+    """Tracing exporter that only counts spans by name prefix."""
+
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        prefix = span.name.split(".")[0]
+        with self._lock:
+            self.counts[prefix] = self.counts.get(prefix, 0) + 1
+
+    def close(self):
+        pass
+
+
+def start_mocks(latency: float, chunk_delay: float):
+    """Starts both mocks and points the clients at them; must run before the agents are imported."""
+    groq = MockGroq(latency=latency, chunk_delay=chunk_delay).start()
+    api = serve_in_background(port=0, store=ExpenseStore(), quiet=True)
+
+    os.environ["GROQ_BASE_URL"] = groq.url
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ["EXPENSE_API_URL"] = f"http://127.0.0.1:{api.server_port}"
+    os.environ["EXPENSE_STORE"] = "memory"
+    os.environ["TRACE_EXPORT"] = "none"
+    # the mock has no rate limits, don't pace against the real ones
+    os.environ.setdefault("GROQ_RPM", "1000000")
+    os.environ.setdefault("GROQ_TPM", "1000000000")
+    return groq, api
+
+
+def conversation_runner(target: str):
+    """Returns run(turns) -> list of per-turn seconds for `target`."""
+    if target.startswith("agents"):
+        import agents
+        from core.history import ConversationHistory
+
+        mode = target.split("-", 1)[1]
+
+        def run(turns):
+            agents.history = ConversationHistory()  # fresh conversation
+            times = []
+            for prompt in turns:
+                start = time.perf_counter()
+                agents.respond(prompt, mode)
+                times.append(time.perf_counter() - start)
+            return times
+
+        return run
+
+    if target == "chatbot":
+        import chatbot
+
+        def run(turns):
+            times = []
+            for prompt in turns:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    route = chatbot.router.route(prompt)
+                    if route:
+                        chatbot.fast_reply(route)
+                    else:
+                        chatbot.chat(prompt, stream=False)
+                times.append(time.perf_counter() - start)
+            return times
+
+        return run
+
+    from core.agent import ExpenseAgent
+
+    agent = ExpenseAgent()
+    stream = target == "main-stream"
+
+    def run(turns):
+        session_id = agent.new_session()
+        times = []
+        for prompt in turns:
+            start = time.perf_counter()
+            for _ in agent.turn(session_id, prompt, stream=stream):
+                pass
+            times.append(time.perf_counter() - start)
+        return times
+
+    return run
+
+
+def bench(target: str, corpus: list, groq: MockGroq, spans: SpanCounter, repeat: int, concurrency: int) -> dict:
+    from core.cache import llm_cache
+    from core.tracing import percentile
+
+    run = conversation_runner(target)
+    # the module-level agents keep one conversation at a time
+    workers = concurrency if target.startswith("main") else 1
+    conversations = [c["turns"] for c in corpus] * repeat
+
+    llm_cache.clear()
+    groq.reset()
+    spans.counts.clear()
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(workers) as pool:
+        times = [t for result in pool.map(run, conversations) for t in result]
+    wall = time.perf_counter() - start
+
+    times = sorted(t * 1000 for t in times)
+    turns = len(times)
+    return {
+        "target": target,
+        "turns": turns,
+        "seconds": wall,
+        "turns_per_s": turns / wall,
+        "p50_ms": percentile(times, 50),
+        "p95_ms": percentile(times, 95),
+        "p99_ms": percentile(times, 99),
+        "llm_calls_per_turn": groq.calls / turns,
+        "tokens_per_turn": (groq.prompt_tokens + groq.completion_tokens) / turns,
+        "tool_calls_per_turn": spans.counts.get("tool", 0) / turns,
+    }
+
+
+def regressions(results: list, baseline: list, tolerance: float) -> list:
+    previous = {r["target"]: r for r in baseline}
+    found = []
+    for result in results:
+        old = previous.get(result["target"])
+        if not old:
+            continue
+        for key in ("llm_calls_per_turn", "tool_calls_per_turn", "tokens_per_turn", "p95_ms"):
+            if result[key] > old[key] * (1 + tolerance) + 1e-9:
+                found.append(f"{result['target']}: {key} {old[key]:.2f} -> {result[key]:.2f}")
+    return found
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline replay benchmark")
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--latency", type=float, default=50, help="mock LLM latency per call, ms")
+    parser.add_argument("--chunk-delay", type=float, default=2, help="mock delay between streamed chunks, ms")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the corpus this many times")
+    parser.add_argument("--concurrency", type=int, default=1, help="parallel conversations (main targets)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs the baseline")
+    args = parser.parse_args(argv)
+
+    groq, api = start_mocks(args.latency / 1000, args.chunk_delay / 1000)
+
+    from core.tracing import tracer
+
+    spans = SpanCounter()
+    tracer.exporters = [spans]
+
+    corpus = load_corpus(args.corpus)
+    results = []
+    print(
+        f"{'target':<18}{'turns':>6}{'turns/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'llm/turn':>10}{'tok/turn':>10}{'tools/turn':>11}"
+    )
+    for target in args.targets.split(","):
+        r = bench(target, corpus, groq, spans, args.repeat, args.concurrency)
+        results.append(r)
+        print(
+            f"{target:<18}{r['turns']:>6}{r['turns_per_s']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+            f"{r['p99_ms']:>9.1f}{r['llm_calls_per_turn']:>10.2f}{r['tokens_per_turn']:>10.0f}"
+            f"{r['tool_calls_per_turn']:>11.2f}"
+        )
+
+    api.shutdown()
+    groq.shutdown()
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print("REGRESSION", line)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""
+Ranked search (tools/search.py) vs the substring scans of search_title/read.
+
+Prints, per query, the time of each and how many rows it hands back (what
+ends up in the LLM context), plus the cost of building the index.
+
+Usage: python -m benchmarks.bench_search [rows ...]   (default: 10000 100000)
+"""
+
+import sys
+import time
+
+from benchmarks.bench_store import generate, timed
+from tools.store import ExpenseStore
+
+QUERIES = ["coffee", "cof", "grocries", "dinner team", "uber offce", "birthday"]
+
+
+def run(n):
+    store = ExpenseStore()
+    for amount, category, date, note in generate(n):
+        store.add(amount, category, date, note, title=note.split()[0])
+
+    start = time.perf_counter()
+    store.search("warmup")
+    print(f"\n{n:,} rows, index built in {(time.perf_counter() - start) * 1000:.0f} ms")
+    print(f"{'query':<14}{'scan (ms)':>11}{'rows':>9}{'ranked (ms)':>13}{'rows':>6}  top hit")
+    for query in QUERIES:
+        scan_ms, scanned = timed(lambda: store.read(query), 5)
+        ranked_ms, ranked = timed(lambda: store.search(query, 10), 5)
+        top = ranked[0]["note"] if ranked else "-"
+        print(f"{query:<14}{scan_ms:>11.2f}{len(scanned):>9}{ranked_ms:>13.2f}{len(ranked):>6}  {top}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,45 @@
+"""
+Insert throughput of SQLiteExpenseStore with and without write batching.
+
+Usage: python -m benchmarks.bench_sqlite [rows]   (default: 5000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_store import generate
+from tools.sqlite_store import SQLiteExpenseStore
+
+
+def run(n):
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = list(generate(n))
+
+        store = SQLiteExpenseStore(os.path.join(tmp, "single.db"))
+        start = time.perf_counter()
+        for amount, category, date, note in rows:
+            store.add(amount, category, date, note)
+        single = time.perf_counter() - start
+        store.close()
+
+        store = SQLiteExpenseStore(os.path.join(tmp, "batched.db"))
+        start = time.perf_counter()
+        with store.batch():
+            for amount, category, date, note in rows:
+                store.add(amount, category, date, note)
+        batched = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = store.read("cab", ("2023-06-01", "2023-06-30"))
+        query_ms = (time.perf_counter() - start) * 1000
+        store.close()
+
+    print(f"{n:,} inserts, one commit each : {single:8.3f}s ({n / single:,.0f} rows/s)")
+    print(f"{n:,} inserts, one transaction : {batched:8.3f}s ({n / batched:,.0f} rows/s)")
+    print(f"read('cab', 1 month)           : {query_ms:8.3f}ms ({len(found)} rows)")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
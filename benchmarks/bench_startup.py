@@ -0,0 +1,109 @@
+"""
+Import time of the entry points, from `python -X importtime` in a fresh interpreter.
+
+groq, instructor (with openai), httpx and requests are only needed once the
+first LLM or tool call is made, so importing an entry point must not load
+them; a target that does fails the run. Each target is imported --repeat
+times and the median cumulative time is reported.
+
+Save a run with --save and compare later runs with --baseline, or set an
+absolute budget with --max-ms, to fail (exit 1) when startup regresses.
+tests/test_startup.py runs the same check in the test suite.
+
+Usage: python -m benchmarks.bench_startup [--repeat 5] [--max-ms 500] [--targets agents,chatbot]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+TARGETS = ["agents", "chatbot", "core.agent", "core.service"]
+
+# loaded on first use, never at import
+DEFERRED = ["groq", "instructor", "openai", "httpx", "requests"]
+
+# prints the deferred modules that really ran (a LazyLoader module that
+# hasn't been touched yet is still a _LazyModule)
+CHECK = (
+    "import json, sys, {target}; "
+    "print(json.dumps([m for m in {deferred!r} if m in sys.modules "
+    "and type(sys.modules[m]).__name__ != '_LazyModule']))"
+)
+
+
+def import_once(target: str) -> tuple:
+    """(cumulative import ms of `target`, deferred modules it loaded)"""
+    env = dict(os.environ, GROQ_API_KEY=os.environ.get("GROQ_API_KEY", "x"), TRACE_EXPORT="none")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHECK.format(target=target, deferred=DEFERRED)],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    # "import time:  self [us] | cumulative | imported package"
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == target:
+            return int(parts[1]) / 1000, json.loads(proc.stdout.splitlines()[-1])
+    raise RuntimeError(f"no importtime line for {target}")
+
+
+def bench(target: str, repeat: int) -> dict:
+    times, loaded = [], []
+    for _ in range(repeat):
+        ms, loaded = import_once(target)
+        times.append(ms)
+    return {"target": target, "median_ms": statistics.median(times), "min_ms": min(times), "loaded": loaded}
+
+
+def regressions(results: list, baseline: list, tolerance: float, max_ms: float = None) -> list:
+    previous = {r["target"]: r for r in baseline}
+    found = []
+    for result in results:
+        if result["loaded"]:
+            found.append(f"{result['target']}: imports {', '.join(result['loaded'])} at startup")
+        if max_ms and result["median_ms"] > max_ms:
+            found.append(f"{result['target']}: {result['median_ms']:.0f} ms over the {max_ms:.0f} ms budget")
+        old = previous.get(result["target"])
+        if old and result["median_ms"] > old["median_ms"] * (1 + tolerance):
+            found.append(f"{result['target']}: median_ms {old['median_ms']:.0f} -> {result['median_ms']:.0f}")
+    return found
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Entry point import times")
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--max-ms", type=float, help="fail when a target's median import time is above this")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved by --save")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed regression vs the baseline")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'target':<16}{'median ms':>11}{'min ms':>9}  deferred modules loaded")
+    for target in args.targets.split(","):
+        r = bench(target, args.repeat)
+        results.append(r)
+        print(f"{target:<16}{r['median_ms']:>11.1f}{r['min_ms']:>9.1f}  {', '.join(r['loaded']) or '-'}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    found = regressions(results, baseline, args.tolerance, args.max_ms)
+    for line in found:
+        print("REGRESSION", line)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Compares the old list-scan expense functions from chatbot.py with ExpenseStore.
+
+Usage: python -m benchmarks.bench_store [rows ...]   (default: 10000 100000 1000000)
+"""
+
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from tools.store import ExpenseStore
+
+CATEGORIES = ["Food", "Travel", "Shopping", "Rent", "Health", "Fun", "Bills", "Gifts"]
+NOTES = ["lunch", "dinner with team", "uber to office", "jeans from zara", "coffee",
+         "groceries", "movie night", "electricity bill", "cab home", "birthday gift"]
+
+
+# -- old implementation (list of dicts, linear scans) ------------------------
+
+
+class ListStore:
+    def __init__(self):
+        self.rows = []
+        self.counter = 1
+
+    def add(self, amount, category, date, note):
+        self.rows.append({"id": str(self.counter), "amount": amount,
+                          "category": category, "date": date, "note": note})
+        self.counter += 1
+
+    def update(self, expense_id, **fields):
+        for expense in self.rows:
+            if expense["id"] == expense_id:
+                expense.update({k: v for k, v in fields.items() if v is not None})
+                return expense
+        return None
+
+    def read(self, filter=None, date_range=None):
+        filtered = self.rows
+        if filter:
+            filtered = [exp for exp in self.rows
+                        if filter.lower() in exp["category"].lower()
+                        or filter.lower() in exp["note"].lower()]
+        if date_range:
+            start_date, end_date = date_range
+            filtered = [exp for exp in filtered if start_date <= exp["date"] <= end_date]
+        return filtered
+
+    def delete(self, expense_id):
+        self.rows = [exp for exp in self.rows if exp["id"] != expense_id]
+
+
+# -- benchmark -----------------------------------------------------------------
+
+
+def generate(n, seed=7):
+    rnd = random.Random(seed)
+    start = date(2020, 1, 1)
+    for _ in range(n):
+        day = start + timedelta(days=rnd.randrange(5 * 365))
+        yield (round(rnd.uniform(10, 5000), 2), rnd.choice(CATEGORIES),
+               day.isoformat(), rnd.choice(NOTES))
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def run(n):
+    old, new = ListStore(), ExpenseStore()
+    for row in generate(n):
+        old.add(*row)
+        new.add(*row)
+
+    rnd = random.Random(n)
+    ids = [str(rnd.randrange(1, n + 1)) for _ in range(20)]
+    queries = {
+        "read(filter='coffee')": lambda s: s.read("coffee"),
+        "read(filter='food')": lambda s: s.read("food"),
+        "read(date_range=1 week)": lambda s: s.read(None, ("2022-03-01", "2022-03-07")),
+        "read('cab', 1 month)": lambda s: s.read("cab", ("2023-06-01", "2023-06-30")),
+        "update x20": lambda s: [s.update(i, amount=1.0) for i in ids],
+    }
+
+    print(f"\n{n:,} rows")
+    print(f"{'operation':<28}{'list (ms)':>12}{'store (ms)':>12}{'speedup':>10}")
+    for name, query in queries.items():
+        repeat = 3 if n >= 1_000_000 else 10
+        old_ms, old_res = timed(lambda: query(old), repeat)
+        new_ms, new_res = timed(lambda: query(new), repeat)
+        if name.startswith("read"):
+            assert [e["id"] for e in old_res] == [e["id"] for e in new_res], name
+        print(f"{name:<28}{old_ms:>12.3f}{new_ms:>12.3f}{old_ms / max(new_ms, 1e-9):>9.1f}x")
+
+    delete_ids = ids[:5]
+    old_ms, _ = timed(lambda: [old.delete(i) for i in delete_ids], 1)
+    new_ms, _ = timed(lambda: [new.delete(i) for i in delete_ids], 1)
+    print(f"{'delete x5':<28}{old_ms:>12.3f}{new_ms:>12.3f}{old_ms / max(new_ms, 1e-9):>9.1f}x")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    for size in sizes:
+        run(size)
@@ -0,0 +1,259 @@
+"""
+Local stand-in for Groq's chat-completions endpoint, for offline benchmarks.
+
+Point a client at it with GROQ_BASE_URL=http://127.0.0.1:<port>. Replies
+are canned but follow the request:
+
+- instructor (JSON mode) requests get an object built from the json_schema
+  in the system prompt; known fields (label, tool_calls, res, ...) get
+  values derived from the last user message, the rest type defaults.
+- requests with `tools` get an add_expense / read_expense tool call when
+  the message looks like an expense, plain text otherwise.
+- `stream: true` is answered as server-sent event chunks.
+
+Run it on its own with:  python -m benchmarks.mock_groq --port 8081 --latency 200
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AMOUNT = re.compile(r"\d+(?:\.\d+)?")
+READ_WORDS = ("show", "list", "find", "search", "how much", "spent on", "expenses")
+
+
+def _last_user(messages: list) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user" and isinstance(message.get("content"), str):
+            return message["content"]
+    return ""
+
+
+def _expense(text: str):
+    """(item, amount) when the text looks like 'coffee 80', else None."""
+    amount = AMOUNT.search(text)
+    skip = ("rs", "i", "spent", "paid", "on", "for")
+    words = [w for w in re.findall(r"[a-zA-Z]+", text) if w.lower() not in skip]
+    if not amount or not words:
+        return None
+    return words[0].lower(), float(amount.group())
+
+
+def _is_read(text: str) -> bool:
+    text = text.lower()
+    return any(word in text for word in READ_WORDS)
+
+
+def _tool_calls(text: str) -> list:
+    expense = _expense(text)
+    if expense:
+        item, amount = expense
+        params = {"title": item, "amount": amount, "category": "Food"}
+        return [{"input_text": text, "tool_name": "add_expense", "tool_parameters": params}]
+    if _is_read(text):
+        return [{"input_text": text, "tool_name": "get_all_expenses", "tool_parameters": {}}]
+    return []
+
+
+def _label(text: str) -> str:
+    if "delete" in text.lower():
+        return "restrict_action"
+    if _expense(text) or _is_read(text) or len(text.split()) <= 2:
+        return "response_action"
+    return "low_context"
+
+
+# field name -> value for the last user message
+CANNED = {
+    "label": _label,
+    "role": lambda text: "assistant",
+    "content": lambda text: "Done, I've taken care of that." if _tool_calls(text) else "Sure, tell me more.",
+    "tool_calls": _tool_calls,
+    "response": lambda text: "Noted! Anything else?",
+    "follow_up_question": lambda text: "How much did you spend?" if _label(text) == "low_context" else None,
+    "res": lambda text: "Here is what I found in your expenses.",
+    "confidence": lambda text: 0.9,
+}
+
+
+def _default(schema: dict):
+    if "enum" in schema:
+        return schema["enum"][0]
+    return {"string": "ok", "number": 0, "integer": 0, "boolean": False, "array": [], "object": {}}.get(
+        schema.get("type"), None
+    )
+
+
+def _schema(messages: list):
+    """The json_schema instructor appends to the system prompt in JSON mode."""
+    system = messages[0].get("content", "") if messages else ""
+    start = system.find("json_schema:")
+    end = system.find("Make sure to return an instance", start)
+    if start < 0 or end < 0:
+        return None
+    return json.loads(system[start + len("json_schema:") : end])
+
+
+def structured_reply(schema: dict, text: str) -> dict:
+    return {
+        name: CANNED[name](text) if name in CANNED else _default(prop)
+        for name, prop in schema.get("properties", {}).items()
+    }
+
+
+def tool_reply(text: str) -> tuple:
+    """(content, tool_calls) in the raw chat-completion format."""
+    expense = _expense(text)
+    if expense:
+        item, amount = expense
+        args = {"amount": amount, "category": "Food", "note": item}
+        return None, [{"name": "add_expense", "arguments": args}]
+    if _is_read(text):
+        return None, [{"name": "read_expense", "arguments": {}}]
+    return "Sure, how can I help with your expenses?", []
+
+
+class MockGroq(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, chunk_delay: float = 0.0, chunk_size: int = 16):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.reset()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def reset(self):
+        with self.lock:
+            self.calls = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def count(self, prompt: str, completion: str):
+        with self.lock:
+            self.calls += 1
+            self.prompt_tokens += len(prompt) // 4 + 1
+            self.completion_tokens += len(completion) // 4 + 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            return self._json(404, {"error": {"message": "Not found"}})
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        messages = body.get("messages", [])
+        text = _last_user(messages)
+
+        schema = _schema(messages)
+        if schema is not None:
+            content, calls = json.dumps(structured_reply(schema, text)), []
+        elif body.get("tools"):
+            content, calls = tool_reply(text)
+        else:
+            content, calls = "Summary of the conversation so far.", []
+
+        tool_calls = [
+            {
+                "id": f"call_{i}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])},
+            }
+            for i, call in enumerate(calls)
+        ]
+        self.server.count(json.dumps(messages), (content or "") + json.dumps(tool_calls))
+        time.sleep(self.server.latency)
+
+        if body.get("stream"):
+            return self._stream(body, content, tool_calls)
+
+        prompt_tokens = len(json.dumps(messages)) // 4 + 1
+        completion_tokens = len(content or "") // 4 + 1
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        message = {"role": "assistant", "content": content}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        self._json(
+            200,
+            {
+                "id": "mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [
+                    {"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}
+                ],
+                "usage": usage,
+            },
+        )
+
+    def _stream(self, body: dict, content: str, tool_calls: list):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(delta, finish=None):
+            chunk = {
+                "id": "mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.server.chunk_delay)
+
+        size = self.server.chunk_size
+        for i in range(0, len(content or ""), size):
+            send({"content": content[i : i + size]})
+        for i, call in enumerate(tool_calls):
+            send({"tool_calls": [{"index": i, **call}]})
+        send({}, finish="tool_calls" if tool_calls else "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Groq chat-completions server")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0, help="ms before each reply")
+    parser.add_argument("--chunk-delay", type=float, default=0, help="ms between streamed chunks")
+    args = parser.parse_args()
+
+    server = MockGroq(args.port, args.latency / 1000, args.chunk_delay / 1000)
+    print(f"Mock Groq listening on {server.url} (GROQ_BASE_URL={server.url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
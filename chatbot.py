@@ -1,41 +1,59 @@
-from datetime import datetime
+import argparse
+from typing import Literal
 
-from groq import Groq
+from typing_extensions import Required, TypedDict
 
-import os
-from dotenv import load_dotenv
+from core import clients
+from core.cache import llm_cache
+from core.config import env
+from core.fastpath import FastRouter, format_expenses
+from core.models import is_confirmation, model_router
+from core.prompts import function_schema, openai_tools, register
+from core.remote import chat_loop
+from core.repair import check_arguments, repairs, tool_arguments
+from core.scheduler import scheduler
+from core.streaming import stream_events
+from core.tracing import record_usage, span
+from core.tenants import DEFAULT_USER, as_user, check_user, current_user
+from tools.memo import in_filters, in_period, in_search, tool_memo
+from tools.tenants import TenantStores
 
-# client intialization
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# One expense store per user, in-memory by default (EXPENSE_STORE=sqlite to persist).
+# The tools act for the user of the current turn (`as_user`, --user on the CLI).
+tenants = TenantStores.from_env()
 
 
+def _read(fn):
+    return tenants.read(current_user(), fn)
 
-load_dotenv()
 
-messages = []
+def _write(fn):
+    return tenants.write(current_user(), fn)
 
 
-# Sample in-memory database (replace with actual database integration)
-expenses_db = []
-expense_id_counter = 1
+class ExpenseItem(TypedDict, total=False):
+    amount: Required[float]
+    category: Required[str]
+    date: str
+    note: str
+
+
+class DateRange(TypedDict, total=False):
+    start_date: str
+    end_date: str
 
 
 def add_expense(amount: float, category: str, date: str = None, note: str = "") -> dict:
-    """Adds a new expense record."""
-    global expense_id_counter
-
-    if date is None:
-        date = datetime.now().strftime("%Y-%m-%d")  # Default to today's date
-
-    expense = {
-        "id": str(expense_id_counter),
-        "amount": amount,
-        "category": category,
-        "date": date,
-        "note": note,
-    }
-    expenses_db.append(expense)
-    expense_id_counter += 1
+    """
+    Add a new expense record
+
+    :param amount: The amount spent in the expense
+    :param category: The category of the expense, e.g., Food, Travel, Shopping
+    :param date: The date of the expense in YYYY-MM-DD format. Defaults to today’s date.
+    :param note: An optional note for the expense
+    """
+    expense = _write(lambda db: db.add(amount, category, date, note))
+    tool_memo.invalidate([expense])
 
     return {
         "status": "success",
@@ -44,6 +62,31 @@ def add_expense(amount: float, category: str, date: str = None, note: str = "")
     }
 
 
+def add_expenses_bulk(expenses: list[ExpenseItem]) -> dict:
+    """
+    Add several expense records in one call, e.g. every line of a receipt or bank statement
+
+    :param expenses: The expenses to add
+    """
+    rows = [
+        {
+            "amount": expense["amount"],
+            "category": expense["category"],
+            "date": expense.get("date"),
+            "note": expense.get("note", ""),
+        }
+        for expense in expenses
+    ]
+    created = _write(lambda db: db.add_many(rows))
+    tool_memo.invalidate(created)
+
+    return {
+        "status": "success",
+        "message": f"{len(created)} expenses added successfully",
+        "data": created,
+    }
+
+
 def update_expense(
     expense_id: str,
     amount: float = None,
@@ -51,65 +94,156 @@ def update_expense(
     date: str = None,
     note: str = None,
 ) -> dict:
-    """Updates an existing expense record."""
-    for expense in expenses_db:
-        if expense["id"] == expense_id:
-            if amount is not None:
-                expense["amount"] = amount
-            if category is not None:
-                expense["category"] = category
-            if date is not None:
-                expense["date"] = date
-            if note is not None:
-                expense["note"] = note
-
-            return {
-                "status": "success",
-                "message": "Expense updated successfully",
-                "data": expense,
-            }
-
-    return {"status": "error", "message": "Expense not found"}
-
-
-def read_expense(filter: str = None, date_range: tuple = None) -> dict:
-    """Retrieves expenses based on filter and date range."""
-    filtered_expenses = expenses_db
-
-    if filter:
-        filtered_expenses = [
-            exp
-            for exp in expenses_db
-            if filter.lower() in exp["category"].lower()
-            or filter.lower() in exp["note"].lower()
-        ]
+    """
+    Update an existing expense record
 
-    if date_range:
-        start_date, end_date = date_range
-        filtered_expenses = [
-            exp for exp in filtered_expenses if start_date <= exp["date"] <= end_date
-        ]
+    :param expense_id: The unique identifier of the expense to be updated
+    :param amount: The updated amount spent
+    :param category: The updated category of the expense
+    :param date: The updated date of the expense in YYYY-MM-DD format
+    :param note: The updated note for the expense
+    """
+    before, expense = _write(
+        lambda db: (
+            db.get(expense_id),
+            db.update(expense_id, amount=amount, category=category, date=date, note=note),
+        )
+    )
+    # cached reads that held the old version or would now hold the new one
+    tool_memo.invalidate([before, expense])
+
+    if expense is None:
+        return {"status": "error", "message": "Expense not found"}
+
+    return {
+        "status": "success",
+        "message": "Expense updated successfully",
+        "data": expense,
+    }
+
+
+def _in_read(filter: str = None, date_range: DateRange = None, mode: str = "substring", **_):
+    """Rows that could change a `read_expense` result."""
+    if isinstance(date_range, dict):
+        date_range = (date_range.get("start_date"), date_range.get("end_date"))
+    in_range = in_filters(None, *date_range) if date_range else None
+    if not filter:
+        found = None
+    elif mode == "ranked":
+        found = in_search(filter, mode="ranked")
+    else:
+        needle = filter.lower()
+        found = lambda row: needle in f"{row.get('category')}\n{row.get('note')}".lower()  # noqa: E731
+    return lambda row: (in_range is None or in_range(row)) and (found is None or found(row))
+
+
+@tool_memo.cached(_in_read)
+def read_expense(
+    filter: str = None,
+    date_range: DateRange = None,
+    mode: Literal["substring", "ranked"] = "substring",
+    limit: int = 20,
+) -> dict:
+    """
+    Retrieve expense records based on filters
+
+    :param filter: A keyword to filter expenses by category or note
+    :param date_range: Optional date range to filter expenses, dates in YYYY-MM-DD format
+    :param mode: "substring" returns every expense containing the filter; "ranked" the best `limit` matches in title, category or note, typos are fine
+    :param limit: Maximum number of matches in ranked mode, `has_more` says when there are more
+    """
+    if isinstance(date_range, dict):
+        # the tool schema sends {"start_date": ..., "end_date": ...}
+        date_range = (
+            date_range.get("start_date") or "0000-01-01",
+            date_range.get("end_date") or "9999-12-31",
+        )
+    has_more = False
+    if filter and mode == "ranked":
+        # ranked search (tools/search.py), one extra match tells whether the list is cut
+        filtered_expenses = _read(lambda db: db.search(filter, limit + 1, date_range=date_range))
+        has_more = len(filtered_expenses) > limit
+        filtered_expenses = filtered_expenses[:limit]
+    else:
+        filtered_expenses = _read(lambda db: db.read(filter, date_range))
+
+    return {"status": "success", "data": filtered_expenses, "has_more": has_more}
+
+
+@tool_memo.cached(in_period)
+def get_spending_summary(
+    period: Literal["day", "week", "month", "year", "all"] = "month",
+    date: str = None,
+    category: str = None,
+) -> dict:
+    """
+    Get how much was spent in a day, week, month or year, in total and per category. Use this instead of adding up amounts
+
+    :param period: The period to total: day, week, month, year or all
+    :param date: Any date inside the period in YYYY-MM-DD format. Defaults to today’s date.
+    :param category: Only total this category, e.g., Food
+    """
+    try:
+        summary = _read(lambda db: db.spending(period, date, category))
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
 
-    return {"status": "success", "data": filtered_expenses}
+    return {"status": "success", "data": summary}
 
 
 def delete_expense(expense_id: str) -> dict:
-    """Deletes an expense record."""
-    global expenses_db
-    expenses_db = [exp for exp in expenses_db if exp["id"] != expense_id]
+    """
+    Delete an expense record
+
+    :param expense_id: The unique identifier of the expense to be deleted
+    """
+    expense = _write(lambda db: (db.get(expense_id), db.delete(expense_id))[0])
+    tool_memo.invalidate([expense])
 
     return {"status": "success", "message": "Expense deleted successfully"}
 
 
-def call_llm(prompt):
-    system_prompt = """
+available_functions = {
+    "add_expense": add_expense,
+    "add_expenses_bulk": add_expenses_bulk,
+    "update_expense": update_expense,
+    "read_expense": read_expense,
+    "get_spending_summary": get_spending_summary,
+    "delete_expense": delete_expense,
+}
+argument_models = tool_arguments(available_functions)
+
+
+def run_tool(name: str, arguments) -> dict:
+    """Runs a tool call requested by the model."""
+    with span(f"tool.{name}") as s:
+        if name not in available_functions:
+            result = {"status": "error", "message": f"Unknown tool: {name}"}
+        else:
+            try:
+                # a JSON string (the stream couldn't parse it) is repaired, amounts and dates coerced
+                result = available_functions[name](**check_arguments(argument_models, name, arguments))
+            except (TypeError, ValueError) as e:
+                result = {"status": "error", "message": str(e)}
+
+        if result.get("status") == "error":
+            s.error = result["message"]
+        return result
+
+
+# Built once: both stay byte-identical across turns so the provider can reuse the prompt prefix
+SYSTEM_PROMPT = register(
+    "chatbot",
+    """
     You are an intelligent expense-tracking assistant that helps users manage their expenses through conversation.  
     You can **add, update, delete, and retrieve expenses** using the following tool calls:  
 
     ### **Available Tools:**  
         - `update_expense(expense_id: str, amount: float, category: str, date: str, note: str)` → Update an existing expense. 
         - `add_expense(amount: float, category: str, date: str, note: str)` → Add a new expense.  
-        - `read_expense(filter: str, date_range: str)` → Retrieve expenses based on filters.  
+        - `add_expenses_bulk(expenses: list)` → Add several expenses at once (e.g. a pasted receipt).  
+        - `read_expense(filter: str, date_range: str, mode: str, limit: int)` → Retrieve every expense matching the filters; mode "ranked" returns only the best `limit` matches (typos are fine) and `has_more` when there are more.  
+        - `get_spending_summary(period: str, date: str, category: str)` → How much was spent in a day/week/month/year. Use it for totals instead of adding amounts yourself.  
         - `delete_expense(expense_id: str)` → Remove an expense.  
         
     ### **Response Handling:**  
@@ -135,145 +269,140 @@ def call_llm(prompt):
         - Maintain a friendly, concise, and user-friendly tone while handling expenses.  
         
     ### **User's Input:**  
-    {input_prompt}  
+    The user's message follows.  
     Process the query accordingly and determine if a tool call is required.
     
-    """
+    """,
+)
+
+TOOLS = openai_tools([function_schema(func) for func in available_functions.values()])
 
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "add_expense",
-                "description": "Add a new expense record",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "amount": {
-                            "type": "number",
-                            "description": "The amount spent in the expense",
-                        },
-                        "category": {
-                            "type": "string",
-                            "description": "The category of the expense, e.g., Food, Travel, Shopping",
-                        },
-                        "date": {
-                            "type": "string",
-                            "format": "date",
-                            "description": "The date of the expense in YYYY-MM-DD format. Defaults to today’s date.",
-                        },
-                        "note": {
-                            "type": "string",
-                            "description": "An optional note for the expense",
-                        },
-                    },
-                    "required": ["amount", "category"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "update_expense",
-                "description": "Update an existing expense record",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "expense_id": {
-                            "type": "string",
-                            "description": "The unique identifier of the expense to be updated",
-                        },
-                        "amount": {
-                            "type": "number",
-                            "description": "The updated amount spent",
-                        },
-                        "category": {
-                            "type": "string",
-                            "description": "The updated category of the expense",
-                        },
-                        "date": {
-                            "type": "string",
-                            "format": "date",
-                            "description": "The updated date of the expense in YYYY-MM-DD format",
-                        },
-                        "note": {
-                            "type": "string",
-                            "description": "The updated note for the expense",
-                        },
-                    },
-                    "required": ["expense_id"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "read_expense",
-                "description": "Retrieve expense records based on filters",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "filter": {
-                            "type": "string",
-                            "description": "A keyword to filter expenses by category or note",
-                        },
-                        "date_range": {
-                            "type": "object",
-                            "properties": {
-                                "start_date": {
-                                    "type": "string",
-                                    "format": "date",
-                                    "description": "The start date for filtering expenses in YYYY-MM-DD format",
-                                },
-                                "end_date": {
-                                    "type": "string",
-                                    "format": "date",
-                                    "description": "The end date for filtering expenses in YYYY-MM-DD format",
-                                },
-                            },
-                            "description": "Optional date range to filter expenses",
-                        },
-                    },
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "delete_expense",
-                "description": "Delete an expense record",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "expense_id": {
-                            "type": "string",
-                            "description": "The unique identifier of the expense to be deleted",
-                        }
-                    },
-                    "required": ["expense_id"],
-                },
-            },
-        },
-    ]
 
-    res = client.chat.completions.create(
+def call_llm(prompt, stream=False):
+    task = "confirm" if is_confirmation(prompt) else "respond"
+    request = dict(
         tool_choice='auto',
-        tools=tools,
-        model="llama-3.3-70b-versatile",
+        tools=TOOLS,
+        model=model_router.model_name(task),
         messages=[
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt},
         ],
     )
 
-    print(res.choices[0].message.tool_calls)
+    if stream:
+        return _stream_llm(task, request)
+
+    def create(**kwargs):
+        res = clients.groq().chat.completions.create(**kwargs)
+        record_usage(res)  # only real calls, not cache hits
+        return res
+
+    with span("call_llm", task=task) as s:
+        res = llm_cache.cached_call(model_router.route(task, create), **request)
+        s.set(tool_calls=len(res.choices[0].message.tool_calls or []))
 
     return res
 
 
-## chatbot
-while True:
-    prompt = input("User : ")
-    res = call_llm(prompt)
-    print("🤖 : ", res.choices[0].message.content)
+def _stream_llm(task, request):
+    # ("text", delta) and ("tool_call", call) events, see core.streaming
+    with span("call_llm", task=task, stream=True) as s:
+        for event in llm_cache.cached_stream(
+            model_router.route_stream(
+                task, lambda **kwargs: stream_events(clients.groq().chat.completions.create(stream=True, **kwargs))
+            ),
+            keep=list,
+            **request,
+        ):
+            if event[0] == "tool_call":
+                s.add("tool_calls")
+            yield event
+
+
+router = FastRouter()
+
+
+def fast_reply(route) -> str:
+    """Runs a routed turn straight against the store, no LLM call."""
+    if route.intent == "greeting":
+        return route.reply
+
+    if route.intent == "add":
+        expenses = [
+            {"amount": item["amount"], "category": item["category"], "note": item["item"]}
+            for item in route.items
+        ]
+        if len(expenses) == 1:
+            return add_expense(**expenses[0])["message"]
+        return add_expenses_bulk(expenses)["message"]
+
+    res = read_expense(filter=route.query) if route.intent == "search" else read_expense()
+    return format_expenses(res["data"])
+
 
+def print_tool_result(name: str, result: dict):
+    print(f"\n🔧 {name}: {result.get('message', result.get('status'))}", flush=True)
+
+
+def chat(prompt: str, stream: bool):
+    """One LLM turn: prints the reply and runs the tool calls it asks for."""
+    with span("turn", path="llm", stream=stream):
+        _chat(prompt, stream)
+
+
+def _chat(prompt: str, stream: bool):
+    if stream:
+        print("🤖 : ", end="", flush=True)
+        for kind, value in call_llm(prompt, stream=True):
+            if kind == "text":
+                print(value, end="", flush=True)
+            else:
+                print_tool_result(value["name"], run_tool(value["name"], value["arguments"]))
+        print()
+    else:
+        res = call_llm(prompt)
+        print("🤖 : ", res.choices[0].message.content)
+        for call in res.choices[0].message.tool_calls or []:
+            print_tool_result(call.function.name, run_tool(call.function.name, call.function.arguments))
+
+
+## chatbot
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expense chatbot CLI")
+    parser.add_argument(
+        "--service",
+        default=env("AGENT_SERVICE_URL"),
+        help="chat with a running `python -m core.service` instead of running the bot here",
+    )
+    parser.add_argument("--user", default=env("AGENT_USER", DEFAULT_USER), help="whose expenses to work on")
+    args = parser.parse_args()
+    user_id = check_user(args.user)
+    if args.service:
+        chat_loop(args.service, user_id)
+        raise SystemExit
+
+    stream = env("LLM_STREAM", "1") == "1"
+
+    try:
+        with as_user(user_id):
+            while True:
+                prompt = input("User : ")
+
+                route = router.route(prompt)
+                if route:
+                    with router.timed("fast", route.intent):
+                        print("🤖 : ", fast_reply(route))
+                    continue
+
+                with router.timed("llm"):
+                    chat(prompt, stream)
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        print()
+        print(router.stats.summary())
+        print(model_router.summary())
+        print(scheduler.summary())
+        print(tool_memo.summary())
+        print(repairs.summary())
@@ -0,0 +1,426 @@
+"""
+The expense-tracker agent behind the Streamlit app and `core.service`.
+
+Everything that doesn't depend on a particular user (prompt, tool schema,
+thread pools) is built once at import, the Groq clients on first use. Per-user state lives
+in a `Session` of that user, and `ExpenseAgent.turn()` runs one message
+for the user (tool calls carry their id, see core/tenants.py) and yields
+UI-agnostic events:
+
+    ("text", delta)     reply text, in pieces when streaming
+    ("answer", text)    answer written from read-tool results
+    ("done", content)   the full assistant message, last event of a turn
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Literal
+
+from pydantic import Field, ValidationInfo, model_validator
+
+from core import clients
+from core.cache import llm_cache
+from core.config import env
+from core.executor import READ_ONLY_TOOLS, ToolExecutor
+from core.fastpath import FastRouter, format_expenses
+from core.history import ConversationHistory, llm_summarizer
+from core.models import is_confirmation, model_router
+from core.prompts import function_schema, register, render
+from core.repair import Repairable, check_arguments, repairs, tool_arguments
+from core.scheduler import scheduler
+from core.streaming import new_text, stream_with_items, streamable
+from core.tenants import DEFAULT_USER, as_user
+from core.tracing import annotate, span
+from tools.db import (
+    add_expense,
+    add_expenses_bulk,
+    get_all_expenses,
+    get_expense_summary,
+    get_spending_summary,
+    search_expenses,
+    search_expenses_multi,
+)
+from tools.memo import tool_memo
+
+
+def create(**kwargs):
+    # the client (and groq/instructor) is built on the first call, see core/clients.py;
+    # every request is paced and capped by core/scheduler.py
+    return clients.structured().chat.completions.create(**kwargs)
+
+
+def create_partial(**kwargs):
+    return clients.structured().chat.completions.create_partial(**kwargs)
+
+# Stream replies token by token (LLM_STREAM=0 waits for the full response)
+STREAM = env("LLM_STREAM", "1") == "1"
+
+class ToolCall(Repairable):
+    input_text: str = Field(description="The user's input text")
+    tool_name: str = Field(description="The name of the tool to call")
+    tool_parameters: dict = Field(description="JSON string of tool parameters")
+
+    @model_validator(mode="after")
+    def _typed_parameters(self, info: ValidationInfo):
+        # only for complete replies (get_response), the partial objects of a stream aren't done yet;
+        # whatever coercion can't fix goes back to the model instead of failing in the tool
+        if info.context and info.context.get("check_arguments"):
+            self.tool_parameters = check_arguments(argument_models, self.tool_name, self.tool_parameters)
+        return self
+
+
+class ResponseModal(Repairable):
+    role: Literal["user", "assistant"]
+    content: str
+    tool_calls: list[ToolCall]
+
+
+class QueryValidator(Repairable):
+    res :  str
+
+
+StreamedResponseModal = streamable(ResponseModal)
+
+# Generated from the signatures and docstrings in tools/db.py; the summaries
+# there describe HTTP calls, so the model gets these descriptions instead.
+tool_schema = [
+    function_schema(add_expense, description="Add an expense with details such as amount and item name."),
+    function_schema(
+        add_expenses_bulk,
+        description="Add several expenses in one call, e.g. every item of a receipt or a message like 'lunch 200, cab 150, coffee 80'.",
+    ),
+    function_schema(
+        get_all_expenses,
+        description="Retrieve one page of expenses from the database, optionally filtered. Use get_spending_summary or get_expense_summary for totals instead of adding amounts yourself.",
+    ),
+    function_schema(
+        get_expense_summary,
+        description="Get spending totals and counts computed by the database, grouped by category or month over any date range (e.g., 'spend per month since January').",
+    ),
+    function_schema(
+        get_spending_summary,
+        description="Get the running spending total of a day, week, month or year, overall or for one category (e.g., 'how much did I spend on food this month'). Prefer this for questions about a single period.",
+    ),
+    function_schema(
+        search_expenses,
+        description="Search for expenses by title. Returns every title containing the text; with mode='ranked', only the best `limit` matches in title, category or note, tolerating typos and partial words (e.g., 'starbuks').",
+    ),
+    function_schema(
+        search_expenses_multi,
+        description="Search for several expense titles at once. Returns the matches for each title.",
+    ),
+]
+
+available_functions = {
+    "add_expense": add_expense,
+    "add_expenses_bulk": add_expenses_bulk,
+    "get_all_expenses": get_all_expenses,
+    "get_expense_summary": get_expense_summary,
+    "get_spending_summary": get_spending_summary,
+    "search_expenses": search_expenses,
+    "search_expenses_multi": search_expenses_multi,
+}
+argument_models = tool_arguments(available_functions)
+
+
+system_prompt = register(
+    "tracker",
+    f"""
+You are an AI assistant capable of using tools to assist users efficiently. You have access to the following tool: {render(tool_schema)}.
+
+<instruction>
+    1. make sure never discuss about tools with user.
+    2. tool calls must done one by one.
+    3. Extarct tool name , parameters from user query only.
+    4. use only tools if needed.
+    5. after getting tool call ready then give sucess response like "xyz item addes sucessfully"
+    6. Also get item name and amount spend get from user query.
+    7. use privious chat as context if needed like may be you get item name fisrt and then in next query you will get prize.
+    8. if the user gives several items with their amounts in one message, add them all with one add_expenses_bulk call.
+    9. for "how much did i spend" questions call get_spending_summary, never add up amounts yourself.
+</instruction> 
+
+Example :
+user - "i buy jeans from zara"
+assiatant - "how much you spend on it"
+user - "200 rs"
+assistant - "added expense sucessfully (tool calls - tool='add_expense',tool_parameters=(item_name="jeans from zara",amount=200),input_text='"i buy jeans from zara" + "200 rs")"
+""",
+)
+
+
+def _task(messages: list) -> str:
+    """A plain "yes" / "ok" confirming the last step goes to the small model."""
+    return "confirm" if is_confirmation(messages[-1]["content"]) else "respond"
+
+
+def get_response(messages: list) -> ResponseModal:
+    """Generate response from LLM based on the session's message window."""
+    task = _task(messages)
+    with span("get_response", task=task) as s:
+        res = llm_cache.cached_call(
+            model_router.route(task, scheduler.budgeted(create)),
+            messages=messages,
+            model=model_router.model_name(task),
+            response_model=ResponseModal,
+            context={"check_arguments": True},
+        )
+        s.set(tool_calls=len(res.tool_calls))
+
+    return res
+
+
+def stream_response(messages: list):
+    """Streaming version of `get_response`, yields partial ResponseModal objects."""
+    task = _task(messages)
+    with span("stream_response", task=task) as s:
+        start = time.perf_counter()
+        for i, partial in enumerate(
+            llm_cache.cached_stream(
+                model_router.route_stream(task, create_partial),
+                messages=messages,
+                model=model_router.model_name(task),
+                response_model=StreamedResponseModal,
+            )
+        ):
+            if i == 0:
+                s.set(first_token_ms=(time.perf_counter() - start) * 1000)
+            yield partial
+
+
+# Static part first so it stays a cacheable prefix, the tool results go in their own message
+ANSWER_PROMPT = register(
+    "answer_from_context",
+    """
+Given the context in the next message:  
+
+Respond to the user's input strictly based on the provided context. Ensure that the response is relevant, precise, and formatted using Markdown for better readability. If the input falls outside the given context, politely inform the user that you can only answer within the specified scope.  
+
+Use appropriate formatting such as:  
+- **Bold** for key points  
+- *Italics* for emphasis  
+- `Code blocks` for technical responses  
+- Bullet points or tables for structured information when needed  
+""",
+)
+
+
+def call_llm(input_text: str, context: str):
+    """Generate response from LLM based on user input + Context give by db"""
+    messages = [
+        {"role": "system", "content": ANSWER_PROMPT},
+        {"role": "system", "content": f"**Context:**  \n{context}"},
+        {"role": "user", "content": input_text},
+    ]
+
+    # formatting tool results doesn't need the big model, escalate only on an empty answer
+    with span("call_llm", task="format"):
+        res = llm_cache.cached_call(
+            model_router.route(
+                "format", scheduler.budgeted(create), accept=lambda res: bool(res.res.strip())
+            ),
+            messages=messages,
+            model=model_router.model_name("format"),
+            response_model=QueryValidator,
+        )
+
+    return res
+
+
+
+def tool_error(result):
+    """The error message of a failed tool call ({"error"} or {"status": "error"}), None if it worked."""
+    if not isinstance(result, dict):
+        return None
+    if "error" in result:
+        return str(result["error"])
+    if result.get("status") == "error":
+        return str(result.get("message") or "unknown error")
+    return None
+
+
+def answer_from_tools(history: ConversationHistory, input_text: str, run) -> str:
+    """Waits for the turn's tool calls and answers from all their results in one LLM call."""
+    results = run.results()
+    if not results:
+        return None
+
+    annotate(tools=len(results))
+    for func_name, func_args, func_res in results:
+        history.pin_tool_call(func_name, func_args, func_res)
+
+    # successful writes are already confirmed in the model's reply, only reads and failures need an answer
+    if not any(func_name in READ_ONLY_TOOLS for func_name, _, _ in results):
+        errors = [error for error in (tool_error(func_res) for _, _, func_res in results) if error]
+        return f"Sorry, I couldn't save that: {'; '.join(errors)}" if errors else None
+
+    context = json.dumps(
+        [
+            {"tool": func_name, "arguments": func_args, "result": func_res}
+            for func_name, func_args, func_res in results
+        ]
+    )
+    return call_llm(input_text=input_text, context=context).res
+
+
+def fast_reply(history: ConversationHistory, route) -> str:
+    """Answers a routed turn with a direct tool call, no LLM involved."""
+    if route.intent == "greeting":
+        return route.reply
+
+    if route.intent == "add":
+        expenses = [
+            {"title": item["item"], "amount": item["amount"], "category": item["category"]}
+            for item in route.items
+        ]
+        if len(expenses) == 1:
+            res = add_expense(**expenses[0])
+            history.pin_tool_call("add_expense", expenses[0], res)
+        else:
+            res = add_expenses_bulk(expenses)
+            history.pin_tool_call("add_expenses_bulk", {"expenses": expenses}, res)
+        if tool_error(res):
+            return f"Sorry, I couldn't save that: {tool_error(res)}"
+        added = ", ".join(f"{e['title']} ({e['amount']:g}, {e['category']})" for e in expenses)
+        return f"Added {added} successfully."
+
+    if route.intent == "list":
+        res = get_all_expenses()
+        history.pin_tool_call("get_all_expenses", {}, res)
+        if "error" in res:
+            return f"Sorry, I couldn't load your expenses: {res['error']}"
+        return format_expenses(res["data"])
+
+    res = search_expenses(route.query)
+    history.pin_tool_call("search_expenses", {"title": route.query}, res)
+    if isinstance(res, dict) and "error" in res:
+        return f"Sorry, the search failed: {res['error']}"
+    return format_expenses(res)
+
+
+class Session:
+    """One user's conversation: the transcript shown in the UI and the budgeted LLM history."""
+
+    def __init__(self, session_id: str, user_id: str = DEFAULT_USER):
+        self.id = session_id
+        self.user_id = user_id
+        self.messages = []
+        self.history = ConversationHistory(summarize=llm_summarizer())
+        self.lock = threading.Lock()  # one turn at a time per session
+        self.last_used = time.monotonic()
+
+    def add(self, role: str, content: str):
+        self.messages.append({"role": role, "content": content})
+        self.history.append(role, content)
+
+
+class SessionStore:
+    """
+    Sessions by user and id, dropping the least recently used once over
+    `max_sessions` or idle for `ttl` seconds. A session id only resolves for
+    the user that owns it, another user asking for it gets a fresh session.
+    """
+
+    def __init__(self, max_sessions: int = None, ttl: float = None):
+        self.max_sessions = max_sessions or int(env("AGENT_MAX_SESSIONS", "1000"))
+        self.ttl = ttl or float(env("AGENT_SESSION_TTL", "3600"))
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, session_id: str, user_id: str = DEFAULT_USER) -> Session:
+        """Returns the user's session, creating it on first use."""
+        now = time.monotonic()
+        key = (user_id, session_id)
+        with self._lock:
+            session = self._sessions.pop(key, None)
+            if session is None:
+                session = Session(session_id, user_id)
+            session.last_used = now
+            self._sessions[key] = session
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            for idle in [k for k, s in self._sessions.items() if now - s.last_used > self.ttl]:
+                del self._sessions[idle]
+        return session
+
+    def drop(self, session_id: str, user_id: str = DEFAULT_USER) -> bool:
+        with self._lock:
+            return self._sessions.pop((user_id, session_id), None) is not None
+
+
+class ExpenseAgent:
+    def __init__(self, sessions: SessionStore = None, router: FastRouter = None, executor: ToolExecutor = None):
+        self.sessions = sessions or SessionStore()
+        self.router = router or FastRouter()
+        self.executor = executor or ToolExecutor(available_functions)
+
+    def new_session(self, user_id: str = DEFAULT_USER) -> str:
+        return self.sessions.get(uuid.uuid4().hex, user_id).id
+
+    def transcript(self, session_id: str, user_id: str = DEFAULT_USER) -> list:
+        return list(self.sessions.get(session_id, user_id).messages)
+
+    def stats(self) -> str:
+        return (
+            f"sessions: {len(self.sessions)}\n{self.router.stats.summary()}\n"
+            f"{model_router.summary()}\n{scheduler.summary()}\ncache: {llm_cache.stats}\n{tool_memo.summary()}\n"
+            f"{repairs.summary()}"
+        )
+
+    def turn(self, session_id: str, prompt: str, stream: bool = None, user_id: str = DEFAULT_USER):
+        """Runs one message of `user_id`, yields ("text" | "answer" | "done", value) events."""
+        stream = STREAM if stream is None else stream
+        session = self.sessions.get(session_id, user_id)
+
+        with session.lock, as_user(user_id), span("turn", session=session_id, user=user_id, stream=stream) as s:
+            session.add("user", prompt)
+
+            route = self.router.route(prompt)
+            if route:
+                # trivially parseable input, answered without the LLM
+                s.set(path="fast", intent=route.intent)
+                with self.router.timed("fast", route.intent):
+                    content = fast_reply(session.history, route)
+                yield ("text", content)
+            else:
+                s.set(path="llm")
+                with self.router.timed("llm"):
+                    content = yield from self._llm_turn(session, prompt, stream)
+
+            session.add("assistant", content)
+        yield ("done", content)
+
+    def _llm_turn(self, session: Session, prompt: str, stream: bool):
+        run = self.executor.start()
+        messages = session.history.messages(system_prompt)
+        result = None
+
+        if stream:
+            # yield the reply as it is generated, start each tool once its arguments are complete
+            shown = ""
+            for result, ready in stream_with_items(stream_response(messages), "tool_calls"):
+                delta = new_text(shown, result.content)
+                if delta:
+                    shown += delta
+                    yield ("text", delta)
+                for tool in ready:
+                    run.submit(tool.tool_name, tool.tool_parameters)
+        else:
+            result = get_response(messages)
+            for tool in result.tool_calls:
+                run.submit(tool.tool_name, tool.tool_parameters)
+            yield ("text", result.content)
+
+        content = (result.content if result else "") or ""
+        answer = answer_from_tools(session.history, prompt, run)
+        if answer:
+            yield ("answer", answer)
+            content = f"{content}\n\n{answer}".strip()
+        return content
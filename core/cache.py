@@ -0,0 +1,291 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from core.config import env
+from core.tracing import annotate
+
+# Tools that change expense data, responses that call them are never cached.
+WRITE_TOOLS = {"add_expense", "add_expenses_bulk", "update_expense", "delete_expense"}
+
+# Numbers, ids, dates and period words: prompts that differ in one of these want a different answer
+# ("food in march 2024" vs "... 2023"), however close their embeddings are.
+_SPECIFICS = re.compile(
+    r"\d+(?:[.,:/-]\d+)*"
+    r"|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\b"
+    r"|\b(?:today|yesterday|tomorrow|day|week|month|year|last|this|next|previous|ago)\b"
+)
+
+
+def _normalize(text) -> str:
+    if not isinstance(text, str):
+        text = json.dumps(text, sort_keys=True, default=str)
+    return " ".join(text.lower().split())
+
+
+def _sizeof(value) -> int:
+    if isinstance(value, tuple):
+        return sum(_sizeof(v) for v in value)
+    if hasattr(value, "model_dump_json"):
+        return len(value.model_dump_json())
+    return len(repr(value))
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def ngram_embedding(text: str, dim: int = 256) -> list:
+    """Cheap local embedding: hashed character trigrams, good enough for near-duplicate prompts."""
+    text = "".join(ch for ch in _normalize(text) if ch.isalnum() or ch == " ")
+    text = f"  {text}  "
+    vector = [0.0] * dim
+    for i in range(len(text) - 2):
+        digest = hashlib.blake2b(text[i : i + 3].encode(), digest_size=4).digest()
+        vector[int.from_bytes(digest, "little") % dim] += 1.0
+    return vector
+
+
+def specifics(text: str) -> tuple:
+    """The numbers, dates and period words of a prompt, a semantic hit needs the same ones."""
+    return tuple(sorted(_SPECIFICS.findall(_normalize(text))))
+
+
+def tool_names(result) -> set:
+    """Tools an LLM result asks for (instructor model, raw completion or stream items)."""
+    if isinstance(result, (tuple, list)):
+        return set().union(*(tool_names(r) for r in result))
+    if isinstance(result, dict):
+        # tool call event from core.streaming.stream_events
+        return {result["name"]} if result.get("name") else set()
+
+    names = {getattr(call, "tool_name", None) for call in getattr(result, "tool_calls", None) or []}
+    for choice in getattr(result, "choices", None) or []:
+        names.update(call.function.name for call in getattr(choice.message, "tool_calls", None) or [])
+    return names - {None}
+
+
+def writes_expenses(result) -> bool:
+    """True if an LLM result asks for a write tool."""
+    return bool(tool_names(result) & WRITE_TOOLS)
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache for LLM responses, bounded by entry count and bytes.
+
+    The key is a hash of the model, system prompt, the last `window`
+    messages, the response_model schema / tools and any other request
+    arguments. With `embed` set, a miss on the exact key falls back to the
+    closest previous prompt with the same context whose embedding is at
+    least `similarity` close (cosine) to the latest user message and that
+    has the same numbers and dates (`specifics`). Responses with tool calls
+    are only reused for the exact prompt: their arguments come from it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl: float = 3600,
+        window: int = 6,
+        embed=None,
+        similarity: float = 0.92,
+        enabled: bool = True,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.window = window
+        self.embed = embed
+        self.similarity = similarity
+        self.enabled = enabled
+
+        self._entries = OrderedDict()  # key -> (expires_at, size, value, context, vector, specifics)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "skipped_writes": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(env("LLM_CACHE_MAX_ENTRIES", "1024")),
+            max_bytes=int(env("LLM_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+            ttl=float(env("LLM_CACHE_TTL", "3600")),
+            window=int(env("LLM_CACHE_WINDOW", "6")),
+            embed=ngram_embedding if env("LLM_CACHE_SEMANTIC") == "1" else None,
+            enabled=env("LLM_CACHE_ENABLED", "1") == "1",
+        )
+
+    # -- keys -------------------------------------------------------------
+
+    def _parts(self, model, messages, response_model=None, tools=None, **kwargs):
+        system = [m for m in messages if m["role"] == "system"]
+        rest = [m for m in messages if m["role"] != "system"][-self.window :]
+        schema = response_model.model_json_schema() if response_model is not None else None
+
+        context = {
+            "model": model,
+            "system": [_normalize(m["content"]) for m in system],
+            "history": [(m["role"], _normalize(m["content"])) for m in rest[:-1]],
+            "schema": schema,
+            "tools": tools,
+            "kwargs": kwargs,
+        }
+        last = _normalize(rest[-1]["content"]) if rest else ""
+        return context, last
+
+    @staticmethod
+    def _hash(value) -> str:
+        raw = json.dumps(value, sort_keys=True, default=str).encode()
+        return hashlib.sha256(raw).hexdigest()
+
+    def key(self, model, messages, response_model=None, tools=None, **kwargs) -> str:
+        context, last = self._parts(model, messages, response_model, tools, **kwargs)
+        return self._hash([context, last])
+
+    # -- storage ----------------------------------------------------------
+
+    def get(self, key: str, context: str = None, last: str = None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry[2]
+                self._drop(key)
+
+            if self.embed is not None and context is not None:
+                value = self._nearest(context, self.embed(last), specifics(last), now)
+                if value is not None:
+                    self.stats["semantic_hits"] += 1
+                    return value
+
+            self.stats["misses"] += 1
+            return None
+
+    def _nearest(self, context, vector, tokens, now):
+        best, best_key = self.similarity, None
+        for key, (expires_at, _, _, entry_context, entry_vector, entry_tokens) in self._entries.items():
+            if entry_context != context or entry_vector is None or entry_tokens != tokens or expires_at <= now:
+                continue
+            score = _cosine(vector, entry_vector)
+            if score >= best:
+                best, best_key = score, key
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][2]
+
+    def put(self, key: str, value, context: str = None, last: str = None):
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        # tool calls carry the prompt's own arguments, those entries only serve exact hits
+        semantic = self.embed is not None and context is not None and not tool_names(value)
+        vector = self.embed(last) if semantic else None
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value, context, vector, specifics(last or ""))
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # -- calls ------------------------------------------------------------
+
+    def cached_call(self, create, *, model, messages, response_model=None, tools=None, **kwargs):
+        """
+        Calls `create(model=..., messages=..., ...)` through the cache.
+
+        Results that ask for a write tool are returned but not stored.
+        """
+        request = self._request(model, messages, response_model, tools, kwargs)
+        if not self.enabled:
+            return create(**request)
+
+        context, last = self._parts(model, messages, response_model, tools, **kwargs)
+        context_key = self._hash(context)
+        key = self._hash([context, last])
+
+        cached = self.get(key, context_key, last)
+        annotate(cache="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
+
+        result = create(**request)
+        self._store(key, result, context_key, last)
+        return result
+
+    def cached_stream(
+        self, create, *, model, messages, response_model=None, tools=None, keep=None, **kwargs
+    ):
+        """
+        Streaming twin of `cached_call`: `create` returns an iterator of items.
+
+        A hit replays the stored items at once. On a miss the items are passed
+        through as they arrive and `keep(items)` (default: the last item) is
+        stored once the stream has finished.
+        """
+        request = self._request(model, messages, response_model, tools, kwargs)
+        if not self.enabled:
+            yield from create(**request)
+            return
+
+        context, last = self._parts(model, messages, response_model, tools, **kwargs)
+        context_key = self._hash(context)
+        key = self._hash([context, last])
+
+        cached = self.get(key, context_key, last)
+        annotate(cache="hit" if cached is not None else "miss")
+        if cached is not None:
+            yield from cached
+            return
+
+        items = []
+        for item in create(**request):
+            items.append(item)
+            yield item
+
+        if items:
+            self._store(key, tuple(keep(items) if keep else items[-1:]), context_key, last)
+
+    @staticmethod
+    def _request(model, messages, response_model, tools, kwargs) -> dict:
+        request = dict(model=model, messages=messages, **kwargs)
+        if response_model is not None:
+            request["response_model"] = response_model
+        if tools is not None:
+            request["tools"] = tools
+        return request
+
+    def _store(self, key, result, context_key, last):
+        if writes_expenses(result):
+            with self._lock:
+                self.stats["skipped_writes"] += 1
+        else:
+            self.put(key, result, context_key, last)
+
+
+# Shared by agents.py, chatbot.py and main.py
+llm_cache = ResponseCache.from_env()
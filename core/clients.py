@@ -0,0 +1,31 @@
+"""
+The Groq clients, built on first use and shared by every agent.
+
+groq and instructor (which pulls in openai) are most of the startup time,
+so they're only imported when the first LLM call is made.
+"""
+
+import functools
+
+from core.config import env
+
+
+@functools.lru_cache(maxsize=None)
+def groq():
+    """Plain Groq client, paced by core/scheduler.py."""
+    from groq import Groq
+
+    from core.scheduler import scheduler
+
+    return Groq(api_key=env("GROQ_API_KEY"), http_client=scheduler.http_client())
+
+
+@functools.lru_cache(maxsize=None)
+def structured():
+    """instructor client (JSON mode) on top of `groq()`, replies are repaired before they're validated."""
+    import instructor
+
+    from core.repair import install
+    from core.tracing import instrument
+
+    return install(instrument(instructor.from_groq(groq(), instructor.Mode.JSON)))
@@ -0,0 +1,26 @@
+"""
+Settings from the environment, with the .env file loaded first.
+
+Every setting is read through `env()`, so .env values are in place no
+matter which entry point or module reads them first (the clients used to
+read GROQ_API_KEY before `load_dotenv()` had run).
+"""
+
+import os
+
+_loaded = False
+
+
+def load(path: str = None):
+    """Loads .env into os.environ once; variables already set win."""
+    global _loaded
+    if not _loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv(path)
+        _loaded = True
+
+
+def env(name: str, default: str = None) -> str:
+    load()
+    return os.environ.get(name, default)
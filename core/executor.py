@@ -0,0 +1,88 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from core.config import env
+from core.repair import check_arguments, tool_arguments
+
+# Tools that only read expense data and can run side by side.
+READ_ONLY_TOOLS = {
+    "get_all_expenses",
+    "get_expense_summary",
+    "get_spending_summary",
+    "search_expenses",
+    "search_expenses_multi",
+    "read_expense",
+}
+
+
+class ToolRun:
+    """
+    Tool calls of one turn, submitted in the order the model produced them.
+
+    Reads only depend on the last write before them, so consecutive reads
+    run in parallel. Writes depend on everything before them and keep
+    their order. Dependencies are always submitted earlier, and the pool
+    starts tasks in submission order, so waiting on them can't deadlock.
+    """
+
+    def __init__(self, executor: "ToolExecutor"):
+        self.executor = executor
+        self.calls = []
+        self._last_write = None
+        self._reads_since_write = []
+
+    def submit(self, name: str, args: dict):
+        if name in self.executor.read_only:
+            deps = [self._last_write] if self._last_write else []
+        else:
+            deps = [*([self._last_write] if self._last_write else []), *self._reads_since_write]
+
+        # run in a copy of the caller's context so tool spans nest under the turn's span
+        context = contextvars.copy_context()
+        future = self.executor.pool.submit(context.run, self.executor.call, name, args, deps)
+        self.calls.append((name, args, future))
+
+        if name in self.executor.read_only:
+            self._reads_since_write.append(future)
+        else:
+            self._last_write = future
+            self._reads_since_write = []
+        return future
+
+    def results(self) -> list:
+        """Waits for every call, returns (name, args, result) in submission order."""
+        return [(name, args, future.result()) for name, args, future in self.calls]
+
+
+class ToolExecutor:
+    """Runs tool calls from the model on a shared thread pool."""
+
+    def __init__(self, functions: dict, read_only=READ_ONLY_TOOLS, max_workers: int = None):
+        self.functions = functions
+        self.arguments = tool_arguments(functions)
+        self.read_only = set(read_only)
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers or int(env("TOOL_WORKERS", "8")),
+            thread_name_prefix="tool",
+        )
+
+    def call(self, name: str, args: dict, deps=()):
+        if deps:
+            wait(deps)
+        if name not in self.functions:
+            return {"error": f"Unknown tool: {name}"}
+        try:
+            # typed and coerced first: "200 rs" is an amount, not a TypeError deep in the tool
+            return self.functions[name](**check_arguments(self.arguments, name, args or {}))
+        except Exception as e:
+            return {"error": str(e)}
+
+    def start(self) -> ToolRun:
+        return ToolRun(self)
+
+    def run(self, calls) -> list:
+        """Runs a list of (name, args) pairs, returns (name, args, result) in the same order."""
+        run = self.start()
+        for name, args in calls:
+            run.submit(name, args)
+        return run.results()
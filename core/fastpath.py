@@ -0,0 +1,285 @@
+"""
+Local pre-router that answers trivially parseable inputs without an LLM call.
+
+`route(text)` returns a `Route` for confident cases ("coffee 80",
+"uber 250 travel", "lunch 200, cab 150", "show my expenses", "hi") and None
+for everything else, which then goes to Groq as before.
+"""
+
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from core.config import env
+
+CATEGORIES = {
+    "food": "Food",
+    "travel": "Travel",
+    "shopping": "Shopping",
+    "rent": "Rent",
+    "health": "Health",
+    "bills": "Bills",
+    "entertainment": "Entertainment",
+    "groceries": "Groceries",
+    "personal": "Personal",
+    "education": "Education",
+}
+
+# item keyword -> category, used when the message doesn't name one
+ITEM_CATEGORIES = {
+    "Food": "coffee tea lunch dinner breakfast snacks snack pizza burger biryani chai juice "
+    "restaurant meal starbucks swiggy zomato cake icecream",
+    "Travel": "uber ola cab taxi auto bus train metro flight petrol fuel diesel parking toll rapido",
+    "Shopping": "jeans shirt tshirt shoes dress clothes amazon flipkart myntra zara bag watch",
+    "Groceries": "groceries grocery vegetables fruits milk bread eggs rice",
+    "Bills": "electricity water wifi internet phone recharge mobile gas bill",
+    "Entertainment": "movie movies netflix spotify concert game games",
+    "Health": "medicine medicines doctor pharmacy gym hospital",
+    "Rent": "rent",
+}
+# a category's own name counts too ("got 300 food")
+ITEM_CATEGORIES = {
+    **CATEGORIES,
+    **{word: category for category, words in ITEM_CATEGORIES.items() for word in words.split()},
+}
+
+AMOUNT = r"(?:rs\.?\s*|₹\s*|inr\s*)?(?P<amount>\d[\d,]*(?:\.\d{1,2})?)\s*(?:rs\.?|rupees|inr|₹|/-)?"
+ITEM = r"(?P<item>[a-z][a-z &'-]{0,40}?)"
+CATEGORY = r"(?:\s+(?:in\s+|under\s+|for\s+)?(?P<category>[a-z]+))?"
+# possessive: once a verb matched it can't be given back and read as the item ("paid 1200 rent")
+VERB = r"(?:(?:i\s+|we\s+)?(?:spent|paid|bought|add(?:ed)?|got)\s+)?+"
+
+ITEM_FIRST = re.compile(rf"^{VERB}{ITEM}\s+(?:for\s+|of\s+)?{AMOUNT}{CATEGORY}$")
+AMOUNT_FIRST = re.compile(rf"^{VERB}{AMOUNT}\s+(?:(?:for|on)\s+)?{ITEM}{CATEGORY}$")
+SPLIT_ITEMS = re.compile(r"\s*(?:,(?!\d)|;|\n|\band\b)\s*")  # "1,200" stays one amount
+
+LIST_EXPENSES = re.compile(
+    r"^(?:show|list|get|view|display|see)\s+(?:me\s+)?(?:all\s+)?(?:of\s+)?(?:my\s+)?expenses$"
+)
+SEARCH_EXPENSES = re.compile(
+    r"^(?:search|find|show|list)\s+(?:me\s+)?(?:my\s+)?(?:expenses\s+(?:for|on)\s+(?P<a>[a-z ]+)|(?P<b>[a-z]+)\s+expenses)$"
+)
+
+# Words that make a message more than "item amount": it deletes, edits, asks or negates
+# something ("delete coffee 80", "how much was coffee 80", "not coffee 80"), the LLM decides what.
+NOT_AN_ADD = set(
+    "delete remove cancel cancelled refund refunded undo revert reverse return returned update change "
+    "changed edit modify correct fix replace wrong instead rather "
+    "how what when where which who why was is did does show list find search total "
+    "not no never don't dont didn't didnt isn't wasn't".split()
+)
+
+# An item made only of these is the sentence around the expense, not what it was for
+NOT_AN_ITEM = set("i we me my our spent paid bought add added got for on of".split())
+
+# Searches for a period ("expenses for last month") need dates, not a title search
+TIME_WORDS = set(
+    "today yesterday tomorrow day days week weeks month months year years last this past previous next ago "
+    "january february march april may june july august september october november december "
+    "jan feb mar apr jun jul aug sep sept oct nov dec".split()
+)
+
+GREETING = re.compile(
+    r"^(?:hi+|hello|helo|hey+|yo|hola|namaste|good (?:morning|afternoon|evening))(?: there| bot| assistant)?$"
+)
+
+GREETING_REPLY = "Hello! How can I help you track your expenses?"
+
+# Tiny labelled set for the intent classifier
+TRAINING = {
+    "greeting": "hi|hello|hey|hey there|hello there|hi there|good morning|good evening|"
+    "good afternoon|yo|hola|namaste|hii|helo|hi bot|hello assistant",
+    "add": "coffee 80|lunch 200|uber 250 travel|spent 500 on groceries|paid 1200 rent|"
+    "bought jeans for 2000|cab 150|add 300 for dinner|movie 400|pizza 350 food|"
+    "petrol 1000|i spent 90 on tea|electricity bill 1500",
+    "list": "show my expenses|list expenses|show all expenses|get my expenses|view expenses|"
+    "show me my expenses|display all my expenses|what are my expenses",
+    "search": "find coffee expenses|search uber|show food expenses|search expenses for lunch|"
+    "find expenses on travel|show my cab expenses",
+    "other": "delete all expenses|update my last expense|how much did i spend last month|"
+    "i bought jeans from zara|change the amount|remove the coffee expense|what can you do|"
+    "dinner expense|thanks|help me plan a budget|why is my spending so high",
+}
+
+
+def _tokens(text: str) -> list:
+    return re.findall(r"[a-z]+|\d+", text.lower())
+
+
+class IntentClassifier:
+    """Multinomial naive Bayes over word tokens; numbers are folded into one <num> token."""
+
+    def __init__(self, training: dict = TRAINING):
+        self.word_counts = {}
+        self.totals = {}
+        self.priors = {}
+        vocab = set()
+
+        samples = {label: text.split("|") for label, text in training.items()}
+        n = sum(len(s) for s in samples.values())
+        for label, texts in samples.items():
+            counts = Counter(self._features(t) for text in texts for t in _tokens(text))
+            self.word_counts[label] = counts
+            self.totals[label] = sum(counts.values())
+            self.priors[label] = math.log(len(texts) / n)
+            vocab |= set(counts)
+        self.vocab_size = len(vocab)
+
+    @staticmethod
+    def _features(token: str) -> str:
+        return "<num>" if token.isdigit() else token
+
+    def predict(self, text: str) -> tuple:
+        """Returns (label, probability)."""
+        features = [self._features(t) for t in _tokens(text)]
+        scores = {}
+        for label, counts in self.word_counts.items():
+            denom = self.totals[label] + self.vocab_size
+            scores[label] = self.priors[label] + sum(
+                math.log((counts[f] + 1) / denom) for f in features
+            )
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, 1 / norm
+
+
+@dataclass
+class Route:
+    intent: str  # "add", "list", "search" or "greeting"
+    confidence: float
+    items: list = field(default_factory=list)  # [{"item", "amount", "category"}] for "add"
+    query: str = None  # search term for "search"
+    reply: str = None  # canned reply for "greeting"
+
+
+def _parse_amount(raw: str) -> float:
+    return float(raw.replace(",", ""))
+
+
+def parse_item(segment: str):
+    """Parses one 'coffee 80' / 'spent 80 on coffee' segment into an item dict, or None."""
+    match = AMOUNT_FIRST.match(segment) or ITEM_FIRST.match(segment)
+    if not match:
+        return None
+
+    item = " ".join(match.group("item").split())
+    words = set(re.findall(r"[a-z]+(?:'t)?", item))
+    if NOT_AN_ADD & words or words <= NOT_AN_ITEM:
+        return None
+    category = match.group("category")
+    if category:
+        if category not in CATEGORIES:
+            # trailing word isn't a category ("jeans from zara 2000 cash"), not sure what it is
+            return None
+        category = CATEGORIES[category]
+    else:
+        category = next(
+            (ITEM_CATEGORIES[word] for word in item.split() if word in ITEM_CATEGORIES), None
+        )
+        if category is None:
+            return None
+
+    return {"item": item, "amount": _parse_amount(match.group("amount")), "category": category}
+
+
+class FastPathStats:
+    def __init__(self):
+        self.hits = Counter()
+        self.escalated = 0
+        self.seconds = defaultdict(float)  # "fast" / "llm" -> total seconds
+        self.calls = Counter()
+
+    def record(self, path: str, seconds: float, intent: str = None):
+        self.seconds[path] += seconds
+        self.calls[path] += 1
+        if intent:
+            self.hits[intent] += 1
+        elif path == "llm":
+            self.escalated += 1
+
+    def hit_rate(self) -> float:
+        total = sum(self.hits.values()) + self.escalated
+        return sum(self.hits.values()) / total if total else 0.0
+
+    def summary(self) -> str:
+        lines = [f"fast path hit rate: {self.hit_rate():.0%} ({dict(self.hits)}, {self.escalated} escalated)"]
+        for path in ("fast", "llm"):
+            if self.calls[path]:
+                avg = self.seconds[path] / self.calls[path] * 1000
+                lines.append(f"{path:>5}: {self.calls[path]} turns, avg {avg:.1f} ms")
+        return "\n".join(lines)
+
+
+class FastRouter:
+    def __init__(self, threshold: float = 0.75, enabled: bool = None):
+        self.threshold = threshold
+        # FAST_PATH=0 sends every turn to the LLM (timings are still recorded)
+        self.enabled = env("FAST_PATH", "1") == "1" if enabled is None else enabled
+        self.classifier = IntentClassifier()
+        self.stats = FastPathStats()
+
+    def route(self, text: str):
+        """Returns a Route for confident inputs, None when the LLM should handle it."""
+        normalized = " ".join(text.lower().strip().rstrip(".!?").split())
+        if not self.enabled or not normalized:
+            return None
+
+        route = self._match(normalized)
+        return route if route is not None and route.confidence >= self.threshold else None
+
+    def _match(self, normalized: str):
+        """The Route `normalized` looks like, confident or not."""
+        label, confidence = self.classifier.predict(normalized)
+
+        # a whole-message pattern match is as sure as it gets, whatever the classifier says
+        if LIST_EXPENSES.match(normalized):
+            return Route("list", max(confidence, 0.9) if label == "list" else 0.9)
+        if GREETING.match(normalized):
+            return Route("greeting", max(confidence, 0.95), reply=GREETING_REPLY)
+
+        search = SEARCH_EXPENSES.match(normalized)
+        query = (search.group("a") or search.group("b")).strip() if search else None
+        if search and label in ("search", "list") and not TIME_WORDS & set(query.split()):
+            return Route("search", confidence, query=query)
+
+        if label == "greeting" and len(normalized.split()) <= 4:
+            return Route("greeting", confidence, reply=GREETING_REPLY)
+
+        if label == "add":
+            items = [parse_item(segment) for segment in SPLIT_ITEMS.split(normalized) if segment]
+            if items and all(items):
+                return Route("add", confidence, items=items)
+
+        return None
+
+    def timed(self, path: str, intent: str = None):
+        """Context manager that records one turn's latency for `path` ("fast" or "llm")."""
+        return _Timer(self.stats, path, intent)
+
+
+class _Timer:
+    def __init__(self, stats, path, intent):
+        self.stats, self.path, self.intent = stats, path, intent
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(self.path, time.perf_counter() - self.start, self.intent)
+
+
+def format_expenses(expenses: list, limit: int = 20) -> str:
+    """Markdown list of expenses for replies that skip the LLM."""
+    if not expenses:
+        return "You don't have any matching expenses yet."
+
+    lines = []
+    for exp in expenses[:limit]:
+        name = exp.get("title") or exp.get("note") or exp.get("category", "")
+        lines.append(f"- **{name}**: {exp.get('amount')} ({exp.get('category', '')}, {exp.get('date', '')})")
+    if len(expenses) > limit:
+        lines.append(f"- … and {len(expenses) - limit} more")
+    return "\n".join(lines)
@@ -0,0 +1,145 @@
+from core import clients
+from core.config import env
+from core.models import model_router
+from core.scheduler import background
+from core.tracing import record_usage, span
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and an expense-tracking assistant.
+Update the summary with the new messages. Keep every expense detail (item, amount, category, date)
+and any open question the assistant is waiting on. Reply with the summary only, at most 120 words.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), close enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: dict) -> int:
+    return estimate_tokens(str(message["content"])) + 4  # role and separators
+
+
+def truncate_summarizer(summary: str, turns: list, max_chars: int = 1200) -> str:
+    """Summarizer that needs no LLM: keeps the head of every folded turn."""
+    lines = [summary] if summary else []
+    for turn in turns:
+        content = " ".join(str(turn["content"]).split())
+        lines.append(f"{turn['role']}: {content[:200]}")
+    return "\n".join(lines)[-max_chars:]
+
+
+def llm_summarizer(groq=None):
+    """
+    Builds a summarizer that folds turns into the summary with a plain Groq
+    chat call (the shared client by default), on the `summarize` model route.
+    """
+    def summarize(summary: str, turns: list) -> str:
+        transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+        create = model_router.route("summarize", (groq or clients.groq()).chat.completions.create)
+        # folding old turns can wait for queued user turns
+        with span("summarize", turns=len(turns)), background():
+            res = create(
+                model=model_router.model_name("summarize"),
+                messages=[{"role": "system", "content": SUMMARY_PROMPT},
+                          {"role": "user", "content": f"Current summary:\n{summary or '(empty)'}\n\nNew messages:\n{transcript}"}],
+            )
+            record_usage(res)
+        return res.choices[0].message.content.strip()
+    return summarize
+
+
+class ConversationHistory:
+    """
+    Conversation history kept under a token budget.
+
+    `messages(system_prompt)` returns the system prompt, the pinned facts,
+    the running summary and the recent turns verbatim. When that goes over
+    `budget` tokens, the oldest turns (never the last `keep_recent`) are
+    folded into the summary with one `summarize(summary, turns)` call.
+    """
+
+    def __init__(self, budget: int = None, keep_recent: int = None, summarize=None):
+        self.budget = budget or int(env("HISTORY_TOKEN_BUDGET", "2000"))
+        self.keep_recent = keep_recent or int(env("HISTORY_KEEP_RECENT", "6"))
+        self.summarize = summarize or truncate_summarizer
+
+        self.turns = []
+        self.summary = ""
+        self.facts = {}
+
+    def __len__(self):
+        return len(self.turns)
+
+    def append(self, role: str, content: str):
+        self.turns.append({"role": role, "content": content})
+
+    # -- pinned facts -----------------------------------------------------
+
+    def pin(self, key: str, value):
+        self.facts[key] = value
+
+    def unpin(self, key: str):
+        self.facts.pop(key, None)
+
+    def pin_tool_call(self, name: str, args: dict, result=None):
+        """Keeps the details of a tool call around after its turn is folded away."""
+        item = args.get("title") or args.get("note") or args.get("item_name")
+        if name in ("add_expense", "update_expense"):
+            if item:
+                self.pin("last_item", item)
+            if args.get("amount") is not None:
+                self.pin("last_amount", args["amount"])
+            if args.get("category"):
+                self.pin("last_category", args["category"])
+            if isinstance(result, dict) and result.get("id") is not None:
+                self.pin("last_expense_id", result["id"])
+        elif name == "add_expenses_bulk":
+            expenses = args.get("expenses") or []
+            self.pin("last_bulk_add", f"{len(expenses)} expenses")
+        elif name.startswith(("search", "read", "get")):
+            query = args.get("title") or args.get("filter")
+            if query:
+                self.pin("last_search", query)
+            if isinstance(result, list):
+                self.pin("last_result_count", len(result))
+            elif isinstance(result, dict) and "total" in result:
+                self.pin("last_result_count" if "data" in result else "last_total", result["total"])
+
+    # -- window -----------------------------------------------------------
+
+    def _preamble(self, system_prompt: str) -> list:
+        preamble = [{"role": "system", "content": system_prompt}]
+        if self.facts:
+            facts = "\n".join(f"- {key}: {value}" for key, value in self.facts.items())
+            preamble.append({"role": "system", "content": f"Known facts from earlier tool calls:\n{facts}"})
+        if self.summary:
+            preamble.append(
+                {"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}
+            )
+        return preamble
+
+    def _fold(self, system_prompt: str):
+        used = sum(message_tokens(m) for m in self._preamble(system_prompt))
+        used += sum(message_tokens(m) for m in self.turns)
+        if used <= self.budget:
+            return
+
+        foldable = len(self.turns) - self.keep_recent
+        count = 0
+        while count < foldable and used > self.budget:
+            used -= message_tokens(self.turns[count])
+            count += 1
+        if count == 0:
+            return
+
+        folded, self.turns = self.turns[:count], self.turns[count:]
+        self.summary = self.summarize(self.summary, folded)
+
+    def messages(self, system_prompt: str) -> list:
+        """Returns the message list to send, folding old turns first if over budget."""
+        self._fold(system_prompt)
+        return [*self._preamble(system_prompt), *self.turns]
+
+    def tokens(self, system_prompt: str = "") -> int:
+        return sum(message_tokens(m) for m in self._preamble(system_prompt) + self.turns)
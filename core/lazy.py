@@ -0,0 +1,20 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name: str):
+    """
+    Returns module `name` without running it yet: it is imported on first
+    attribute access. For heavy libraries that are only used as `module.attr`
+    (requests, httpx), so importing an entry point doesn't pay for them.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
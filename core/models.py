@@ -0,0 +1,223 @@
+"""
+Model tiers: cheap tasks go to a small fast model, escalating only when needed.
+
+Each task has an ordered list of tiers. A call starts at the first tier
+that isn't cooling down and moves to the next one when
+
+- the response doesn't validate against the `response_model`,
+- `accept(result)` says the answer isn't good enough (e.g. low confidence),
+- the tier is rate limited (it then sits out for Retry-After seconds).
+
+Configured with
+
+    MODEL_TIERS   small:llama-3.1-8b-instant,large:llama-3.3-70b-versatile
+    MODEL_ROUTES  classify:small>large,format:small>large,confirm:small>large,respond:large>small,summarize:small>large
+
+Per-tier calls, latency, tokens and estimated cost are in `summary()`.
+"""
+
+import re
+import threading
+import time
+from collections import defaultdict
+
+from pydantic import ValidationError
+
+from core.config import env
+from core.tracing import annotate, count
+
+DEFAULT_TIERS = "small:llama-3.1-8b-instant,large:llama-3.3-70b-versatile"
+DEFAULT_ROUTES = "classify:small>large,format:small>large,confirm:small>large,respond:large>small,summarize:small>large"
+
+# USD per million (prompt, completion) tokens
+PRICES = {
+    "llama-3.1-8b-instant": (0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "deepseek-r1-distill-llama-70b": (0.75, 0.99),
+}
+
+CONFIRMATION = re.compile(
+    r"^(?:yes|yeah|yep|yup|ok(?:ay)?|sure|confirm(?:ed)?|go ahead|do it|no|nope|cancel|correct|right)\b[\s.!]*$",
+    re.I,
+)
+
+
+def is_confirmation(text: str) -> bool:
+    """Short yes/no style replies, a small model handles those fine."""
+    return bool(CONFIRMATION.match(text.strip()))
+
+
+def _parse(spec: str) -> dict:
+    return dict(part.strip().split(":", 1) for part in spec.split(",") if part.strip())
+
+
+def _usage(result):
+    raw = getattr(result, "_raw_response", result)  # instructor keeps the completion there
+    return getattr(raw, "usage", None)
+
+
+class ModelRouter:
+    def __init__(self, tiers: dict, routes: dict):
+        self.tiers = tiers  # name -> model
+        self.routes = routes  # task -> [tier, ...]
+        self._cooldown = {}  # tier -> monotonic time it may be used again
+        self._lock = threading.Lock()
+        self.stats = defaultdict(
+            lambda: {
+                "calls": 0,
+                "seconds": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "escalated": 0,
+                "rate_limited": 0,
+            }
+        )
+
+    @classmethod
+    def from_env(cls):
+        tiers = _parse(env("MODEL_TIERS", DEFAULT_TIERS))
+        routes = {
+            task: [tier for tier in order.split(">") if tier in tiers]
+            for task, order in _parse(env("MODEL_ROUTES", DEFAULT_ROUTES)).items()
+        }
+        return cls(tiers, routes)
+
+    def model_name(self, task: str) -> str:
+        """
+        Stable name for a task's route, e.g. for cache keys: the configured
+        tiers, whichever of them happens to be cooling down.
+        """
+        order = self.routes.get(task) or list(self.tiers)
+        return "route:" + task + ":" + ">".join(self.tiers[t] for t in order)
+
+    def _order(self, task: str) -> list:
+        order = self.routes.get(task) or list(self.tiers)
+        now = time.monotonic()
+        with self._lock:
+            ready = [t for t in order if self._cooldown.get(t, 0) <= now]
+        # everything cooling down: try them anyway rather than fail outright
+        return ready or order
+
+    def _rate_limited(self, tier: str, error):
+        try:
+            wait = float(error.response.headers.get("retry-after", 10))
+        except (AttributeError, TypeError, ValueError):
+            wait = 10.0
+        with self._lock:
+            self._cooldown[tier] = time.monotonic() + wait
+            self.stats[tier]["rate_limited"] += 1
+
+    def _record(self, tier: str, seconds: float, result=None):
+        usage = _usage(result) if result is not None else None
+        with self._lock:
+            stats = self.stats[tier]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            if usage is not None:
+                stats["prompt_tokens"] += usage.prompt_tokens or 0
+                stats["completion_tokens"] += usage.completion_tokens or 0
+
+    def call(self, task: str, create, accept=None, **kwargs):
+        """
+        Runs `create(model=..., **kwargs)` on the task's tiers in order until
+        one gives an answer; the last tier's error or answer is final.
+        """
+        from groq import RateLimitError
+        from instructor.exceptions import InstructorRetryException
+
+        order = self._order(task)
+        for i, tier in enumerate(order):
+            last = i == len(order) - 1
+            start = time.perf_counter()
+            try:
+                result = create(model=self.tiers[tier], **kwargs)
+            except RateLimitError as e:
+                self._record(tier, time.perf_counter() - start)
+                self._rate_limited(tier, e)
+                if last:
+                    raise
+                continue
+            except (InstructorRetryException, ValidationError):
+                self._record(tier, time.perf_counter() - start)
+                if last:
+                    raise
+                self.stats[tier]["escalated"] += 1
+                count("escalations")
+                continue
+
+            self._record(tier, time.perf_counter() - start, result)
+            if accept is not None and not last and not accept(result):
+                self.stats[tier]["escalated"] += 1
+                count("escalations")
+                continue
+
+            annotate(tier=tier, model=self.tiers[tier])
+            return result
+
+    def stream(self, task: str, create, **kwargs):
+        """
+        Streaming `call`: picks the first tier that starts streaming. Only rate
+        limits before the first item fall through, a stream isn't escalated halfway.
+        """
+        from groq import RateLimitError
+
+        order = self._order(task)
+        for i, tier in enumerate(order):
+            start = time.perf_counter()
+            try:
+                items = iter(create(model=self.tiers[tier], **kwargs))
+                first = next(items)
+            except StopIteration:
+                self._record(tier, time.perf_counter() - start)
+                return
+            except RateLimitError as e:
+                self._record(tier, time.perf_counter() - start)
+                self._rate_limited(tier, e)
+                if i == len(order) - 1:
+                    raise
+                continue
+
+            annotate(tier=tier, model=self.tiers[tier])
+            last = first
+            yield first
+            for last in items:
+                yield last
+            self._record(tier, time.perf_counter() - start, last)
+            return
+
+    def route(self, task: str, create, accept=None):
+        """`create` with the model picked by the router, for `llm_cache.cached_call`."""
+
+        def routed(model=None, **kwargs):
+            return self.call(task, create, accept, **kwargs)
+
+        return routed
+
+    def route_stream(self, task: str, create):
+        """`route` for streaming calls, for `llm_cache.cached_stream`."""
+
+        def routed(model=None, **kwargs):
+            return self.stream(task, create, **kwargs)
+
+        return routed
+
+    def cost(self, tier: str) -> float:
+        stats = self.stats[tier]
+        prompt, completion = PRICES.get(self.tiers.get(tier), (0.0, 0.0))
+        return (stats["prompt_tokens"] * prompt + stats["completion_tokens"] * completion) / 1e6
+
+    def summary(self) -> str:
+        lines = [f"{'tier':<8}{'model':<32}{'calls':>6}{'avg s':>8}{'tokens':>9}{'cost $':>10}{'escalated':>10}{'429s':>6}"]
+        for tier, model in self.tiers.items():
+            stats = self.stats[tier]
+            avg = stats["seconds"] / stats["calls"] if stats["calls"] else 0.0
+            lines.append(
+                f"{tier:<8}{model:<32}{stats['calls']:>6}{avg:>8.2f}"
+                f"{stats['prompt_tokens'] + stats['completion_tokens']:>9}{self.cost(tier):>10.4f}"
+                f"{stats['escalated']:>10}{stats['rate_limited']:>6}"
+            )
+        return "\n".join(lines)
+
+
+# Shared by agents.py, chatbot.py and core/agent.py
+model_router = ModelRouter.from_env()
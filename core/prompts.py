@@ -0,0 +1,102 @@
+"""
+Prompts and tool schemas, built once at import.
+
+Tool schemas are generated from the Python signature of each tool (types,
+defaults, Literal/TypedDict annotations) and the `:param name:` lines of
+its docstring. Everything is rendered with `render()`, which always
+produces the same bytes for the same value, so the static prefix of each
+request (tools + system prompt) stays identical from turn to turn and the
+provider's prompt-prefix cache keeps hitting.
+"""
+
+import inspect
+import json
+import re
+
+from pydantic import Field, create_model
+
+PROMPTS = {}
+
+_PARAM = re.compile(r":param (\w+):\s*(.+?)(?=\n\s*:|\Z)", re.S)
+
+
+def register(name: str, text: str) -> str:
+    """Keeps `text` under `name` (for the benchmark and debugging) and returns it unchanged."""
+    PROMPTS[name] = text
+    return text
+
+
+def render(value) -> str:
+    """Deterministic JSON for prompts: sorted keys, no whitespace variation."""
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def _docs(func):
+    doc = inspect.getdoc(func) or ""
+    summary = doc.split("\n\n")[0].replace("\n", " ").strip()
+    params = {name: " ".join(text.split()) for name, text in _PARAM.findall(doc)}
+    return summary, params
+
+
+def _inline(schema: dict, defs: dict):
+    """Resolves $ref, drops pydantic's titles and null defaults the model doesn't need."""
+    if isinstance(schema, list):
+        return [_inline(item, defs) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema:
+        siblings = {k: v for k, v in schema.items() if k != "$ref"}
+        return {**_inline(defs[schema["$ref"].rsplit("/", 1)[-1]], defs), **_inline(siblings, defs)}
+
+    out = {}
+    for key, value in schema.items():
+        if key in ("title", "$defs") or (key == "default" and value is None):
+            continue
+        if key == "anyOf" and any(v == {"type": "null"} for v in value):
+            # Optional[X] -> X, the argument can simply be left out
+            rest = [v for v in value if v != {"type": "null"}]
+            if len(rest) == 1:
+                out.update(_inline(rest[0], defs))
+                continue
+        out[key] = _inline(value, defs) if key != "properties" else {
+            name: _inline(prop, defs) for name, prop in value.items()
+        }
+    return out
+
+
+def arguments_model(func, base=None):
+    """
+    Pydantic model of the arguments of `func`, named after it.
+
+    Parameters without a default are required, unannotated ones are strings.
+    """
+    param_docs = _docs(func)[1]
+    fields = {}
+    for param in inspect.signature(func).parameters.values():
+        annotation = str if param.annotation is inspect.Parameter.empty else param.annotation
+        default = ... if param.default is inspect.Parameter.empty else param.default
+        fields[param.name] = (annotation, Field(default, description=param_docs.get(param.name)))
+    return create_model(func.__name__, __base__=base, **fields)
+
+
+def function_schema(func, name: str = None, description: str = None) -> dict:
+    """
+    {"name", "description", "parameters"} for `func`, see `arguments_model`.
+
+    `description` overrides the docstring summary (e.g. when the summary
+    talks about HTTP requests rather than what the tool is for).
+    """
+    schema = arguments_model(func).model_json_schema()
+    parameters = _inline(schema, schema.get("$defs", {}))
+    parameters.setdefault("required", [])
+
+    return {
+        "name": name or func.__name__,
+        "description": description or _docs(func)[0],
+        "parameters": parameters,
+    }
+
+
+def openai_tools(schemas: list) -> list:
+    """Wraps function schemas in the {"type": "function", "function": ...} form of the chat API."""
+    return [{"type": "function", "function": schema} for schema in schemas]
@@ -0,0 +1,105 @@
+"""
+Thin client for `core.service`, with the same interface as `core.agent.ExpenseAgent`.
+
+    agent = RemoteAgent("http://127.0.0.1:8080")
+    session_id = agent.new_session("alice")
+    for kind, value in agent.turn(session_id, "coffee 80", user_id="alice"):
+        ...
+"""
+
+import json
+import time
+
+from core.lazy import lazy_import
+from core.tenants import DEFAULT_USER, user_headers
+
+requests = lazy_import("requests")
+
+BUSY_RETRIES = 3
+
+
+class RemoteAgent:
+    def __init__(self, base_url: str, timeout=(5, 300)):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def new_session(self, user_id: str = DEFAULT_USER) -> str:
+        response = self.http.post(
+            f"{self.base_url}/sessions", headers=user_headers(user_id), timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["session_id"]
+
+    def transcript(self, session_id: str, user_id: str = DEFAULT_USER) -> list:
+        response = self.http.get(
+            f"{self.base_url}/sessions/{session_id}/messages", headers=user_headers(user_id), timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def stats(self) -> str:
+        try:
+            health = self.http.get(f"{self.base_url}/health", timeout=self.timeout).json()
+        except requests.exceptions.RequestException as e:
+            return f"service unreachable: {e}"
+        return f"pending: {health['pending']}/{health['max_pending']}, rejected: {health['rejected']}\n{health['stats']}"
+
+    def turn(self, session_id: str, prompt: str, stream: bool = None, user_id: str = DEFAULT_USER):
+        """Yields the service's ("text" | "answer" | "done" | "error", value) events for one message."""
+        url = f"{self.base_url}/sessions/{session_id}/messages"
+        stream = stream is not False
+        try:
+            for attempt in range(BUSY_RETRIES + 1):
+                response = self.http.post(
+                    url,
+                    json={"content": prompt, "stream": stream},
+                    headers=user_headers(user_id),
+                    stream=stream,
+                    timeout=self.timeout,
+                )
+                if response.status_code != 503 or attempt == BUSY_RETRIES:
+                    break
+                # service is at capacity, back off as it asks
+                response.close()
+                time.sleep(float(response.headers.get("Retry-After", 1)))
+
+            if response.status_code == 503:
+                yield ("error", "The assistant is busy right now, please try again in a moment.")
+                return
+            response.raise_for_status()
+
+            if not stream:
+                content = response.json()["content"]
+                yield ("text", content)
+                yield ("done", content)
+                return
+
+            for line in response.iter_lines():
+                if line:
+                    event = json.loads(line)
+                    yield (event["type"], event["value"])
+        except requests.exceptions.RequestException as e:
+            yield ("error", str(e))
+
+
+def chat_loop(base_url: str, user_id: str = DEFAULT_USER):
+    """Interactive CLI against a running service, used by `agents.py --service` and `chatbot.py --service`."""
+    agent = RemoteAgent(base_url)
+    session_id = agent.new_session(user_id)
+
+    try:
+        while True:
+            prompt = input("User : ")
+            print("🤖 : ", end="", flush=True)
+            for kind, value in agent.turn(session_id, prompt, user_id=user_id):
+                if kind == "text":
+                    print(value, end="", flush=True)
+                elif kind in ("answer", "error"):
+                    print(f"\n{value}", end="", flush=True)
+            print()
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        print()
+        print(agent.stats())
@@ -0,0 +1,458 @@
+"""
+Local fixes for structured LLM output, tried before instructor asks the model again.
+
+A reply that fails validation costs a whole extra completion: instructor
+sends the error back and waits for a new answer. Most failures are
+mechanical and are fixed here instead:
+
+- the JSON itself: a ```json fence, prose around it, single quotes,
+  Python's True/None, trailing commas, unquoted keys, raw newlines in
+  strings, closing brackets cut off (`repair_json`, run on every completion
+  of a client set up with `install`);
+- values of the response models (`Repairable`): "0.9" or "90%" for a float,
+  "Low Context" for "low_context", 200 for a string, a dict sent as a JSON
+  string;
+- tool arguments (`ToolArguments`, the typed models `tool_arguments` builds
+  from the tool signatures): "200 rs" for an amount, "yesterday" or
+  "05/01/2024" for a date, `price` for `amount` when the tool has no `price`.
+
+Only what can be read one way is fixed: "2.5k", "500 Dr" or "(80)" as an
+amount go back to the model like any other invalid value.
+
+Whatever is still invalid goes back to the model as before. `repairs` counts
+replies, fixes and retries, the fixes also end up on the current span.
+"""
+
+import json
+import re
+import threading
+from datetime import date as Date
+from datetime import datetime, timedelta
+from types import UnionType
+from typing import Literal, Union, get_args, get_origin
+
+from pydantic import BaseModel, ValidationError, model_validator
+from typing_extensions import get_type_hints, is_typeddict
+
+from core.prompts import arguments_model
+from core.tracing import count
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y%m%d", "%d %b %Y", "%d %B %Y", "%b %d %Y", "%B %d %Y", "%d-%b-%Y", "%d-%b-%y")
+DAY_FIRST = ("%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d-%m-%y", "%d.%m.%y")
+MONTH_FIRST = ("%m/%d/%Y", "%m-%d-%Y", "%m/%d/%y", "%m-%d-%y")
+RELATIVE_DAYS = {"today": 0, "yesterday": -1, "tomorrow": 1}
+
+# argument names models use for the ones the tools have (the system prompt's own example says item_name),
+# only renamed for a tool that has the target and not the alias
+ALIASES = {"item_name": "title", "item": "title", "name": "title", "price": "amount", "cost": "amount"}
+
+_CURRENCY = r"(?:rs\.?|inr|₹|\$|usd|eur|€|£|rupees?|dollars?|/-)"
+# an amount with nothing to misread: a currency and a sign around one number, or a percentage
+_PLAIN_AMOUNT = re.compile(rf"\s*(?:{_CURRENCY}\s*)?[-+]?\s*(?:{_CURRENCY}\s*)?\d[\d.,]*(?:\s*(?:{_CURRENCY}|%))?\s*", re.I)
+
+
+class RepairStats:
+    """Replies seen, fixed locally and sent back to the model, for the CLI summaries."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {"replies": 0, "repaired": 0, "coerced": 0, "retries": 0}
+
+    def add(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+        if key in ("repaired", "coerced"):
+            count(key, n)  # retries are already counted on the span by core/tracing.py
+
+    def summary(self) -> str:
+        replies = self.stats["replies"]
+        rate = lambda n: f"{n / replies:.0%}" if replies else "-"  # noqa: E731
+        return (
+            f"structured output: {replies} replies, {self.stats['repaired']} JSON repaired ({rate(self.stats['repaired'])}), "
+            f"{self.stats['coerced']} values coerced, {self.stats['retries']} retried ({rate(self.stats['retries'])})"
+        )
+
+
+repairs = RepairStats()
+
+
+# -- numbers and dates --------------------------------------------------------
+
+
+class DateParser:
+    """
+    YYYY-MM-DD of statement dates, None for anything else. A statement sticks
+    to one format, so the one that worked last is tried first (a miss costs
+    a strptime per format) and every distinct date is parsed once.
+    """
+
+    def __init__(self, day_first: bool = True):
+        self.formats = list(DATE_FORMATS + (DAY_FIRST + MONTH_FIRST if day_first else MONTH_FIRST + DAY_FIRST))
+        self._parsed = {}
+
+    def __call__(self, text: str):
+        parsed = self._parsed.get(text)
+        if parsed is None and text not in self._parsed:
+            parsed = self._parsed[text] = self._parse(text)
+            if len(self._parsed) > 100_000:
+                self._parsed.clear()
+        return parsed
+
+    def _parse(self, text: str):
+        text = " ".join(text.replace(",", " ").split())
+        if text[:8].isdigit():
+            text = text[:8]  # OFX: 20240105120000[0:GMT]
+        elif re.match(r"\d{4}-\d\d-\d\dT", text):
+            text = text[:10]
+
+        for candidate in (text, text.split(" ")[0]):
+            for i, format in enumerate(self.formats):
+                try:
+                    day = datetime.strptime(candidate, format)
+                except ValueError:
+                    continue
+                if i:
+                    self.formats.insert(0, self.formats.pop(i))
+                return day.strftime("%Y-%m-%d")
+        return None
+
+
+def parse_amount(value):
+    """
+    Signed amount of "1,200.50", "(12.00)", "-₹ 80", "1.234,56", "500 Dr" ...
+    None when there is no number.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value or "").strip().lower()
+    first = re.search(r"\d", text)
+    if first is None:
+        return None
+
+    digits = re.sub(r"[^\d.,]", "", text[first.start() :])  # not the dot of "rs."
+    if "," in digits and "." in digits:
+        decimal = "," if digits.rfind(",") > digits.rfind(".") else "."
+    else:
+        # "12,50" has a decimal comma, "1,200" and "12,00,000" thousands separators
+        decimal = "," if re.search(r",\d{1,2}$", digits) else "."
+    digits = digits.replace("." if decimal == "," else ",", "").replace(decimal, ".")
+    try:
+        amount = float(digits)
+    except ValueError:
+        return None
+
+    prefix = text[: first.start()]
+    negative = "-" in prefix or "(" in prefix or text.endswith(("dr", "dr."))
+    return -amount if negative else amount
+
+
+_dates = DateParser()
+
+
+def coerce_date(value):
+    """YYYY-MM-DD of "yesterday", "05/01/2024", "5 Jan 2024" ...; anything else as it is."""
+    if not isinstance(value, str):
+        return value
+    days = RELATIVE_DAYS.get(value.strip().lower())
+    if days is not None:
+        return (Date.today() + timedelta(days=days)).isoformat()
+    return _dates(value) or value
+
+
+def plain_amount(text: str):
+    """
+    `parse_amount` of "200 rs", "₹1,200", "-80", "90%" ..., None for anything
+    else. Unlike a statement column, a model's "2.5k", "500 Dr" or "(80)"
+    could mean more than one thing.
+    """
+    return parse_amount(text) if _PLAIN_AMOUNT.fullmatch(text) else None
+
+
+def coerce_amount(value):
+    """200.0 of "200 rs", "₹1,200", "Rs. 99" ...; anything else as it is, see `plain_amount`."""
+    if not isinstance(value, str):
+        return value
+    amount = plain_amount(value)
+    return value if amount is None else amount
+
+
+# -- JSON ---------------------------------------------------------------------
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.S)
+_WORD = re.compile(r"[A-Za-z_][\w-]*")
+_NUMBER = re.compile(r"-?\d[\d.eE+-]*")
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _string_end(text: str, start: int):
+    """Index of the quote closing the string opened at `start`, None if it never closes."""
+    quote, i = text[start], start + 1
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == quote:
+            return i
+        i += 1
+    return None
+
+
+def _string(body: str, quote: str) -> str:
+    if quote == "'":
+        body = body.replace("\\'", "'").replace('"', '\\"')
+    return '"' + body.replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t") + '"'
+
+
+def _trim(out: list):
+    """Drops whitespace and a trailing comma from the end of `out`."""
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text: str):
+    """
+    The JSON document in `text` with the usual slips fixed, None when there
+    is nothing to save. A document cut off inside a string or a number isn't
+    guessed at: the model has to say how it ends.
+    """
+    fence = _FENCE.search(text)
+    if fence:
+        text = fence.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    text = text[min(starts) :]
+
+    out, closers, last = [], [], None
+    i = 0
+    while i < len(text) and (closers or not out):
+        ch = text[i]
+        if ch in "\"'":
+            end = _string_end(text, i)
+            if end is None:
+                return None
+            out.append(_string(text[i + 1 : end], ch))
+            last, i = "string", end + 1
+            continue
+        if ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            last = "open"
+        elif ch in "}]":
+            _trim(out)
+            ch = closers.pop() if closers else ch
+            last = "close"
+        elif ch.isalpha() or ch == "_":
+            word = _WORD.match(text, i).group()
+            i += len(word)
+            rest = text[i:].lstrip()
+            if rest.startswith(":"):
+                out.append(json.dumps(word))  # unquoted key
+                last = "string"
+            else:
+                out.append(_LITERALS.get(word, word))
+                last = "word"
+            continue
+        elif ch in "-0123456789" and _NUMBER.match(text, i):
+            number = _NUMBER.match(text, i).group()
+            out.append(number)
+            last, i = "number", i + len(number)
+            continue
+        elif not ch.isspace():
+            last = ch
+        out.append(ch)
+        i += 1
+
+    if closers:
+        # cut off (max tokens): only close what ended on a complete value
+        _trim(out)
+        if last in ("number", "word", ":"):
+            return None
+        out.extend(reversed(closers))
+
+    fixed = "".join(out)
+    try:
+        json.loads(fixed)
+    except ValueError:
+        return None
+    return fixed
+
+
+def loads(text: str):
+    """`json.loads` that falls back to `repair_json`, raises the original error when that fails too."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        fixed = repair_json(text)
+        if fixed is None:
+            raise
+    repairs.add("repaired")
+    return json.loads(fixed)
+
+
+def repair_completion(completion):
+    """completion:response hook, swaps a reply that isn't JSON for its repaired version."""
+    choices = getattr(completion, "choices", None)
+    message = getattr(choices[0], "message", None) if choices else None
+    if message is None or not isinstance(message.content, str):
+        return  # a stream, partial objects are parsed leniently anyway
+    repairs.add("replies")
+
+    # instructor finds the outermost {...} itself, only fix what it would reject
+    text = message.content
+    try:
+        json.loads(text[text.find("{") : text.rfind("}") + 1])
+        return
+    except ValueError:
+        pass
+    fixed = repair_json(text)
+    if fixed is not None:
+        message.content = fixed
+        repairs.add("repaired")
+
+
+def install(client):
+    """Hooks an instructor client so replies are repaired before they're validated."""
+    client.on("completion:response", repair_completion)
+    client.on("parse:error", lambda error: repairs.add("retries"))
+    return client
+
+
+# -- values -------------------------------------------------------------------
+
+
+def coerce_value(annotation, value):
+    """`value` converted to what `annotation` expects when it's a near miss, otherwise unchanged."""
+    if get_origin(annotation) in (Union, UnionType):
+        options = [a for a in get_args(annotation) if a is not type(None)]
+        annotation = options[0] if len(options) == 1 else annotation
+    if value is None:
+        return value
+
+    origin = get_origin(annotation) or annotation
+    if origin is Literal and isinstance(value, str) and value not in get_args(annotation):
+        wanted = re.sub(r"[\s-]+", "_", value.strip().lower())
+        return next((option for option in get_args(annotation) if str(option).lower() == wanted), value)
+    if origin in (float, int) and isinstance(value, str):
+        number = plain_amount(value)
+        if number is None:
+            return value
+        number = number / 100 if value.strip().endswith("%") else number
+        return number if origin is float else int(number) if number.is_integer() else value
+    if origin is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if origin in (dict, list) and isinstance(value, str):
+        try:
+            return loads(value)
+        except ValueError:
+            return [value] if origin is list else value
+    return value
+
+
+def _coerce_fields(model, data: dict) -> dict:
+    fixed = dict(data)
+    for name, field in model.model_fields.items():
+        if name in fixed:
+            fixed[name] = coerce_value(field.annotation, fixed[name])
+    changed = sum(1 for name in fixed if fixed[name] is not data[name])
+    if changed:
+        repairs.add("coerced", changed)
+    return fixed
+
+
+class Repairable(BaseModel):
+    """Base of the response models, coerces near-miss values before they're validated."""
+
+    @model_validator(mode="before")
+    @classmethod
+    def _coerce(cls, data):
+        return _coerce_fields(cls, data) if isinstance(data, dict) else data
+
+
+def _fields(annotation):
+    """name -> annotation of the keys a model or TypedDict takes, None for anything else."""
+    if get_origin(annotation) in (Union, UnionType):
+        options = [a for a in get_args(annotation) if a is not type(None)]
+        annotation = options[0] if len(options) == 1 else annotation
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {name: field.annotation for name, field in annotation.model_fields.items()}
+    if is_typeddict(annotation):
+        return get_type_hints(annotation)
+    return None
+
+
+def _rename(value: dict, fields: dict, changed: list) -> dict:
+    """`value` with the ALIASES keys `fields` doesn't take renamed to the ones it does."""
+    renamed = {}
+    for k, v in value.items():
+        target = ALIASES.get(k)
+        if k not in fields and target in fields and target not in value and target not in renamed:
+            changed.append(k)
+            k = target
+        renamed[k] = v
+    return renamed
+
+
+def _coerce_arguments(value, annotation=None, key: str = None, changed: list = None, nested: bool = False):
+    """
+    Dates by argument name, and amounts of nested items (the arguments
+    themselves go by their annotation), down into lists and dicts; aliased
+    keys of the dicts `annotation` describes.
+    """
+    if isinstance(value, dict):
+        fields = _fields(annotation)
+        if fields:
+            value = _rename(value, fields, changed)
+        fields = fields or {}
+        return {k: _coerce_arguments(v, fields.get(k), k, changed, nested or key is not None) for k, v in value.items()}
+    if isinstance(value, list):
+        args = get_args(annotation) if get_origin(annotation) is list else ()
+        return [_coerce_arguments(v, args[0] if args else None, key, changed, True) for v in value]
+    fixed = value
+    if key == "amount" and nested:
+        fixed = coerce_amount(value)
+    elif key == "date" or (key or "").endswith("_date"):
+        fixed = coerce_date(value)
+    if fixed != value:
+        changed.append(key)
+    return fixed
+
+
+class ToolArguments(BaseModel):
+    """Base of the typed argument models of the tools, see `tool_arguments`."""
+
+    @model_validator(mode="before")
+    @classmethod
+    def _coerce(cls, data):
+        if isinstance(data, str):
+            data = loads(data)  # arguments sent as a JSON string
+        if not isinstance(data, dict):
+            return data
+        changed = []
+        data = _coerce_fields(cls, _rename(data, _fields(cls), changed))
+        data = _coerce_arguments(data, cls, changed=changed)
+        if changed:
+            repairs.add("coerced", len(changed))
+        return data
+
+
+def tool_arguments(functions: dict) -> dict:
+    """Typed argument model of each tool of `functions` (name -> function), from its signature."""
+    return {name: arguments_model(func, base=ToolArguments) for name, func in functions.items()}
+
+
+def check_arguments(models: dict, name: str, arguments) -> dict:
+    """
+    `arguments` of the tool `name` validated against its model: coerced, and
+    without the ones the tool doesn't take. Raises ValueError saying what's
+    wrong; tools without a model pass through unchecked.
+    """
+    model = models.get(name)
+    if model is None:
+        return arguments
+    try:
+        return model.model_validate(arguments).model_dump(exclude_unset=True)
+    except ValidationError as e:
+        errors = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'arguments'}: {err['msg']}" for err in e.errors())
+        raise ValueError(f"Invalid arguments for {name}: {errors}") from None
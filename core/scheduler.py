@@ -0,0 +1,319 @@
+"""
+Pacing for everything we send to Groq.
+
+The clients are built with `http_client=scheduler.http_client()`, so every
+request (instructor's too) goes through `SchedulingTransport`
+(core/transport.py), which
+
+- keeps per-model requests/tokens-per-minute buckets (GROQ_RPM, GROQ_TPM)
+  and corrects them from the x-ratelimit-* headers of each response, the
+  limit headers set their size (so higher account limits are used),
+- holds every model back after a 429 until its Retry-After,
+- caps requests in flight (LLM_CONCURRENCY, streams hold their slot until closed),
+- lets queued interactive turns go before `background()` work (summaries),
+- optionally hedges slow interactive calls: past the LLM_HEDGE_PCT latency
+  percentile of that model a second copy is sent and the first reply wins.
+
+Instructor's validation retries draw from a shared retry budget
+(`scheduler.retrying()`), so a bad prompt can't double the traffic.
+"""
+
+import contextvars
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from json import JSONDecodeError
+
+from pydantic import ValidationError
+
+from core.config import env
+from core.tracing import count, percentile
+
+INTERACTIVE, BACKGROUND = 0, 1
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+@contextmanager
+def background():
+    """LLM calls made inside wait for queued interactive ones."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def parse_duration(value: str) -> float:
+    """Seconds in a Groq reset header like "2m59.56s" or "450ms"."""
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(n) * units[unit] for n, unit in DURATION.findall(value or ""))
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, per_second: float):
+        self.capacity = capacity
+        self.rate = per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n: float, now: float) -> float:
+        """Seconds until `n` tokens are available (a request bigger than the bucket only waits for a full one)."""
+        self._refill(now)
+        missing = min(n, self.capacity) - self.tokens
+        return max(missing / self.rate, 0.0) if self.rate else (0.0 if missing <= 0 else float("inf"))
+
+    def take(self, n: float):
+        self.tokens -= n
+
+    def resize(self, capacity: float, window: float, now: float):
+        """New limit from the server: `capacity` per `window` seconds, the difference is usable at once."""
+        if capacity <= 0 or capacity == self.capacity:
+            return
+        self._refill(now)
+        self.tokens = min(self.tokens + capacity - self.capacity, capacity)
+        self.capacity = capacity
+        self.rate = capacity / window
+
+    def sync(self, remaining: float, reset: float, now: float):
+        """Trusts the server's count, and refills by the time it says the window resets."""
+        self._refill(now)
+        self.tokens = min(self.tokens, remaining)
+        if reset > 0:
+            self.rate = max(self.rate, (self.capacity - remaining) / reset)
+
+
+class RetryBudget:
+    """Retries allowed as a share of requests: each request adds `ratio`, each retry spends 1."""
+
+    def __init__(self, ratio: float = 0.1, reserve: float = 10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.balance = reserve
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+
+class Model:
+    """Limits and recent latencies of one model."""
+
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm, rpm / 60)
+        self.tokens = TokenBucket(tpm, tpm / 60)
+        self.paused_until = 0.0
+        self.latencies = deque(maxlen=200)
+
+    def wait_time(self, tokens: float, now: float) -> float:
+        return max(
+            self.paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now)
+        )
+
+
+class Scheduler:
+    def __init__(
+        self,
+        rpm: float = 30,
+        tpm: float = 6000,
+        concurrency: int = 8,
+        hedge_pct: float = 0,
+        max_retries: int = 2,
+        retry_ratio: float = 0.1,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.concurrency = concurrency
+        self.hedge_pct = hedge_pct
+        self.max_retries = max_retries
+        self.budget = RetryBudget(retry_ratio)
+        self.models = {}
+        self.active = 0
+        self.stats = defaultdict(float)
+        self._waiting = []  # heap of (priority, seq, model, tokens)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max(concurrency * 2, 4), thread_name_prefix="llm-hedge")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            rpm=float(env("GROQ_RPM", "30")),
+            tpm=float(env("GROQ_TPM", "6000")),
+            concurrency=int(env("LLM_CONCURRENCY", "8")),
+            hedge_pct=float(env("LLM_HEDGE_PCT", "0")),
+            max_retries=int(env("LLM_MAX_RETRIES", "2")),
+            retry_ratio=float(env("LLM_RETRY_RATIO", "0.1")),
+        )
+
+    def _model(self, name: str) -> Model:
+        if name not in self.models:
+            self.models[name] = Model(self.rpm, self.tpm)
+        return self.models[name]
+
+    # -- admission ----------------------------------------------------------
+
+    def acquire(self, model: str, tokens: float, priority: int = None):
+        """Blocks until the request may be sent: a free slot, room in the model's buckets, and its turn."""
+        priority = _priority.get() if priority is None else priority
+        ticket = (priority, next(self._seq), model, tokens)
+        start = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now = time.monotonic()
+                timeout = self._admit_wait(ticket, now)
+                if timeout == 0:
+                    break
+                self._cond.wait(timeout)
+
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            state = self._model(model)
+            state.requests.take(1)
+            state.tokens.take(tokens)
+            self.active += 1
+            self._cond.notify_all()
+
+        waited = time.monotonic() - start
+        self.stats["requests"] += 1
+        self.stats["queued_s"] += waited
+        self.budget.deposit()
+        if waited > 0.001:
+            count("queued_ms", round(waited * 1000))
+
+    def _admit_wait(self, ticket, now: float):
+        """0 when `ticket` can go now, else how long to sleep (None: until notified)."""
+        if self.active >= self.concurrency:
+            return None
+        mine = None
+        # an earlier ticket whose model is ready goes first; one that's paced doesn't hold up the others
+        for other in sorted(self._waiting):
+            wait_s = self._model(other[2]).wait_time(other[3], now)
+            if other is ticket:
+                mine = wait_s
+                break
+            if wait_s == 0:
+                return None
+        return mine if mine else 0
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def observe(self, model: str, response, seconds: float):
+        """Feeds a response's latency and rate-limit headers back into the model's buckets."""
+        headers = response.headers
+        now = time.monotonic()
+        with self._cond:
+            state = self._model(model)
+            if response.status_code == 429:
+                self.stats["throttled"] += 1
+                state.paused_until = max(state.paused_until, now + float(headers.get("retry-after") or 1))
+            elif response.status_code < 400:
+                state.latencies.append(seconds)
+
+            if "x-ratelimit-limit-tokens" in headers:
+                state.tokens.resize(float(headers["x-ratelimit-limit-tokens"]), 60, now)
+            if "x-ratelimit-limit-requests" in headers:
+                # a day's quota: spread over the day it only ever raises the per-minute pace, GROQ_RPM stays the floor
+                state.requests.resize(max(self.rpm, float(headers["x-ratelimit-limit-requests"]) / 1440), 60, now)
+            if "x-ratelimit-remaining-tokens" in headers:
+                state.tokens.sync(
+                    float(headers["x-ratelimit-remaining-tokens"]),
+                    parse_duration(headers.get("x-ratelimit-reset-tokens")),
+                    now,
+                )
+            # Groq's request headers count per day: only stop when the day's quota is gone
+            if headers.get("x-ratelimit-remaining-requests") == "0":
+                state.paused_until = max(
+                    state.paused_until, now + parse_duration(headers.get("x-ratelimit-reset-requests"))
+                )
+            self._cond.notify_all()
+
+    def hedge_after(self, model: str):
+        """Seconds after which an interactive call to `model` gets a hedge, None when off or too few samples."""
+        state = self._model(model)
+        if not self.hedge_pct or len(state.latencies) < 20:
+            return None
+        return percentile(sorted(state.latencies), self.hedge_pct)
+
+    def try_acquire(self, model: str, tokens: float) -> bool:
+        """`acquire` without waiting, for hedges: they only go out when there's room right now."""
+        with self._cond:
+            now = time.monotonic()
+            state = self._model(model)
+            if self.active >= self.concurrency or self._waiting or state.wait_time(tokens, now) > 0:
+                return False
+            state.requests.take(1)
+            state.tokens.take(tokens)
+            self.active += 1
+        return True
+
+    # -- retries ------------------------------------------------------------
+
+    def retrying(self):
+        """`max_retries` for instructor: validation retries only, and only while the budget lasts."""
+        from tenacity import Retrying, retry_if_exception_type, stop_after_attempt
+
+        def out_of_budget(retry_state) -> bool:
+            if self.budget.withdraw():
+                self.stats["retries"] += 1
+                return False
+            self.stats["retries_denied"] += 1
+            return True
+
+        return Retrying(
+            stop=stop_after_attempt(self.max_retries + 1) | out_of_budget,
+            retry=retry_if_exception_type((ValidationError, JSONDecodeError)),
+        )
+
+    def budgeted(self, create):
+        """Wraps an instructor `create` so its retries come out of the budget."""
+
+        def call(*args, **kwargs):
+            return create(*args, max_retries=self.retrying(), **kwargs)
+
+        return call
+
+    def http_client(self):
+        """httpx client whose requests all go through this scheduler."""
+        import httpx
+
+        from core.transport import SchedulingTransport
+
+        # same timeout as the Groq SDK's default client
+        return httpx.Client(transport=SchedulingTransport(self), timeout=httpx.Timeout(600, connect=5))
+
+    def summary(self) -> str:
+        s = self.stats
+        requests = s["requests"] or 1
+        return (
+            f"llm requests: {s['requests']:.0f}, avg queued {s['queued_s'] / requests * 1000:.0f} ms, "
+            f"429s: {s['throttled']:.0f}, hedged: {s['hedged']:.0f} (won {s['hedge_wins']:.0f}), "
+            f"retries: {s['retries']:.0f} (denied {s['retries_denied']:.0f})"
+        )
+
+
+# Shared by every Groq client in the app
+scheduler = Scheduler.from_env()
@@ -0,0 +1,352 @@
+"""
+Asyncio HTTP/websocket front end for `core.agent`, one process for many sessions.
+
+Run it with:  python -m core.service --port 8080 [--shards 4]
+
+    POST   /sessions                    -> {"session_id"}
+    GET    /sessions/{id}/messages      -> transcript
+    POST   /sessions/{id}/messages      {"content", "stream"} -> {"content"} or NDJSON events
+    GET    /sessions/{id}/ws            websocket, send {"content"}, receive events
+    DELETE /sessions/{id}
+    GET    /health
+
+Requests act for the user in the X-User-Id header ("default" without one):
+sessions belong to that user and their tool calls touch only that user's
+expenses. The header is only checked against X-User-Token when
+TENANT_SECRET is set (401 otherwise), without it anyone who can reach the
+service can name any user: keep it on a trusted network (core/tenants.py). With --shards N this process only routes: it starts N worker
+processes and sends every user to the same one (consistent hashing, see
+core/tenants.py), so users spread over cores and each keeps their sessions.
+
+Turns run on a thread pool (the agent and its tools are blocking code).
+At most AGENT_MAX_PENDING turns are admitted at once, the rest get a 503
+with Retry-After instead of queueing without bound. Turns of the same
+session run one after the other; LLM calls are capped separately by
+LLM_CONCURRENCY in `core.scheduler`.
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import ClientError, ClientSession, WSMsgType, web
+
+from core.agent import ExpenseAgent
+from core.config import env
+from core.tenants import DEFAULT_USER, TOKEN_HEADER, USER_HEADER, HashRing, authenticate, user_headers
+
+_DONE = object()
+
+
+def _user(request) -> str:
+    try:
+        return authenticate(request.headers.get(USER_HEADER), request.headers.get(TOKEN_HEADER))
+    except PermissionError as e:
+        raise web.HTTPUnauthorized(text=json.dumps({"error": str(e)}), content_type="application/json") from None
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=json.dumps({"error": str(e)}), content_type="application/json") from None
+
+
+class Busy(Exception):
+    """Raised when the service is at AGENT_MAX_PENDING turns."""
+
+
+class AgentService:
+    def __init__(self, agent: ExpenseAgent = None, max_pending: int = None, workers: int = None):
+        self.agent = agent or ExpenseAgent()
+        self.max_pending = max_pending or int(env("AGENT_MAX_PENDING", "64"))
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers or int(env("AGENT_WORKERS", "32")),
+            thread_name_prefix="turn",
+        )
+        self.pending = 0
+        self.rejected = 0
+        self._locks = {}  # session id -> [asyncio.Lock, users], so a busy session doesn't hold pool threads
+
+    async def turn(self, session_id: str, prompt: str, stream: bool = None, user_id: str = DEFAULT_USER):
+        """Async iterator over the events of one turn, run on the pool."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Busy()
+
+        self.pending += 1
+        key = (user_id, session_id)
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        locked, future = False, None
+        try:
+            await entry[0].acquire()
+            locked = True
+            loop = asyncio.get_running_loop()
+            queue = asyncio.Queue()
+
+            def produce():
+                try:
+                    for event in self.agent.turn(session_id, prompt, stream, user_id):
+                        loop.call_soon_threadsafe(queue.put_nowait, event)
+                except Exception as e:
+                    loop.call_soon_threadsafe(queue.put_nowait, ("error", str(e)))
+                finally:
+                    loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+            future = loop.run_in_executor(self.pool, produce)
+            while (event := await queue.get()) is not _DONE:
+                yield event
+            await future
+        finally:
+            if future is None or future.done():
+                self._finish(key, locked)
+            else:
+                # the client went away mid-turn: the worker still runs it, keep its slot and the session until it's done
+                future.add_done_callback(lambda _: self._finish(key, locked))
+
+    def _finish(self, key: tuple, locked: bool):
+        self.pending -= 1
+        entry = self._locks[key]
+        if locked:
+            entry[0].release()
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._locks[key]
+
+    def health(self) -> dict:
+        return {
+            "sessions": len(self.agent.sessions),
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "stats": self.agent.stats(),
+        }
+
+    # -- routes -----------------------------------------------------------
+
+    def _busy(self):
+        return web.json_response(
+            {"error": "Too many requests in flight, retry shortly"},
+            status=503,
+            headers={"Retry-After": "1"},
+        )
+
+    async def _content(self, request):
+        try:
+            data = await request.json()
+        except json.JSONDecodeError:
+            return None, None
+        content = data.get("content") if isinstance(data, dict) else None
+        if not isinstance(content, str) or not content.strip():
+            return None, None
+        return content, data.get("stream")
+
+    async def create_session(self, request):
+        return web.json_response({"session_id": self.agent.new_session(_user(request))}, status=201)
+
+    async def get_messages(self, request):
+        return web.json_response(self.agent.transcript(request.match_info["session_id"], _user(request)))
+
+    async def delete_session(self, request):
+        if not self.agent.sessions.drop(request.match_info["session_id"], _user(request)):
+            return web.json_response({"error": "Session not found"}, status=404)
+        return web.json_response({"status": "deleted"})
+
+    async def post_message(self, request):
+        session_id = request.match_info["session_id"]
+        content, stream = await self._content(request)
+        if content is None:
+            return web.json_response({"error": "Expected {\"content\": \"...\"}"}, status=400)
+
+        events = self.turn(session_id, content, stream, _user(request))
+        try:
+            first = await events.__anext__()
+        except Busy:
+            return self._busy()
+
+        if not stream:
+            reply = first
+            async for reply in events:
+                pass
+            kind, value = reply
+            if kind == "error":
+                return web.json_response({"error": value}, status=500)
+            return web.json_response({"content": value})
+
+        # NDJSON, one {"type", "value"} object per event
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        await response.write(json.dumps({"type": first[0], "value": first[1]}).encode() + b"\n")
+        async for kind, value in events:
+            await response.write(json.dumps({"type": kind, "value": value}).encode() + b"\n")
+        await response.write_eof()
+        return response
+
+    async def websocket(self, request):
+        session_id = request.match_info["session_id"]
+        user_id = _user(request)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                data = json.loads(msg.data)
+            except json.JSONDecodeError:
+                data = None
+            content = data.get("content") if isinstance(data, dict) else None
+            if not isinstance(content, str) or not content.strip():
+                await ws.send_json({"type": "error", "value": "Expected {\"content\": \"...\"}"})
+                continue
+
+            try:
+                async for kind, value in self.turn(session_id, content, data.get("stream", True), user_id):
+                    await ws.send_json({"type": kind, "value": value})
+            except Busy:
+                await ws.send_json({"type": "error", "value": "busy", "retry_after": 1})
+        return ws
+
+    async def get_health(self, request):
+        return web.json_response(self.health())
+
+    async def _shutdown(self, app):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes(
+            [
+                web.post("/sessions", self.create_session),
+                web.get("/sessions/{session_id}/messages", self.get_messages),
+                web.post("/sessions/{session_id}/messages", self.post_message),
+                web.delete("/sessions/{session_id}", self.delete_session),
+                web.get("/sessions/{session_id}/ws", self.websocket),
+                web.get("/health", self.get_health),
+            ]
+        )
+        app.on_shutdown.append(self._shutdown)
+        return app
+
+
+class ShardProxy:
+    """Front of `--shards N`: forwards every request to the worker process that owns its user."""
+
+    def __init__(self, workers: dict):
+        self.workers = workers  # shard name -> worker base url
+        self.ring = HashRing(list(workers))
+        self.http = None
+
+    def _worker(self, request) -> str:
+        return self.workers[self.ring.shard(_user(request))]
+
+    async def forward(self, request):
+        url = self._worker(request) + request.path_qs
+        headers = {
+            **user_headers(_user(request)),
+            "Content-Type": request.headers.get("Content-Type", "application/json"),
+        }
+        if request.path.endswith("/ws"):
+            return await self._forward_ws(request, url, headers)
+
+        try:
+            upstream = await self.http.request(request.method, url, headers=headers, data=await request.read())
+        except ClientError:
+            # worker not up (yet), same answer as a full one
+            return web.json_response(
+                {"error": "Shard unavailable, retry shortly"}, status=503, headers={"Retry-After": "1"}
+            )
+        async with upstream:
+            response = web.StreamResponse(
+                status=upstream.status,
+                headers={k: v for k, v in upstream.headers.items() if k in ("Content-Type", "Retry-After")},
+            )
+            await response.prepare(request)
+            # NDJSON turns are passed on as they arrive
+            async for chunk in upstream.content.iter_any():
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+
+    async def _forward_ws(self, request, url, headers):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        async with self.http.ws_connect(url, headers=user_headers(headers[USER_HEADER])) as upstream:
+
+            async def replies():
+                async for msg in upstream:
+                    if msg.type == WSMsgType.TEXT:
+                        await ws.send_str(msg.data)
+
+            task = asyncio.create_task(replies())
+            async for msg in ws:
+                if msg.type == WSMsgType.TEXT:
+                    await upstream.send_str(msg.data)
+            task.cancel()
+        return ws
+
+    async def get_health(self, request):
+        """The workers' health, summed."""
+        total = {"sessions": 0, "pending": 0, "max_pending": 0, "rejected": 0}
+        stats = []
+        for name, base in self.workers.items():
+            try:
+                async with self.http.get(f"{base}/health") as response:
+                    health = await response.json()
+            except ClientError as e:
+                stats.append(f"[{name}] unreachable: {e}")
+                continue
+            for key in total:
+                total[key] += health[key]
+            stats.append(f"[{name}]\n{health['stats']}")
+        return web.json_response({**total, "stats": "\n".join(stats)})
+
+    async def _start(self, app):
+        self.http = ClientSession()
+
+    async def _close(self, app):
+        await self.http.close()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes([web.get("/health", self.get_health), web.route("*", "/sessions{tail:.*}", self.forward)])
+        app.on_startup.append(self._start)
+        app.on_cleanup.append(self._close)
+        return app
+
+
+def start_workers(shards: int, port: int) -> tuple:
+    """Starts `shards` services on the ports after `port`, returns (processes, {shard name: url})."""
+    processes, workers = [], {}
+    for i in range(shards):
+        worker_port = port + 1 + i
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "core.service", "--host", "127.0.0.1", "--port", str(worker_port)]
+            )
+        )
+        workers[f"shard-{i}"] = f"http://127.0.0.1:{worker_port}"
+    return processes, workers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expense agent service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=int(env("AGENT_SHARDS", "1")),
+        help="worker processes, users are split between them",
+    )
+    args = parser.parse_args()
+
+    if args.shards <= 1:
+        web.run_app(AgentService().app(), host=args.host, port=args.port)
+        raise SystemExit
+
+    processes, workers = start_workers(args.shards, args.port)
+    try:
+        web.run_app(ShardProxy(workers).app(), host=args.host, port=args.port)
+    finally:
+        for process in processes:
+            process.terminate()
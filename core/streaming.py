@@ -0,0 +1,102 @@
+import json
+from typing import Literal, get_args, get_origin
+
+from pydantic import Field, create_model
+
+
+def new_text(previous: str, current: str) -> str:
+    """Returns the part of `current` that wasn't shown yet (partial fields only grow)."""
+    current = current or ""
+    if previous and current.startswith(previous):
+        return current[len(previous) :]
+    return current if current != previous else ""
+
+
+def streamable(model):
+    """
+    Returns a copy of `model` whose Literal fields accept any string.
+
+    Partial JSON cuts literals mid-word ("assi" for "assistant"), which fails
+    validation before the value is complete. The JSON schema, and therefore
+    the prompt, keeps the same enum.
+    """
+    fields = {}
+    for name, field in model.model_fields.items():
+        if get_origin(field.annotation) is not Literal:
+            continue
+        default = ... if field.is_required() else field.default
+        fields[name] = (
+            str,
+            Field(
+                default,
+                description=field.description,
+                json_schema_extra={"enum": list(get_args(field.annotation))},
+            ),
+        )
+
+    if not fields:
+        return model
+    return create_model(model.__name__, __base__=model, **fields)
+
+
+def stream_with_items(partials, field: str):
+    """
+    Yields `(partial, ready)` for a stream of instructor partial objects.
+
+    `ready` lists the items of the list `field` that just became complete. An
+    item is complete once the model has started the next one; whatever is
+    left is reported with the final partial.
+    """
+    done = 0
+    last = None
+    for partial in partials:
+        last = partial
+        items = getattr(partial, field, None) or []
+        ready = items[done : max(done, len(items) - 1)]
+        done += len(ready)
+        yield partial, ready
+
+    if last is not None:
+        items = getattr(last, field, None) or []
+        if len(items) > done:
+            yield last, items[done:]
+
+
+def stream_events(chunks):
+    """
+    Turns raw chat-completion chunks into ("text", delta) and ("tool_call", call) events.
+
+    Tool call arguments arrive in pieces keyed by index; a call is emitted as
+    soon as the next one starts or the stream finishes, with its arguments
+    already parsed into a dict.
+    """
+    pending = {}
+
+    def flush(index):
+        call = pending.pop(index)
+        try:
+            call["arguments"] = json.loads(call["arguments"] or "{}")
+        except json.JSONDecodeError:
+            pass  # left as a string, the caller decides what to do with it
+        return ("tool_call", call)
+
+    for chunk in chunks:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        if delta.content:
+            yield ("text", delta.content)
+
+        for part in delta.tool_calls or []:
+            for index in [i for i in pending if i < part.index]:
+                yield flush(index)
+            call = pending.setdefault(part.index, {"id": None, "name": "", "arguments": ""})
+            if part.id:
+                call["id"] = part.id
+            if part.function is not None:
+                call["name"] += part.function.name or ""
+                call["arguments"] += part.function.arguments or ""
+
+    for index in sorted(pending):
+        yield flush(index)
@@ -0,0 +1,114 @@
+"""
+Which user a request is for, and which shard serves them.
+
+Expense data and conversation history are kept per user id. The id of the
+current turn lives in a contextvar (`as_user`), so tool calls act for the
+right user without passing it around: tools/client.py sends it as the
+X-User-Id header, and the tool executor copies the context into its threads.
+
+Who may act as a user: the id is whatever the caller sends (X-User-Id,
+?user= in the app) unless TENANT_SECRET is set. Then every request also
+needs X-User-Token (?token= in the app), the HMAC of the id with that
+secret, and is refused without a valid one. Tokens are minted by whatever
+authenticates people in front of the app (or `python -m core.tenants <user>`);
+the services and tools/client.py sign their own calls. Without a secret,
+keep the app, `core.service` and tools/server.py on a trusted network: the
+per-user data is kept apart, but nothing stops a caller from naming
+someone else.
+
+Users are spread over shards (worker processes of `core.service --shards`,
+store shards of tools/server.py) with a consistent-hash ring, so adding a
+shard only moves the users that now hash to it.
+"""
+
+import argparse
+import contextvars
+import hashlib
+import hmac
+import re
+from bisect import bisect
+from contextlib import contextmanager
+
+from core.config import env
+
+DEFAULT_USER = "default"
+USER_HEADER = "X-User-Id"
+TOKEN_HEADER = "X-User-Token"
+USER_ID = re.compile(r"[\w.@-]{1,128}")
+
+_user = contextvars.ContextVar("user_id", default=DEFAULT_USER)
+
+
+def current_user() -> str:
+    return _user.get()
+
+
+@contextmanager
+def as_user(user_id: str):
+    """Runs the block (and the tool calls made in it) for `user_id`."""
+    token = _user.set(user_id)
+    try:
+        yield
+    finally:
+        _user.reset(token)
+
+
+def check_user(user_id: str) -> str:
+    """The user id, DEFAULT_USER when empty; ValueError when it isn't a plain id."""
+    if not user_id:
+        return DEFAULT_USER
+    if not USER_ID.fullmatch(user_id):
+        raise ValueError("user id must be 1-128 letters, digits or . _ @ -")
+    return user_id
+
+
+def user_token(user_id: str, secret: str = None):
+    """The X-User-Token of `user_id`, None when there's no TENANT_SECRET."""
+    secret = secret or env("TENANT_SECRET")
+    if not secret:
+        return None
+    return hmac.new(secret.encode(), user_id.encode(), hashlib.sha256).hexdigest()
+
+
+def authenticate(user_id: str, token: str = None) -> str:
+    """
+    The user id of a request, see `check_user`. With TENANT_SECRET set,
+    PermissionError unless `token` is its signature.
+    """
+    user_id = check_user(user_id)
+    expected = user_token(user_id)
+    if expected is not None and not hmac.compare_digest(token or "", expected):
+        raise PermissionError("missing or invalid user token")
+    return user_id
+
+
+def user_headers(user_id: str) -> dict:
+    """Headers that make a request act for `user_id`."""
+    token = user_token(user_id)
+    return {USER_HEADER: user_id, **({TOKEN_HEADER: token} if token else {})}
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing: each shard owns `replicas` points on the ring, a key goes to the next point."""
+
+    def __init__(self, shards: list, replicas: int = 64):
+        points = sorted((_hash(f"{shard}#{i}"), shard) for shard in shards for i in range(replicas))
+        self._hashes = [h for h, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard(self, key: str):
+        return self._shards[bisect(self._hashes, _hash(key)) % len(self._hashes)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prints the X-User-Token (?token=) of a user, signed with TENANT_SECRET")
+    parser.add_argument("user")
+    args = parser.parse_args()
+    token = user_token(check_user(args.user))
+    if token is None:
+        raise SystemExit("TENANT_SECRET is not set, user ids aren't checked")
+    print(token)
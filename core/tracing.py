@@ -0,0 +1,363 @@
+"""
+Spans for each stage of the agent pipeline.
+
+    with span("get_response", model=...) as s:
+        ...
+        s.set(prompt_tokens=..., completion_tokens=...)
+
+Spans nest through a contextvar (copy the context into worker threads, see
+core/executor.py) and are written when they end. Exporters are picked with
+TRACE_EXPORT, a comma separated list:
+
+    jsonl   one JSON object per span in TRACE_FILE (default traces.jsonl),
+            rolled over to TRACE_FILE.1 past TRACE_FILE_MAX_BYTES (64 MB)
+    otlp    OTLP/HTTP JSON to OTEL_EXPORTER_OTLP_ENDPOINT (default http://localhost:4318)
+
+Both export in batches from a background thread. Tracing is off by default
+(TRACE_EXPORT=none): spans are still timed, for the counters and the
+scheduler's latencies, but not written anywhere. Summarize a trace file with:
+
+    python -m core.tracing [traces.jsonl] [--stage PREFIX]
+"""
+
+import argparse
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from core.config import env
+from core.lazy import lazy_import
+
+requests = lazy_import("requests")  # only the OTLP exporter sends anything
+_current = contextvars.ContextVar("span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, parent=None, **attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs
+        self.error = None
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, n=1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class BatchExporter:
+    """
+    Hands spans to a background thread that exports them `batch_size` at a
+    time (or every `interval` seconds), so exporting never blocks a turn.
+    Spans past a full queue are dropped and counted.
+    """
+
+    def __init__(self, name: str, batch_size: int = 64, interval: float = 2.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=10_000)
+        self._thread = threading.Thread(target=self._run, daemon=True, name=name)
+        self._thread.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _send(self, spans: list):
+        raise NotImplementedError
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                except queue.Empty:
+                    break
+                if item is None:
+                    if batch:
+                        self._send(batch)
+                    return
+                batch.append(item)
+            if batch:
+                self._send(batch)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+class JsonlExporter(BatchExporter):
+    """
+    Appends spans to `path` as JSON lines. Past `max_bytes` the file is
+    moved to `path`.1 (replacing the previous one) and a new one started.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, **kwargs):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+        super().__init__("jsonl-export", **kwargs)
+
+    def _send(self, spans: list):
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans))
+            self._file.flush()
+            if self._file.tell() >= self.max_bytes:
+                self._file.close()
+                self._file = None
+                os.replace(self.path, self.path + ".1")
+        except OSError:
+            self.dropped += len(spans)
+
+    def close(self):
+        super().close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPExporter(BatchExporter):
+    """
+    Sends spans as OTLP/HTTP JSON (what any OpenTelemetry collector accepts) in
+    batches from a background thread, so a slow collector never blocks a turn.
+    """
+
+    def __init__(self, endpoint: str, service_name: str = "expense-agent", **kwargs):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        super().__init__("otlp-export", **kwargs)
+
+    def _otlp_span(self, span: Span) -> dict:
+        start = int(span.start * 1e9)
+        otlp = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # internal
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(start + int((span.duration_ms or 0) * 1e6)),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in span.attrs.items()
+                if value is not None
+            ],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp["parentSpanId"] = span.parent_id
+        return otlp
+
+    def _send(self, spans: list):
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "core.tracing"}, "spans": [self._otlp_span(s) for s in spans]}
+                    ],
+                }
+            ]
+        }
+        try:
+            requests.post(self.url, json=body, timeout=5).raise_for_status()
+        except requests.exceptions.RequestException:
+            self.dropped += len(spans)
+
+
+class Tracer:
+    def __init__(self, exporters=()):
+        self.exporters = list(exporters)
+
+    @classmethod
+    def from_env(cls):
+        exporters = []
+        for name in env("TRACE_EXPORT", "none").split(","):
+            name = name.strip()
+            if name == "jsonl":
+                exporters.append(
+                    JsonlExporter(
+                        env("TRACE_FILE", "traces.jsonl"),
+                        max_bytes=int(env("TRACE_FILE_MAX_BYTES", str(64 * 1024 * 1024))),
+                    )
+                )
+            elif name == "otlp":
+                exporters.append(
+                    OTLPExporter(env("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318"))
+                )
+        return cls(exporters)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        span = Span(name, _current.get(), **attrs)
+        token = _current.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - span._t0) * 1000
+            try:
+                _current.reset(token)
+            except ValueError:
+                # ended in another context (an abandoned generator), just unset it
+                _current.set(None)
+            for exporter in self.exporters:
+                exporter.export(span)
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+
+
+tracer = Tracer.from_env()
+atexit.register(tracer.close)  # write out what the exporters still hold
+
+
+def span(name: str, **attrs):
+    """`tracer.span` on the shared tracer."""
+    return tracer.span(name, **attrs)
+
+
+def annotate(**attrs):
+    """Sets attributes on the current span, if there is one."""
+    span = _current.get()
+    if span is not None:
+        span.set(**attrs)
+
+
+def count(key: str, n=1):
+    """Adds `n` to a counter attribute of the current span, if there is one."""
+    span = _current.get()
+    if span is not None:
+        span.add(key, n)
+
+
+def record_usage(completion):
+    """Adds the token usage of a raw chat completion to the current span."""
+    usage = getattr(completion, "usage", None)
+    if usage is not None:
+        count("prompt_tokens", usage.prompt_tokens or 0)
+        count("completion_tokens", usage.completion_tokens or 0)
+
+
+def traced(name: str = None):
+    """Decorator that runs the function in a span (named after it by default)."""
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__) as s:
+                result = func(*args, **kwargs)
+                if isinstance(result, dict) and "error" in result:
+                    s.error = str(result["error"])  # tools report failures instead of raising
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+def instrument(client):
+    """
+    Hooks an instructor client so every completion adds its tokens to the
+    current span and every failed validation (which instructor retries)
+    counts as a retry.
+    """
+    client.on("completion:response", record_usage)
+    client.on("parse:error", lambda error: count("retries"))
+    return client
+
+
+# -- summary CLI ------------------------------------------------------------
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(path: str, stage: str = None) -> str:
+    stages = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if stage is None or record["name"].startswith(stage):
+                    stages[record["name"]].append(record)
+
+    lines = [
+        f"{'stage':<28}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'prompt':>8}{'compl':>7}{'cache':>7}{'retries':>8}{'errors':>7}"
+    ]
+    for name, records in sorted(stages.items()):
+        durations = sorted(r["duration_ms"] for r in records)
+        n = len(records)
+        cached = [r for r in records if "cache" in r]
+        hits = sum(1 for r in cached if r["cache"] == "hit")
+        lines.append(
+            f"{name:<28}{n:>6}"
+            f"{percentile(durations, 50):>9.1f}{percentile(durations, 95):>9.1f}{percentile(durations, 99):>9.1f}"
+            f"{sum(r.get('prompt_tokens', 0) for r in records) / n:>8.0f}"
+            f"{sum(r.get('completion_tokens', 0) for r in records) / n:>7.0f}"
+            f"{(f'{hits / len(cached):.0%}' if cached else '-'):>7}"
+            f"{sum(r.get('retries', 0) for r in records):>8}"
+            f"{sum(1 for r in records if r.get('error')):>7}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage latency percentiles from a trace file")
+    parser.add_argument("path", nargs="?", default=env("TRACE_FILE", "traces.jsonl"))
+    parser.add_argument("--stage", help="only stages whose name starts with this")
+    args = parser.parse_args()
+    print(summarize(args.path, args.stage))
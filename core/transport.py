@@ -0,0 +1,114 @@
+"""
+httpx transport that sends every Groq request through a `core.scheduler.Scheduler`.
+"""
+
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import httpx
+
+from core.scheduler import INTERACTIVE, Scheduler, _priority
+from core.tracing import count
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """
+    Response body that gives the scheduler slot back once it is read to the
+    end or closed, or failing both (a stream the caller stopped reading, e.g.
+    on a Streamlit rerun) once it is garbage collected.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        weakref.finalize(self, release)  # `release` must not hold on to the stream
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+        finally:
+            self._release()
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class SchedulingTransport(httpx.BaseTransport):
+    def __init__(self, scheduler: Scheduler, transport: httpx.BaseTransport = None):
+        self.scheduler = scheduler
+        self.transport = transport or httpx.HTTPTransport()
+
+    def _once(self, request: httpx.Request):
+        """Sends the request, the slot is released when the response is closed."""
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                self.scheduler.release()
+
+        try:
+            response = self.transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    def _timed(self, model: str, request: httpx.Request):
+        start = time.perf_counter()
+        response = self._once(request)
+        self.scheduler.observe(model, response, time.perf_counter() - start)
+        return response
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            body = json.loads(request.content or b"{}")
+        except (ValueError, httpx.RequestNotRead):
+            body = {}
+        model = body.get("model", "")
+        tokens = len(request.content or b"") // 4 + 1  # rough prompt size, the headers correct it
+        scheduler = self.scheduler
+
+        scheduler.acquire(model, tokens)
+        hedge_after = None
+        if _priority.get() == INTERACTIVE and not body.get("stream"):
+            hedge_after = scheduler.hedge_after(model)
+        if hedge_after is None:
+            return self._timed(model, request)
+
+        primary = scheduler._pool.submit(self._timed, model, request)
+        done, _ = wait([primary], timeout=hedge_after)
+        if done or not scheduler.try_acquire(model, tokens):
+            return primary.result()
+
+        scheduler.stats["hedged"] += 1
+        count("hedged")
+        hedge = scheduler._pool.submit(self._timed, model, request)
+        # the first copy that succeeds wins, a failed one waits for the other
+        winner, pending = None, {primary, hedge}
+        while winner is None and pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [f for f in (primary, hedge) if f in done and f.exception() is None]
+            winner = succeeded[0] if succeeded else None
+        if winner is None:
+            return primary.result()  # both failed, raise the primary's error
+        loser = hedge if winner is primary else primary
+        if winner is hedge:
+            scheduler.stats["hedge_wins"] += 1
+        # the slower copy still finishes in the background, drop its body
+        loser.add_done_callback(lambda f: f.exception() is None and f.result().close())
+        return winner.result()
+
+    def close(self):
+        self.transport.close()
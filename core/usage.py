@@ -0,0 +1,66 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class UsageCounter:
+    """
+    Counts LLM calls, wall time and tokens per stage.
+
+    Wrap each call in `track(stage)` and hand the raw completion to
+    `record` inside the block to pick up its token usage.
+    """
+
+    def __init__(self):
+        self.stages = defaultdict(
+            lambda: {"calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        )
+        self.first_tokens = defaultdict(list)
+        self.turns = 0
+
+    @contextmanager
+    def track(self, stage: str):
+        stats = self.stages[stage]
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            stats["calls"] += 1
+            stats["seconds"] += time.perf_counter() - start
+
+    def record(self, stage: str, completion):
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return
+        stats = self.stages[stage]
+        stats["prompt_tokens"] += usage.prompt_tokens or 0
+        stats["completion_tokens"] += usage.completion_tokens or 0
+
+    def first_token(self, stage: str, seconds: float):
+        """Records the time to the first streamed chunk of a call."""
+        self.first_tokens[stage].append(seconds)
+
+    def totals(self) -> dict:
+        total = {"calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+        for stats in self.stages.values():
+            for key in total:
+                total[key] += stats[key]
+        return total
+
+    def summary(self) -> str:
+        lines = [f"{'stage':<20}{'calls':>7}{'seconds':>10}{'prompt':>9}{'completion':>12}"]
+        for stage, stats in [*self.stages.items(), ("total", self.totals())]:
+            lines.append(
+                f"{stage:<20}{stats['calls']:>7}{stats['seconds']:>10.2f}"
+                f"{stats['prompt_tokens']:>9}{stats['completion_tokens']:>12}"
+            )
+        for stage, seconds in self.first_tokens.items():
+            lines.append(f"{stage}: avg time to first token {sum(seconds) / len(seconds):.2f}s")
+        if self.turns:
+            total = self.totals()
+            lines.append(
+                f"per turn: {total['calls'] / self.turns:.2f} calls, "
+                f"{total['seconds'] / self.turns:.2f}s, "
+                f"{(total['prompt_tokens'] + total['completion_tokens']) / self.turns:.0f} tokens"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,41 @@
+from types import SimpleNamespace
+
+from core.agent import answer_from_tools
+from core.executor import ToolExecutor
+from core.history import ConversationHistory, llm_summarizer
+from core.models import model_router
+
+
+def add_expense(title: str, amount: float, category: str) -> dict:
+    return {"id": "1", "title": title, "amount": amount, "category": category}
+
+
+def answer(*calls):
+    executor = ToolExecutor({"add_expense": add_expense}, max_workers=2)
+    run = executor.start()
+    for args in calls:
+        run.submit("add_expense", args)
+    return answer_from_tools(ConversationHistory(), "coffee 80", run)
+
+
+def test_successful_writes_need_no_answer():
+    assert answer({"title": "coffee", "amount": "80 rs", "category": "Food"}) is None
+
+
+def test_failed_write_is_reported():
+    reply = answer({"title": "coffee", "amount": 80}, {"title": "tea", "amount": 20, "category": "Food"})
+    assert reply.startswith("Sorry, I couldn't save that: Invalid arguments for add_expense: category")
+
+
+def test_summaries_use_the_summarize_route():
+    models = []
+
+    def create(model, messages):
+        models.append(model)
+        message = SimpleNamespace(content=" user bought coffee for 80 ")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+    groq = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    summary = llm_summarizer(groq)("", [{"role": "user", "content": "coffee 80"}])
+    assert summary == "user bought coffee for 80"
+    assert models == [model_router.tiers[model_router.routes["summarize"][0]]]
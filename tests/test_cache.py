@@ -0,0 +1,65 @@
+from core.cache import ResponseCache, ngram_embedding
+
+MODEL = "llama-3.3-70b-versatile"
+
+
+def ask(cache, prompt, reply="ok", history=()):
+    calls = []
+
+    def create(**request):
+        calls.append(request)
+        return reply
+
+    messages = [{"role": "system", "content": "You track expenses."}, *history, {"role": "user", "content": prompt}]
+    return cache.cached_call(create, model=MODEL, messages=messages), len(calls)
+
+
+def test_exact_hit_and_miss():
+    cache = ResponseCache()
+    assert ask(cache, "How much on food?") == ("ok", 1)
+    assert ask(cache, "how much  on FOOD?", reply="other") == ("ok", 0)  # same once normalized
+    assert ask(cache, "How much on travel?", reply="other") == ("other", 1)
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 2
+
+
+def test_history_is_part_of_the_key():
+    cache = ResponseCache()
+    ask(cache, "and last week?")
+    history = [{"role": "user", "content": "food?"}, {"role": "assistant", "content": "200"}]
+    assert ask(cache, "and last week?", reply="other", history=history) == ("other", 1)
+
+
+def test_write_tool_calls_are_not_stored():
+    cache = ResponseCache()
+    call = {"name": "add_expense", "arguments": {"amount": 80}}
+    assert ask(cache, "coffee 80", reply=call) == (call, 1)
+    assert ask(cache, "coffee 80", reply=call) == (call, 1)
+    assert cache.stats["skipped_writes"] == 2
+
+
+def test_expired_entries_miss():
+    cache = ResponseCache(ttl=-1)
+    ask(cache, "How much on food?")
+    assert ask(cache, "How much on food?")[1] == 1
+
+
+def test_semantic_hit_needs_the_same_numbers_and_dates():
+    cache = ResponseCache(embed=ngram_embedding)
+    ask(cache, "how much did I spend on food in march 2024", reply="march 2024")
+    assert ask(cache, "how much did i spend on food in march 2024?") == ("march 2024", 0)
+    assert ask(cache, "how much did I spend on food in march 2023", reply="march 2023") == ("march 2023", 1)
+    assert cache.stats["semantic_hits"] == 1
+
+
+def test_tool_calls_only_hit_exactly():
+    cache = ResponseCache(embed=ngram_embedding)
+    call = {"name": "search_expenses", "arguments": {"title": "coffee"}}
+    ask(cache, "search my coffee expenses", reply=call)
+    assert ask(cache, "search my coffee expenses!", reply="fresh") == ("fresh", 1)
+    assert ask(cache, "search my coffee expenses", reply="fresh") == (call, 0)
+
+
+def test_disabled_cache_always_calls():
+    cache = ResponseCache(enabled=False)
+    ask(cache, "How much on food?")
+    assert ask(cache, "How much on food?")[1] == 1
@@ -0,0 +1,33 @@
+import uuid
+
+import pytest
+
+import chatbot
+from core.tenants import as_user
+
+
+@pytest.fixture
+def user():
+    with as_user(f"test-{uuid.uuid4().hex[:8]}"):
+        for i in range(30):
+            chatbot.add_expense(10 + i, "Food", "2024-03-01", f"lunch {i}")
+        chatbot.add_expense(500, "Travel", "2024-03-02", "cab")
+        yield
+
+
+def test_filter_returns_every_match(user):
+    res = chatbot.read_expense(filter="food")
+    assert len(res["data"]) == 30 and res["has_more"] is False
+
+
+def test_ranked_filter_says_when_it_is_cut(user):
+    res = chatbot.read_expense(filter="lunch", mode="ranked", limit=20)
+    assert len(res["data"]) == 20 and res["has_more"] is True
+    res = chatbot.read_expense(filter="cab", mode="ranked")
+    assert [e["note"] for e in res["data"]] == ["cab"] and res["has_more"] is False
+
+
+def test_memoized_filter_sees_new_rows(user):
+    assert len(chatbot.read_expense(filter="food")["data"]) == 30
+    chatbot.add_expense(5, "Food", "2024-03-03", "tea")
+    assert len(chatbot.read_expense(filter="food")["data"]) == 31
@@ -0,0 +1,70 @@
+import pytest
+
+from core.fastpath import FastRouter, parse_item
+
+
+@pytest.fixture(scope="module")
+def router():
+    return FastRouter(enabled=True)
+
+
+@pytest.mark.parametrize(
+    "text, items",
+    [
+        ("coffee 80", [("coffee", 80.0, "Food")]),
+        ("spent 80 on coffee", [("coffee", 80.0, "Food")]),
+        ("uber 250", [("uber", 250.0, "Travel")]),
+        ("lunch 200 and cab 150", [("lunch", 200.0, "Food"), ("cab", 150.0, "Travel")]),
+        ("paid 1200 rent", [("rent", 1200.0, "Rent")]),
+        ("i paid 500 rent", [("rent", 500.0, "Rent")]),
+        ("spent 500 groceries", [("groceries", 500.0, "Groceries")]),
+        ("got 300 food", [("food", 300.0, "Food")]),
+    ],
+)
+def test_adds(router, text, items):
+    route = router.route(text)
+    assert route.intent == "add"
+    assert [(i["item"], i["amount"], i["category"]) for i in route.items] == items
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "delete coffee 80",
+        "remove coffee 80",
+        "refund uber 250",
+        "cancel cab 150",
+        "update coffee to 80",
+        "how much was coffee 80",
+        "not coffee 80",
+        "lunch 200 and delete cab 150",
+        "show me expenses for last month",
+        "paid 1200",
+        "i paid 500",
+    ],
+)
+def test_destructive_and_questions_go_to_the_llm(router, text):
+    assert router.route(text) is None
+
+
+def test_parse_item_rejects_deletes_and_bare_verbs():
+    assert parse_item("delete coffee 80") is None
+    assert parse_item("paid 1200") is None
+    assert parse_item("i spent 80") is None
+    assert parse_item("coffee 80") == {"item": "coffee", "amount": 80.0, "category": "Food"}
+
+
+def test_list_search_and_greeting(router):
+    assert router.route("show my expenses").intent == "list"
+    route = router.route("find expenses for coffee")
+    assert (route.intent, route.query) == ("search", "coffee")
+    assert router.route("hi").intent == "greeting"
+
+
+def test_threshold_applies_to_searches(router):
+    assert router.route("show food expenses") is None  # classifier says "list" at ~0.5
+    assert FastRouter(threshold=0.99, enabled=True).route("find expenses for coffee") is None
+
+
+def test_disabled():
+    assert FastRouter(enabled=False).route("coffee 80") is None
@@ -0,0 +1,77 @@
+import io
+
+import pytest
+
+from core.tenants import as_user
+from tools.importer import StoreSink, import_expenses, normalize
+from tools.tenants import TenantStores
+
+SIGNED = """Date,Description,Amount
+01/03/2024,SALARY MARCH,+50000.00
+02/03/2024,UPI/SWIGGY/1234,-250.00
+03/03/2024,REFUND AMAZON,+1200.00
+04/03/2024,UBER TRIP,-180.50
+"""
+
+UNSIGNED = """Date,Description,Amount,Category
+01/03/2024,Coffee,80,Food
+02/03/2024,Coffee,80,Food
+03/03/2024,Metro card,500,Travel
+"""
+
+
+@pytest.fixture
+def tenants():
+    tenants = TenantStores(1, "memory")
+    yield tenants
+    tenants.close()
+
+
+def run(tenants, text, **kwargs):
+    with as_user("alice"):
+        stats = import_expenses(io.StringIO(text), StoreSink(tenants), llm=False, **kwargs)
+        expenses = tenants.read("alice", lambda db: db.read())
+    return stats, expenses
+
+
+def test_signed_csv_skips_credits(tenants):
+    stats, expenses = run(tenants, SIGNED)
+    assert [(e["title"], e["amount"]) for e in expenses] == [("UPI/SWIGGY/1234", 250.0), ("UBER TRIP", 180.5)]
+    assert (stats.imported, stats.skipped) == (2, 2)
+
+
+def test_credits_later_in_the_file(tenants):
+    # the first chunk has no negative amount, the sign shows up in the second one
+    stats, expenses = run(tenants, UNSIGNED + SIGNED.split("\n", 1)[1], chunk_size=3)
+    assert [e["amount"] for e in expenses] == [80.0, 80.0, 500.0, 250.0, 180.5]
+
+
+def test_unsigned_csv_keeps_every_row(tenants):
+    stats, expenses = run(tenants, UNSIGNED)
+    assert [(e["date"], e["amount"], e["category"]) for e in expenses] == [
+        ("2024-03-01", 80.0, "Food"),
+        ("2024-03-02", 80.0, "Food"),
+        ("2024-03-03", 500.0, "Travel"),
+    ]
+
+
+def test_reimport_adds_only_new_rows(tenants):
+    run(tenants, UNSIGNED)
+    stats, expenses = run(tenants, UNSIGNED + "04/03/2024,Coffee,80,Food\n")
+    assert (stats.imported, stats.duplicates) == (1, 3)
+    assert len(expenses) == 4
+
+
+def test_same_expense_twice_in_one_file(tenants):
+    text = UNSIGNED + "03/03/2024,Metro card,500,Travel\n"
+    stats, expenses = run(tenants, text)
+    assert (stats.imported, stats.duplicates) == (4, 0)
+    stats, _ = run(tenants, text)
+    assert (stats.imported, stats.duplicates) == (0, 4)
+
+
+def test_normalize_debit_credit_columns():
+    assert normalize({"date": "2024-03-01", "debit": "", "credit": "500", "title": "refund"}) is None
+    assert normalize({"date": "2024-03-01", "debit": "1,200.00", "title": "rent"})["amount"] == 1200.0
+    assert normalize({"date": "2024-03-01", "amount": "500 Cr", "title": "x"}, signed=True) is None
+    assert normalize({"date": "not a date", "amount": "5", "title": "x"}) is None
@@ -0,0 +1,142 @@
+import asyncio
+
+from core.tenants import as_user
+from tools.memo import ToolMemo, in_filters, in_period, in_search
+
+FOOD = {"title": "coffee", "amount": 80, "category": "Food", "date": "2025-03-10"}
+TRAVEL = {"title": "taxi", "amount": 300, "category": "Travel", "date": "2025-03-10"}
+
+
+def counted(memo, matcher=in_filters):
+    calls = []
+
+    @memo.cached(matcher)
+    def list_expenses(category: str = None, start_date: str = None, end_date: str = None, limit: int = 50):
+        calls.append(category)
+        return {"status": "success", "data": [category, len(calls)]}
+
+    return list_expenses, calls
+
+
+def test_reads_are_reused_and_defaults_share_an_entry():
+    memo = ToolMemo()
+    list_expenses, calls = counted(memo)
+    first = list_expenses("Food")
+    assert list_expenses("Food", limit=50) == first
+    assert list_expenses(category="Food") == first
+    assert len(calls) == 1
+    assert memo.stats["hits"] == 2
+
+
+def test_a_write_drops_only_the_results_it_touches():
+    memo = ToolMemo()
+    list_expenses, calls = counted(memo)
+    list_expenses("Food")
+    list_expenses("Travel")
+
+    memo.invalidate([TRAVEL])
+    list_expenses("Food")
+    assert calls == ["Food", "Travel"]
+    list_expenses("Travel")
+    assert calls == ["Food", "Travel", "Travel"]
+    assert memo.stats["invalidations"] == 1
+
+
+def test_unknown_rows_drop_everything():
+    memo = ToolMemo()
+    list_expenses, calls = counted(memo)
+    list_expenses("Food")
+    list_expenses("Travel")
+    memo.invalidate()
+    list_expenses("Food")
+    list_expenses("Travel")
+    assert calls == ["Food", "Travel", "Food", "Travel"]
+
+
+def test_a_read_racing_a_write_is_not_stored():
+    memo = ToolMemo()
+    calls = []
+
+    @memo.cached(in_filters)
+    def list_expenses(category: str = None):
+        calls.append(category)
+        memo.invalidate([FOOD])  # a write lands while the tool runs
+        return {"status": "success", "data": len(calls)}
+
+    list_expenses("Food")
+    list_expenses("Food")
+    assert len(calls) == 2
+
+
+def test_failed_results_are_not_stored():
+    memo = ToolMemo()
+    calls = []
+
+    @memo.cached(in_filters)
+    def list_expenses(category: str = None):
+        calls.append(category)
+        return {"status": "error", "message": "down"}
+
+    list_expenses("Food")
+    list_expenses("Food")
+    assert len(calls) == 2
+
+
+def test_entries_expire_and_are_evicted_oldest_first():
+    memo = ToolMemo(ttl=0)
+    list_expenses, calls = counted(memo)
+    list_expenses("Food")
+    list_expenses("Food")
+    assert len(calls) == 2
+
+    memo = ToolMemo(max_entries=2)
+    list_expenses, calls = counted(memo)
+    for category in ("Food", "Travel", "Food", "Bills"):
+        list_expenses(category)
+    assert memo.stats["evictions"] == 1
+    list_expenses("Food")  # used last, still there
+    list_expenses("Travel")  # least recently used, evicted
+    assert calls == ["Food", "Travel", "Bills", "Travel"]
+
+
+def test_entries_are_per_user():
+    memo = ToolMemo()
+    list_expenses, calls = counted(memo)
+    with as_user("alice"):
+        list_expenses("Food")
+    with as_user("bob"):
+        list_expenses("Food")
+        memo.invalidate([FOOD])
+    with as_user("alice"):
+        list_expenses("Food")
+    assert len(calls) == 2
+
+
+def test_async_tools_are_cached():
+    memo = ToolMemo()
+    calls = []
+
+    @memo.cached(in_search)
+    async def search_expenses(title: str = None, mode: str = "substring"):
+        calls.append(title)
+        return {"status": "success", "data": [title]}
+
+    async def run():
+        await search_expenses("coffee")
+        await search_expenses("coffee")
+        memo.invalidate([TRAVEL])
+        await search_expenses("coffee")
+        memo.invalidate([FOOD])
+        await search_expenses("coffee")
+
+    asyncio.run(run())
+    assert calls == ["coffee", "coffee"]
+
+
+def test_predicates():
+    assert in_filters(category="food", start_date="2025-03-01", end_date="2025-03-31")(FOOD)
+    assert not in_filters(category="Food", end_date="2025-03-09")(FOOD)
+    assert in_period("month", "2025-03-31")(FOOD)
+    assert not in_period("month", "2025-04-01")(FOOD)
+    assert in_search(titles=["tax", "cof"])(FOOD)
+    assert not in_search(title="tea")(FOOD)
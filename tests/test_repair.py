@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+import pytest
+
+import chatbot
+from core.repair import check_arguments, coerce_amount, coerce_date, parse_amount, repair_json, tool_arguments
+
+
+@pytest.mark.parametrize(
+    "text, amount",
+    [
+        ("1,200.50", 1200.5),
+        ("12,00,000", 1200000.0),
+        ("1.234,56", 1234.56),
+        ("12,50", 12.5),
+        ("(12.00)", -12.0),
+        ("-₹ 80", -80.0),
+        ("Rs. 99", 99.0),
+        ("500 Dr", -500.0),
+        (200, 200.0),
+        ("n/a", None),
+        ("", None),
+    ],
+)
+def test_parse_amount(text, amount):
+    assert parse_amount(text) == amount
+
+
+@pytest.mark.parametrize("text, amount", [("200 rs", 200.0), ("₹1,200", 1200.0), ("Rs. 99", 99.0), ("-80", -80.0)])
+def test_coerce_amount(text, amount):
+    assert coerce_amount(text) == amount
+
+
+@pytest.mark.parametrize("text", ["INR 2.5k", "500 Dr", "500 Cr", "(80)", "200 and 300", "lots"])
+def test_coerce_amount_leaves_ambiguous_ones_to_the_model(text):
+    assert coerce_amount(text) == text
+
+
+@pytest.mark.parametrize(
+    "text, day",
+    [
+        ("2024-01-05", "2024-01-05"),
+        ("05/01/2024", "2024-01-05"),
+        ("5 Jan 2024", "2024-01-05"),
+        ("Jan 5 2024", "2024-01-05"),
+        ("20240105120000[0:GMT]", "2024-01-05"),
+        ("yesterday", (date.today() - timedelta(days=1)).isoformat()),
+        ("Today", date.today().isoformat()),
+        ("someday", "someday"),
+        (None, None),
+    ],
+)
+def test_coerce_date(text, day):
+    assert coerce_date(text) == day
+
+
+@pytest.fixture(scope="module")
+def models():
+    return tool_arguments(chatbot.available_functions)
+
+
+def test_check_arguments_coerces(models):
+    arguments = check_arguments(
+        models, "add_expense", {"price": "200 rs", "category": "Food", "date": "05/01/2024", "item_name": "tea"}
+    )
+    assert arguments == {"amount": 200.0, "category": "Food", "date": "2024-01-05"}
+
+
+def test_check_arguments_nested_items(models):
+    arguments = check_arguments(
+        models, "add_expenses_bulk", '{"expenses": [{"cost": "₹1,200", "category": "Food", "date": "5 Jan 2024"}]}'
+    )
+    assert arguments == {"expenses": [{"amount": 1200.0, "category": "Food", "date": "2024-01-05"}]}
+
+
+@pytest.mark.parametrize("amount", ["INR 2.5k", "500 Dr"])
+def test_check_arguments_rejects_ambiguous_amounts(models, amount):
+    with pytest.raises(ValueError, match="amount"):
+        check_arguments(models, "add_expense", {"amount": amount, "category": "Food"})
+
+
+def test_repair_json():
+    assert repair_json("```json\n{'a': True, b: [1, 2,],}\n```") == '{"a": true, "b": [1, 2]}'
+    assert repair_json('{"a": [1, {"b": "c"') == '{"a": [1, {"b": "c"}]}'
+    assert repair_json('{"a": 1') is None
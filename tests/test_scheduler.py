@@ -0,0 +1,114 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from core.scheduler import RetryBudget, Scheduler, TokenBucket, parse_duration
+from core.transport import SchedulingTransport
+
+MODEL = "llama-3.1-8b-instant"
+
+
+def test_parse_duration():
+    assert parse_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_duration("450ms") == pytest.approx(0.45)
+    assert parse_duration(None) == 0
+
+
+def test_token_bucket():
+    bucket = TokenBucket(10, 1)
+    now = bucket.updated
+    bucket.take(10)
+    assert bucket.wait_time(4, now) == pytest.approx(4)
+    assert bucket.wait_time(50, now) == pytest.approx(10)  # bigger than the bucket: waits for a full one
+    bucket.resize(20, 10, now)
+    assert (bucket.capacity, bucket.rate, bucket.tokens) == (20, 2, 10)
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, reserve=2)
+    assert budget.withdraw() and budget.withdraw() and not budget.withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def response(status=200, **headers):
+    return httpx.Response(status, headers=headers)
+
+
+def test_observe_pauses_on_429_and_reads_limits():
+    scheduler = Scheduler(rpm=30, tpm=6000)
+    scheduler.observe(MODEL, response(429, **{"retry-after": "3"}), 0.1)
+    state = scheduler.models[MODEL]
+    assert state.wait_time(1, time.monotonic()) > 2.5
+    scheduler.observe(MODEL, response(**{"x-ratelimit-limit-tokens": "30000", "x-ratelimit-limit-requests": "14400"}), 0.1)
+    assert state.tokens.capacity == 30000
+    assert state.requests.capacity == 30  # 14400 a day is 10 a minute, GROQ_RPM stays the floor
+
+
+def test_concurrency_cap():
+    scheduler = Scheduler(concurrency=1)
+    scheduler.acquire(MODEL, 10)
+    admitted = threading.Event()
+    threading.Thread(target=lambda: (scheduler.acquire(MODEL, 10), admitted.set()), daemon=True).start()
+    assert not admitted.wait(0.1)
+    scheduler.release()
+    assert admitted.wait(1)
+
+
+class Scripted(httpx.BaseTransport):
+    """Answers the n-th request after `delay` seconds with 200, or raises ConnectError."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def handle_request(self, request):
+        with self._lock:
+            call = self.calls
+            self.calls += 1
+        delay, ok = self.script[call]
+        time.sleep(delay)
+        if not ok:
+            raise httpx.ConnectError("boom", request=request)
+        return httpx.Response(200, json={"call": call})
+
+
+def hedged(*script):
+    scheduler = Scheduler(hedge_pct=50)
+    scheduler._model(MODEL).latencies.extend([0.01] * 20)
+    transport = Scripted(*script)
+    client = httpx.Client(transport=SchedulingTransport(scheduler, transport))
+    return scheduler, transport, client
+
+
+def send(client):
+    return client.post("https://api.groq.com/openai/v1/chat/completions", json={"model": MODEL})
+
+
+def test_hedge_wins_when_the_primary_is_slow():
+    scheduler, transport, client = hedged((0.3, True), (0.05, True))
+    assert send(client).json() == {"call": 1}
+    assert scheduler.stats["hedge_wins"] == 1
+
+
+def test_failed_primary_waits_for_the_hedge():
+    scheduler, transport, client = hedged((0.1, False), (0.3, True))
+    assert send(client).json() == {"call": 1}
+
+
+def test_failed_hedge_waits_for_the_primary():
+    scheduler, transport, client = hedged((0.3, True), (0.05, False))
+    assert send(client).json() == {"call": 0}
+    assert scheduler.stats["hedge_wins"] == 0
+
+
+def test_both_fail():
+    scheduler, transport, client = hedged((0.1, False), (0.05, False))
+    with pytest.raises(httpx.ConnectError):
+        send(client)
+    time.sleep(0.1)
+    assert scheduler.active == 0
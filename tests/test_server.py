@@ -0,0 +1,49 @@
+import http.client
+import json
+
+import pytest
+
+from tools.server import serve_in_background
+from tools.store import ExpenseStore
+
+
+@pytest.fixture
+def api():
+    store = ExpenseStore()
+    server = serve_in_background(port=0, store=store, quiet=True)
+    yield server.server_port, store
+    server.shutdown()
+    server.server_close()
+
+
+def call(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None)
+    response = conn.getresponse()
+    status, data = response.status, json.loads(response.read())
+    conn.close()
+    return status, data
+
+
+def test_add(api):
+    port, store = api
+    status, expense = call(port, "POST", "/api/expenses", {"title": "tea", "amount": 20, "category": "Food"})
+    assert status == 201 and store.get(expense["id"])["amount"] == 20
+
+
+@pytest.mark.parametrize(
+    "body, error",
+    [
+        ({"title": "tea", "category": "Food"}, "Missing fields: amount"),
+        ({"title": "tea", "amount": "20 rs", "category": "Food"}, "amount must be a number"),
+        ({"title": "tea", "amount": True, "category": "Food"}, "amount must be a number"),
+        ({"title": "tea", "amount": 20, "category": ["Food"]}, "Must be strings: category"),
+        ({"title": "tea", "amount": 20, "category": "Food", "date": "05/01/2024"}, "date must be YYYY-MM-DD"),
+    ],
+)
+def test_add_rejects_bad_fields(api, body, error):
+    port, store = api
+    assert call(port, "POST", "/api/expenses", body) == (400, {"error": error})
+    assert call(port, "POST", "/api/expenses/bulk", {"expenses": [body]}) == (400, {"error": f"expenses[0]: {error}"})
+    assert store.read() == []
+    assert store.summary() == []
@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+import pytest
+
+from core.service import AgentService, Busy
+
+
+class SlowAgent:
+    """Stands in for ExpenseAgent: one event, then waits until `finish` is set."""
+
+    def __init__(self):
+        self.finish = threading.Event()
+        self.sessions = {}
+
+    def turn(self, session_id, prompt, stream, user_id):
+        yield ("text", prompt)
+        self.finish.wait(5)
+        yield ("done", prompt)
+
+
+def test_disconnect_keeps_the_slot_until_the_worker_is_done():
+    async def run():
+        agent = SlowAgent()
+        service = AgentService(agent, max_pending=1, workers=2)
+        turn = service.turn("s1", "hi")
+        assert await turn.__anext__() == ("text", "hi")
+        await turn.aclose()  # the client went away, the worker is still in the turn
+
+        assert service.pending == 1
+        with pytest.raises(Busy):
+            await service.turn("s2", "hi").__anext__()
+
+        agent.finish.set()
+        for _ in range(100):
+            if service.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert service.pending == 0 and service._locks == {}
+        assert [event async for event in service.turn("s1", "again")] == [("text", "again"), ("done", "again")]
+
+    asyncio.run(run())
@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+from benchmarks.bench_startup import TARGETS, bench
+
+# generous next to the ~300-600 ms the entry points take, loading groq/instructor eagerly blows it
+BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", "1500"))
+
+
+@pytest.mark.parametrize("target", TARGETS)
+def test_entry_point_starts_fast(target):
+    result = bench(target, repeat=3)
+    assert result["loaded"] == [], f"{target} imports {result['loaded']} at startup"
+    assert result["median_ms"] < BUDGET_MS
@@ -0,0 +1,77 @@
+import pytest
+
+from tools.store import open_store
+
+BACKENDS = ["memory", "sqlite", "columnar"]
+
+EXPENSES = [
+    {"amount": 80.0, "category": "Food", "date": "2024-01-05", "note": "coffee at the airport", "title": "coffee"},
+    {"amount": 250.0, "category": "Travel", "date": "2024-01-06", "note": "uber to office", "title": "uber"},
+    {"amount": 1200.0, "category": "Shopping", "date": "2024-02-10", "note": "jeans", "title": "jeans"},
+    {"amount": 150.0, "category": "Travel", "date": "2024-02-11", "note": "cab home", "title": "cab"},
+    {"amount": 40.5, "category": "Food", "date": "2024-03-01", "note": "coffee and cake", "title": "cafe"},
+]
+
+
+@pytest.fixture
+def stores(tmp_path):
+    opened = {backend: open_store(backend, str(tmp_path / "expenses.db")) for backend in BACKENDS}
+    for store in opened.values():
+        store.add_many([dict(expense) for expense in EXPENSES[:3]])
+        with store.batch():
+            for expense in EXPENSES[3:]:
+                store.add(**expense)
+    yield opened
+    for store in opened.values():
+        store.close()
+
+
+def same(stores, fn):
+    """fn(store) of every backend, asserting they're all equal."""
+    results = {backend: fn(store) for backend, store in stores.items()}
+    for backend, result in results.items():
+        assert result == results["memory"], backend
+    return results["memory"]
+
+
+def _ids(rows):
+    return [row["id"] for row in rows]
+
+
+def test_reads(stores):
+    rows = same(stores, lambda s: s.read())
+    assert [row["title"] for row in rows] == [e["title"] for e in EXPENSES]
+    same(stores, lambda s: s.get(rows[1]["id"]))
+    same(stores, lambda s: s.get("missing"))
+    same(stores, lambda s: _ids(s.by_category("travel")))
+    same(stores, lambda s: _ids(s.read(filter="coffee")))
+    same(stores, lambda s: _ids(s.read(date_range=("2024-01-06", "2024-02-10"))))
+    same(stores, lambda s: _ids(s.search_title("CA")))
+
+
+def test_query_and_summaries(stores):
+    page, total = same(stores, lambda s: s.query(category="Travel", limit=1, offset=1))
+    assert total == 2 and page[0]["title"] == "cab"
+    same(stores, lambda s: s.query(start_date="2024-02-01", end_date="2024-02-29"))
+    groups = same(stores, lambda s: s.summary())
+    assert {g["key"]: g["total"] for g in groups}["Travel"] == 400.0
+    same(stores, lambda s: s.summary(group_by="month", category="Food"))
+    same(stores, lambda s: s.spending("month", "2024-01-20"))
+
+
+def test_search(stores):
+    hits = same(stores, lambda s: [(hit["title"], hit["score"]) for hit in s.search("cofee")])
+    assert hits and hits[0][0] == "coffee"
+    same(stores, lambda s: _ids(s.search("coffee", date_range=("2024-02-01", "2024-03-31"))))
+
+
+def test_writes(stores):
+    updated = same(stores, lambda s: s.update("2", amount=300.0, note=None))
+    assert (updated["amount"], updated["note"]) == (300.0, "uber to office")
+    assert same(stores, lambda s: s.update("missing", amount=1.0)) is None
+    assert same(stores, lambda s: s.delete("1")) is True
+    assert same(stores, lambda s: s.delete("1")) is False
+    assert len(same(stores, lambda s: s.read())) == 4
+    assert "1" not in same(stores, lambda s: _ids(s.search("coffee")))
+    groups = same(stores, lambda s: s.summary())
+    assert {g["key"]: g["total"] for g in groups}["Travel"] == 450.0
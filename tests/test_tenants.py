@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from core.tenants import TOKEN_HEADER, USER_HEADER, HashRing, authenticate, check_user, user_headers, user_token
+from tools.tenants import TenantStores
+
+
+def test_user_ids():
+    assert check_user(None) == "default"
+    assert check_user("alice@example.com") == "alice@example.com"
+    with pytest.raises(ValueError):
+        check_user("../etc/passwd")
+
+
+def test_without_a_secret_ids_are_taken_as_they_come(monkeypatch):
+    monkeypatch.delenv("TENANT_SECRET", raising=False)
+    assert user_token("alice") is None
+    assert authenticate("alice") == "alice"
+    assert user_headers("alice") == {USER_HEADER: "alice"}
+
+
+def test_with_a_secret_the_token_is_required(monkeypatch):
+    monkeypatch.setenv("TENANT_SECRET", "s3cret")
+    token = user_token("alice")
+    assert authenticate("alice", token) == "alice"
+    assert user_headers("alice") == {USER_HEADER: "alice", TOKEN_HEADER: token}
+    for wrong in (None, "", user_token("bob"), user_token("alice", secret="other")):
+        with pytest.raises(PermissionError):
+            authenticate("alice", wrong)
+
+
+def test_hash_ring_moves_few_users():
+    users = [f"user-{i}" for i in range(1000)]
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    moved = [u for u in users if before.shard(u) != after.shard(u)]
+    assert all(after.shard(u) == "d" for u in moved)
+    assert len(moved) < 400
+
+
+def test_reads_never_see_half_a_write():
+    tenants = TenantStores(1, "memory")
+    stop = threading.Event()
+
+    def add_pairs():
+        for i in range(300):
+            tenants.write("alice", lambda db: (db.add(1, "Food", "2024-01-01"), db.add(1, "Food", "2024-01-01")))
+        stop.set()
+
+    writer = threading.Thread(target=add_pairs)
+    writer.start()
+    sizes = []
+    while not stop.is_set():
+        sizes.append(tenants.read("alice", lambda db: len(db.read())))
+    writer.join()
+    tenants.close()
+    assert all(n % 2 == 0 for n in sizes)
+
+
+def test_idle_sqlite_stores_are_closed_and_reopened(tmp_path):
+    tenants = TenantStores(1, "sqlite", str(tmp_path / "default.db"), str(tmp_path / "users"), max_open=2)
+    shard = tenants.shard("user-0")
+    for i in range(5):
+        tenants.write(f"user-{i}", lambda db, i=i: db.add(i, "Food", "2024-01-01", title=f"item {i}"))
+    assert len(shard) == 2 and shard.evictions == 3
+
+    with shard._using("user-4"):  # busy stores stay open whatever their age
+        for i in range(3):
+            tenants.read(f"user-{i}", lambda db: db.read())
+        assert "user-4" in shard._stores
+
+    assert [e["title"] for e in tenants.read("user-0", lambda db: db.read())] == ["item 0"]
+    tenants.close()
+
+
+def test_memory_stores_are_never_closed():
+    tenants = TenantStores(1, "memory", max_open=1)
+    for i in range(3):
+        tenants.write(f"user-{i}", lambda db: db.add(1, "Food", "2024-01-01"))
+    assert len(tenants.shard("user-0")) == 3
+    tenants.close()
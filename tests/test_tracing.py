@@ -0,0 +1,37 @@
+import json
+
+from core.tracing import JsonlExporter, Tracer
+
+
+def test_off_by_default(monkeypatch):
+    monkeypatch.delenv("TRACE_EXPORT", raising=False)
+    assert Tracer.from_env().exporters == []
+
+
+def test_jsonl_spans_are_written_in_the_background(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonlExporter(str(path), interval=0.05)
+    tracer = Tracer([exporter])
+    with tracer.span("turn", user="alice"):
+        with tracer.span("tool.search_expenses") as s:
+            s.add("prompt_tokens", 12)
+    tracer.close()
+
+    child, parent = [json.loads(line) for line in path.read_text().splitlines()]
+    assert (parent["name"], parent["user"]) == ("turn", "alice")
+    assert (child["parent_id"], child["prompt_tokens"]) == (parent["span_id"], 12)
+
+
+def test_jsonl_file_rolls_over(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonlExporter(str(path), max_bytes=1000, batch_size=1, interval=0.01)
+    tracer = Tracer([exporter])
+    for i in range(50):
+        with tracer.span("step", i=i):
+            pass
+    tracer.close()
+
+    rolled = (tmp_path / "traces.jsonl.1").read_text().splitlines()
+    current = path.read_text().splitlines() if path.exists() else []
+    assert 0 < len(rolled) < 50
+    assert json.loads((current or rolled)[-1])["i"] == 49
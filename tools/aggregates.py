@@ -0,0 +1,85 @@
+"""
+Running spending totals per period and category, kept up to date on every write.
+
+Each expense counts towards one bucket per period:
+
+    day    2025-03-14
+    week   2025-W11   (ISO week)
+    month  2025-03
+    year   2025
+    all    all
+
+so "how much did I spend on food this month" is a dict lookup instead of a
+scan over every expense.
+"""
+
+from datetime import date as Date, datetime
+
+PERIODS = ("day", "week", "month", "year", "all")
+
+
+def period_keys(date: str) -> dict:
+    """Bucket key of every period for a YYYY-MM-DD date (only "all" for anything else)."""
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return {"all": "all"}
+    year, week, _ = day.isocalendar()
+    return {
+        "day": date,
+        "week": f"{year}-W{week:02d}",
+        "month": date[:7],
+        "year": date[:4],
+        "all": "all",
+    }
+
+
+def period_key(period: str, date: str = None) -> str:
+    """Key of the `period` bucket containing `date` (today by default)."""
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    key = period_keys(date or Date.today().isoformat()).get(period)
+    if key is None:
+        raise ValueError("date must be in YYYY-MM-DD format")
+    return key
+
+
+def summarize(period: str, key: str, groups: list, category: str = None) -> dict:
+    """The tool result for one bucket, from its [{"category", "total", "count"}] groups."""
+    if category:
+        groups = [g for g in groups if g["category"].lower() == category.lower()]
+    groups = sorted(
+        ({**g, "total": round(g["total"], 2)} for g in groups), key=lambda g: (-g["total"], g["category"])
+    )
+    return {
+        "period": period,
+        "key": key,
+        "total": round(sum(g["total"] for g in groups), 2),
+        "count": sum(g["count"] for g in groups),
+        "by_category": groups,
+    }
+
+
+class SpendingAggregates:
+    """In-memory totals for `tools.store.ExpenseStore`: (period, key) -> category -> totals."""
+
+    def __init__(self):
+        self._buckets = {}
+
+    def add(self, expense: dict, sign: int = 1):
+        category = expense["category"]
+        for period, key in period_keys(expense["date"]).items():
+            bucket = self._buckets.setdefault((period, key), {})
+            group = bucket.setdefault(category.lower(), {"category": category, "total": 0.0, "count": 0})
+            group["total"] += sign * expense["amount"]
+            group["count"] += sign
+            if group["count"] <= 0:
+                del bucket[category.lower()]
+                if not bucket:
+                    del self._buckets[(period, key)]
+
+    def remove(self, expense: dict):
+        self.add(expense, sign=-1)
+
+    def groups(self, period: str, key: str) -> list:
+        return [dict(g) for g in self._buckets.get((period, key), {}).values()]
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+
+from core.config import env
+from core.lazy import lazy_import
+from core.tenants import current_user, user_headers
+
+# imported on the first tool call, not with the agent
+httpx = lazy_import("httpx")
+requests = lazy_import("requests")
+
+# Settings (override through environment variables)
+BASE_URL = env("EXPENSE_API_URL", "http://localhost:3030")
+CONNECT_TIMEOUT = float(env("EXPENSE_API_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(env("EXPENSE_API_READ_TIMEOUT", "10"))
+MAX_RETRIES = int(env("EXPENSE_API_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(env("EXPENSE_API_BACKOFF", "0.3"))
+POOL_SIZE = int(env("EXPENSE_API_POOL_SIZE", "10"))
+
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Only idempotent requests are retried on read errors and 5xx responses.
+# Connection errors are retried for every method, the request never reached
+# the server in that case.
+RETRY_STATUSES = (502, 503, 504)
+
+_session = None
+_async_client = None
+_lock = threading.Lock()
+
+
+def url_for(path: str) -> str:
+    """Builds a full backend URL from an API path like '/api/expenses'."""
+    return BASE_URL.rstrip("/") + path
+
+
+def _user_header(request):
+    # every backend call is made for the user of the current turn (core/tenants.py)
+    request.headers.update(user_headers(current_user()))
+    return request
+
+
+def _build_session() -> "requests.Session":
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    session.auth = _user_header
+    return session
+
+
+def get_session() -> "requests.Session":
+    """
+    Returns the shared keep-alive session used for all backend calls.
+
+    The session is created on first use and reused afterwards, so every tool
+    call goes over a pooled connection instead of a fresh TCP handshake.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get_async_client() -> "httpx.AsyncClient":
+    """
+    Returns the shared async client, the httpx twin of `get_session`.
+
+    The client is bound to the event loop it is first used on.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        transport = httpx.AsyncHTTPTransport(retries=MAX_RETRIES)
+        _async_client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE
+            ),
+            headers={"Content-Type": "application/json"},
+            auth=_user_header,
+        )
+    return _async_client
+
+
+async def async_request(method: str, path: str, **kwargs) -> "httpx.Response":
+    """
+    Sends a request with the shared async client.
+
+    `httpx` only retries failed connects, so idempotent requests that hit a
+    retryable status or a read timeout are retried here with the same
+    backoff as the sync session.
+    """
+    client = get_async_client()
+    retryable = method.upper() in ("GET", "HEAD", "OPTIONS")
+
+    for attempt in range(MAX_RETRIES + 1):
+        last_try = attempt == MAX_RETRIES or not retryable
+        try:
+            response = await client.request(method, url_for(path), **kwargs)
+        except httpx.ReadTimeout:
+            if last_try:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or last_try:
+                return response
+        await asyncio.sleep(BACKOFF_FACTOR * (2**attempt))
+
+
+def close():
+    """Closes the shared sync session (the async client is closed with `aclose`)."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+async def aclose():
+    """Closes the shared async client."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -0,0 +1,372 @@
+"""
+Columnar in-memory expense store for long histories and many resident sessions.
+
+A row is a position in a set of typed arrays instead of a dict:
+
+    _ids         array("q")   expense id, increasing, so lookups bisect
+    _amounts     array("d")
+    _days        array("i")   date as a proleptic ordinal (0: not a YYYY-MM-DD date, see _odd_dates)
+    _categories  array("I")   code in the category pool
+    _notes       array("I")   code in the note pool
+    _titles      array("I")   code in the title pool
+    _alive       bytearray    0 once deleted, the arrays are compacted later
+
+Categories, notes and titles repeat a lot, so each distinct string is kept
+once in a pool and keyword filters only test the distinct values. With
+NumPy installed the filters and sums run vectorized over zero-copy views
+of the arrays, otherwise as plain loops. Dicts are only built for the
+rows a call returns.
+
+Same interface as `tools.store.ExpenseStore`; not thread-safe either.
+"""
+
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import date as Date, datetime
+from functools import lru_cache
+
+from tools.aggregates import SpendingAggregates, period_key, summarize
+from tools.search import SearchIndex
+
+try:
+    import numpy as np
+except ImportError:  # plain loops over the arrays instead
+    np = None
+
+MIN_DAY, MAX_DAY = Date.min.toordinal(), Date.max.toordinal()
+
+
+def _day(text: str):
+    """Ordinal of a YYYY-MM-DD date, None for anything else."""
+    try:
+        return Date.fromisoformat(text).toordinal() if len(text) == 10 else None
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=8192)
+def _iso(day: int) -> str:
+    # histories cover a few thousand distinct days, decode each once
+    return Date.fromordinal(day).isoformat()
+
+
+class _Pool:
+    """Interned strings: each distinct value is stored once and rows keep its code."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def containing(self, needle: str) -> set:
+        return {code for code, value in enumerate(self.values) if needle in value.lower()}
+
+    def equal(self, value: str) -> set:
+        value = value.lower()
+        return {code for code, other in enumerate(self.values) if other.lower() == value}
+
+
+class ColumnarExpenseStore:
+    thread_safe = False
+    optimistic_reads = False  # NumPy views of the arrays would block a concurrent append
+
+    def __init__(self):
+        self._ids = array("q")
+        self._amounts = array("d")
+        self._days = array("i")
+        self._categories = array("I")
+        self._notes = array("I")
+        self._titles = array("I")
+        self._alive = bytearray()
+        self._odd_dates = {}  # row -> date text that isn't YYYY-MM-DD
+        self._deleted = 0
+        self._category_pool = _Pool()
+        self._note_pool = _Pool()
+        self._title_pool = _Pool()
+        self.aggregates = SpendingAggregates()
+        self._search = None  # built on the first search(), keyed by the int id
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self._ids) - self._deleted
+
+    # -- rows ---------------------------------------------------------------
+
+    def _date(self, i: int) -> str:
+        day = self._days[i]
+        return _iso(day) if day else self._odd_dates[i]
+
+    def _row(self, i: int) -> dict:
+        return {
+            "id": str(self._ids[i]),
+            "title": self._title_pool.values[self._titles[i]],
+            "amount": self._amounts[i],
+            "category": self._category_pool.values[self._categories[i]],
+            "date": self._date(i),
+            "note": self._note_pool.values[self._notes[i]],
+        }
+
+    def _find(self, expense_id: str):
+        try:
+            key = int(expense_id)
+        except (TypeError, ValueError):
+            return None
+        i = bisect_left(self._ids, key)
+        if i < len(self._ids) and self._ids[i] == key and self._alive[i]:
+            return i
+        return None
+
+    def _set_date(self, i: int, text: str):
+        day = _day(text)
+        self._days[i] = day or 0
+        if day:
+            self._odd_dates.pop(i, None)
+        else:
+            self._odd_dates[i] = text
+
+    # -- operations ---------------------------------------------------------
+
+    def add(
+        self, amount: float, category: str, date: str = None, note: str = "", title: str = ""
+    ) -> dict:
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")  # Default to today's date
+
+        i = len(self._ids)
+        self._ids.append(self._next_id)
+        self._amounts.append(amount)
+        self._days.append(0)
+        self._categories.append(self._category_pool.code(category))
+        self._notes.append(self._note_pool.code(note))
+        self._titles.append(self._title_pool.code(title))
+        self._alive.append(1)
+        self._set_date(i, date)
+        self._next_id += 1
+
+        expense = self._row(i)
+        self.aggregates.add(expense)
+        if self._search is not None:
+            self._search.add(self._ids[i], expense)
+        return expense
+
+    def get(self, expense_id: str):
+        i = self._find(expense_id)
+        return None if i is None else self._row(i)
+
+    def update(self, expense_id: str, **fields) -> dict:
+        """Applies the non-None fields to an expense, returns None if it doesn't exist."""
+        i = self._find(expense_id)
+        if i is None:
+            return None
+
+        self.aggregates.remove(self._row(i))
+        if fields.get("amount") is not None:
+            self._amounts[i] = fields["amount"]
+        if fields.get("category") is not None:
+            self._categories[i] = self._category_pool.code(fields["category"])
+        if fields.get("date") is not None:
+            self._set_date(i, fields["date"])
+        if fields.get("note") is not None:
+            self._notes[i] = self._note_pool.code(fields["note"])
+        if fields.get("title") is not None:
+            self._titles[i] = self._title_pool.code(fields["title"])
+
+        expense = self._row(i)
+        self.aggregates.add(expense)
+        if self._search is not None:
+            self._search.add(self._ids[i], expense)
+        return expense
+
+    def delete(self, expense_id: str) -> bool:
+        i = self._find(expense_id)
+        if i is None:
+            return False
+        self.aggregates.remove(self._row(i))
+        if self._search is not None:
+            self._search.remove(self._ids[i])
+        self._alive[i] = 0
+        self._deleted += 1
+        if self._deleted > 1024 and self._deleted * 2 > len(self._ids):
+            self._compact()
+        return True
+
+    def _compact(self):
+        """Drops deleted rows from the arrays (the string pools keep their values)."""
+        keep = [i for i, alive in enumerate(self._alive) if alive]
+        for name in ("_ids", "_amounts", "_days", "_categories", "_notes", "_titles"):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[i] for i in keep)))
+        position = {old: new for new, old in enumerate(keep)}
+        self._odd_dates = {position[i]: text for i, text in self._odd_dates.items() if i in position}
+        self._alive = bytearray(b"\x01") * len(keep)
+        self._deleted = 0
+
+    def add_many(self, expenses: list) -> list:
+        return [self.add(**expense) for expense in expenses]
+
+    @contextmanager
+    def batch(self):
+        # nothing to coalesce in memory, kept for parity with SQLiteExpenseStore
+        yield self
+
+    def close(self):
+        pass
+
+    # -- filters ------------------------------------------------------------
+
+    def _select(self, categories=None, notes=None, titles=None, start=None, end=None, as_array=False):
+        """
+        Rows whose category code is in `categories` or note code in `notes`
+        (when given), title code in `titles`, and date within [start, end].
+
+        A list of row numbers, or with NumPy and `as_array` an index array.
+        """
+        if not self._ids:
+            return np.zeros(0, dtype=np.intp) if np is not None and as_array else []
+        lo, hi, slow = self._bounds(start, end)
+
+        if np is not None:
+            mask = np.frombuffer(self._alive, dtype=np.bool_).copy()
+            if categories is not None or notes is not None:
+                keyword = np.zeros(len(mask), dtype=np.bool_)
+                if categories:
+                    keyword |= np.isin(np.frombuffer(self._categories, dtype=np.uint32), list(categories))
+                if notes:
+                    keyword |= np.isin(np.frombuffer(self._notes, dtype=np.uint32), list(notes))
+                mask &= keyword
+            if titles is not None:
+                mask &= np.isin(np.frombuffer(self._titles, dtype=np.uint32), list(titles))
+            if start or end:
+                days = np.frombuffer(self._days, dtype=np.int32)
+                in_range = (days >= lo) & (days <= hi)
+                for i in self._odd_dates if not slow else range(len(mask)):
+                    in_range[i] = self._in_range(i, start, end)
+                mask &= in_range
+            rows = np.flatnonzero(mask)
+            return rows if as_array else rows.tolist()
+
+        rows = [i for i, alive in enumerate(self._alive) if alive]
+        if categories is not None or notes is not None:
+            categories, notes = categories or set(), notes or set()
+            rows = [i for i in rows if self._categories[i] in categories or self._notes[i] in notes]
+        if titles is not None:
+            rows = [i for i in rows if self._titles[i] in titles]
+        if start or end:
+            days = self._days
+            rows = [
+                i
+                for i in rows
+                if (lo <= days[i] <= hi if days[i] and not slow else self._in_range(i, start, end))
+            ]
+        return rows
+
+    @staticmethod
+    def _bounds(start, end) -> tuple:
+        """(lo, hi) ordinals for a date range, and whether some bound needs text comparison."""
+        lo = _day(start) if start else MIN_DAY
+        hi = _day(end) if end else MAX_DAY
+        # "0000-01-01" style open bounds sort before/after every real date
+        if lo is None and start < Date.min.isoformat():
+            lo = MIN_DAY
+        if hi is None and end > Date.max.isoformat():
+            hi = MAX_DAY
+        return lo or MIN_DAY, hi or MAX_DAY, lo is None or hi is None
+
+    def _in_range(self, i: int, start, end) -> bool:
+        # the old string comparison, for dates that aren't YYYY-MM-DD
+        text = self._date(i)
+        return (not start or start <= text) and (not end or text <= end)
+
+    def _keyword(self, needle: str) -> dict:
+        return {
+            "categories": self._category_pool.containing(needle),
+            "notes": self._note_pool.containing(needle),
+        }
+
+    # -- queries ------------------------------------------------------------
+
+    def by_category(self, category: str) -> list:
+        return [self._row(i) for i in self._select(categories=self._category_pool.equal(category))]
+
+    def read(self, filter: str = None, date_range: tuple = None) -> list:
+        """Returns expenses matching the keyword filter and date range, in insertion order."""
+        start, end = date_range or (None, None)
+        keyword = self._keyword(filter.lower()) if filter else {}
+        return [self._row(i) for i in self._select(**keyword, start=start, end=end)]
+
+    def query(
+        self,
+        category: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        limit: int = None,
+        offset: int = 0,
+    ) -> tuple:
+        """Returns (page of expenses, total matches) for exact filters, in insertion order."""
+        categories = self._category_pool.equal(category) if category else None
+        rows = self._select(categories=categories, start=start_date, end=end_date)
+        end = None if limit is None else offset + limit
+        return [self._row(i) for i in rows[offset:end]], len(rows)
+
+    def summary(
+        self, group_by: str = "category", category: str = None, start_date: str = None, end_date: str = None
+    ) -> list:
+        """Returns [{"key", "total", "count"}] grouped by "category" or "month"."""
+        categories = self._category_pool.equal(category) if category else None
+        rows = self._select(categories=categories, start=start_date, end=end_date, as_array=True)
+
+        if group_by == "category":
+            # grouped by code, then codes of the same name merged
+            if np is not None:
+                codes = np.frombuffer(self._categories, dtype=np.uint32)[rows]
+                amounts = np.frombuffer(self._amounts, dtype=np.float64)[rows]
+                totals = np.bincount(codes, weights=amounts)
+                counts = np.bincount(codes)
+                by_code = {code: (totals[code], counts[code]) for code in np.flatnonzero(counts).tolist()}
+            else:
+                by_code = {}
+                for i in rows:
+                    total, count = by_code.get(self._categories[i], (0.0, 0))
+                    by_code[self._categories[i]] = (total + self._amounts[i], count + 1)
+            keys = {code: self._category_pool.values[code] for code in by_code}
+        else:
+            by_code, keys = {}, {}
+            for i in rows.tolist() if np is not None else rows:
+                key = self._date(i)[:7]
+                total, count = by_code.get(key, (0.0, 0))
+                by_code[key] = (total + self._amounts[i], count + 1)
+                keys[key] = key
+
+        groups = {}
+        for code, (total, count) in by_code.items():
+            group = groups.setdefault(keys[code], {"key": keys[code], "total": 0.0, "count": 0})
+            group["total"] += float(total)
+            group["count"] += int(count)
+        return sorted(groups.values(), key=lambda g: g["key"])
+
+    def spending(self, period: str = "month", date: str = None, category: str = None) -> dict:
+        """Totals of the `period` containing `date`, from the running aggregates."""
+        key = period_key(period, date)
+        return summarize(period, key, self.aggregates.groups(period, key), category)
+
+    def search_title(self, title: str) -> list:
+        return [self._row(i) for i in self._select(titles=self._title_pool.containing(title.lower()))]
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True, date_range: tuple = None) -> list:
+        """Best `limit` matches for `query` in title/category/note, typos allowed, each with its "score"."""
+        if self._search is None:
+            self._search = SearchIndex.build(
+                (self._ids[i], self._row(i)) for i, alive in enumerate(self._alive) if alive
+            )
+        allowed = None
+        if date_range:
+            allowed = {self._ids[i] for i in self._select(start=date_range[0], end=date_range[1])}
+        hits = self._search.search(query, limit, prefix, int, allowed)
+        return [{**self._row(self._find(doc_id)), "score": round(score, 3)} for doc_id, score in hits]
@@ -1,6 +1,36 @@
-import requests
+from typing import Literal
 
+from typing_extensions import TypedDict
 
+from core.tracing import traced
+from tools.client import TIMEOUT, async_request, get_session, httpx, requests, url_for
+from tools.memo import in_filters, in_period, in_search, tool_memo
+
+# Argument types, also used to generate the tool schemas (see core/prompts.py)
+ExpenseField = Literal["id", "title", "amount", "category", "date", "note"]
+SearchMode = Literal["ranked", "substring"]
+
+
+class ExpenseItem(TypedDict):
+    title: str
+    amount: float
+    category: str
+
+
+def _filter_params(category=None, start_date=None, end_date=None) -> dict:
+    params = {"category": category, "start_date": start_date, "end_date": end_date}
+    return {k: v for k, v in params.items() if v}
+
+
+def _page_params(limit, offset, fields, category, start_date, end_date) -> dict:
+    params = _filter_params(category, start_date, end_date)
+    params.update(limit=limit, offset=offset)
+    if fields:
+        params["fields"] = ",".join(fields)
+    return params
+
+
+@traced("tool.add_expense")
 def add_expense(title: str, amount: float, category: str):
     """
     Sends a POST request to add a new expense.
@@ -10,52 +40,288 @@ def add_expense(title: str, amount: float, category: str):
     :param category: Category of the expense (e.g., 'Food', 'Rent').
     :return: Response JSON or error message.
     """
-    url = "http://localhost:3030/api/expenses"  # API Endpoint
+    url = url_for("/api/expenses")  # API Endpoint
     data = {
         "title": title,
         "amount": amount,
         "category": category
     }
-    headers = {"Content-Type": "application/json"}
 
     try:
-        response = requests.post(url, json=data, headers=headers)
+        response = get_session().post(url, json=data, timeout=TIMEOUT)
+        response.raise_for_status()  # Raise exception for HTTP errors (4xx, 5xx)
+        expense = response.json()
+    except requests.exceptions.RequestException as e:
+        tool_memo.invalidate()  # the expense may have been added anyway
+        return {"error": str(e)}
+
+    tool_memo.invalidate([expense])  # drops the cached reads it shows up in
+    return expense  # Return JSON response if successful
+
+
+@traced("tool.get_all_expenses")
+@tool_memo.cached(in_filters)
+def get_all_expenses(
+    limit: int = 50,
+    offset: int = 0,
+    fields: list[ExpenseField] = None,
+    category: str = None,
+    start_date: str = None,
+    end_date: str = None,
+):
+    """
+    Sends a GET request to retrieve one page of expenses.
+
+    :param limit: Maximum number of expenses to return (server caps it at 500).
+    :param offset: Number of matching expenses to skip, use `next_offset` from the previous page.
+    :param fields: Only return these fields (e.g., ['title', 'amount']).
+    :param category: Only expenses in this category.
+    :param start_date: Only expenses on or after this date (YYYY-MM-DD).
+    :param end_date: Only expenses on or before this date (YYYY-MM-DD).
+    :return: Dict with `data`, `total` and `next_offset` (JSON) or error message.
+    """
+    url = url_for("/api/expenses")  # API Endpoint
+    params = _page_params(limit, offset, fields, category, start_date, end_date)
+
+    try:
+        response = get_session().get(url, params=params, timeout=TIMEOUT)
         response.raise_for_status()  # Raise exception for HTTP errors (4xx, 5xx)
-        return response.json()  # Return JSON response if successful
+        return response.json()  # Return page of expenses
     except requests.exceptions.RequestException as e:
         return {"error": str(e)}
 
 
-def get_all_expenses():
+@traced("tool.get_expense_summary")
+@tool_memo.cached(in_filters)
+def get_expense_summary(
+    group_by: Literal["category", "month"] = "category",
+    category: str = None,
+    start_date: str = None,
+    end_date: str = None,
+):
     """
-    Sends a GET request to retrieve all expenses.
+    Sends a GET request for spending totals computed by the backend.
 
-    :return: List of expenses (JSON) or error message.
+    :param group_by: 'category' or 'month'.
+    :param category: Only expenses in this category.
+    :param start_date: Only expenses on or after this date (YYYY-MM-DD).
+    :param end_date: Only expenses on or before this date (YYYY-MM-DD).
+    :return: Dict with per-group `total`/`count` and overall totals (JSON) or error message.
     """
-    url = "http://localhost:3030/api/expenses"  # API Endpoint
+    url = url_for("/api/expenses/summary")  # API Endpoint
+    params = _filter_params(category, start_date, end_date)
+    params["group_by"] = group_by
 
     try:
-        response = requests.get(url)
+        response = get_session().get(url, params=params, timeout=TIMEOUT)
         response.raise_for_status()  # Raise exception for HTTP errors (4xx, 5xx)
-        return response.json()  # Return list of expenses
+        return response.json()  # Return totals
     except requests.exceptions.RequestException as e:
         return {"error": str(e)}
 
 
-def search_expenses(title: str):
+@traced("tool.get_spending_summary")
+@tool_memo.cached(in_period)
+def get_spending_summary(
+    period: Literal["day", "week", "month", "year", "all"] = "month",
+    date: str = None,
+    category: str = None,
+):
+    """
+    Sends a GET request for the running spending totals of one period.
+
+    :param period: 'day', 'week', 'month', 'year' or 'all'.
+    :param date: Any date inside the period (YYYY-MM-DD), defaults to today.
+    :param category: Only this category.
+    :return: Dict with `total`, `count` and `by_category` for the period (JSON) or error message.
+    """
+    url = url_for("/api/expenses/spending")  # API Endpoint
+    params = {k: v for k, v in {"period": period, "date": date, "category": category}.items() if v}
+
+    try:
+        response = get_session().get(url, params=params, timeout=TIMEOUT)
+        response.raise_for_status()  # Raise exception for HTTP errors (4xx, 5xx)
+        return response.json()  # Return totals
+    except requests.exceptions.RequestException as e:
+        return {"error": str(e)}
+
+
+@traced("tool.search_expenses")
+@tool_memo.cached(in_search)
+def search_expenses(title: str, mode: SearchMode = "substring", limit: int = 10):
     """
     Sends a GET request to search for expenses by title (case-insensitive).
 
-    :param title: Title or partial title of the expense to search for.
+    :param title: Words or partial words to search for, typos are fine in ranked mode.
+    :param mode: "substring" (default) returns every title containing the text; "ranked" only the best `limit` matches in title, category and note, there may be more.
+    :param limit: Maximum number of ranked matches.
     :return: List of matching expenses (JSON) or error message.
     """
-    url = "http://localhost:3030/api/expenses/search"  # API Endpoint
-    params = {"title": title}  # Query parameter
+    url = url_for("/api/expenses/search")  # API Endpoint
+    params = {"title": title, "mode": mode, "limit": limit}  # Query parameters
 
     try:
-        response = requests.get(url, params=params)
+        response = get_session().get(url, params=params, timeout=TIMEOUT)
         response.raise_for_status()  # Raise exception for HTTP errors (4xx, 5xx)
         return response.json()  # Return list of found expenses
     except requests.exceptions.RequestException as e:
         return {"error": str(e)}
 
+
+@traced("tool.add_expenses_bulk")
+def add_expenses_bulk(expenses: list[ExpenseItem]):
+    """
+    Sends one POST request that adds several expenses in a single transaction.
+
+    :param expenses: List of expenses, each a dict with title, amount and category.
+    :return: List of created expenses (JSON) or error message.
+    """
+    url = url_for("/api/expenses/bulk")  # API Endpoint
+
+    try:
+        response = get_session().post(url, json={"expenses": expenses}, timeout=TIMEOUT)
+        response.raise_for_status()  # Raise exception for HTTP errors (4xx, 5xx)
+        created = response.json()
+    except requests.exceptions.RequestException as e:
+        tool_memo.invalidate()  # the expenses may have been added anyway
+        return {"error": str(e)}
+
+    tool_memo.invalidate(created)
+    return created  # Return list of created expenses
+
+
+@traced("tool.search_expenses_multi")
+@tool_memo.cached(in_search)
+def search_expenses_multi(titles: list[str], mode: SearchMode = "substring", limit: int = 10):
+    """
+    Sends one request that runs several title searches (case-insensitive).
+
+    :param titles: Titles or partial titles to search for.
+    :param mode: "ranked" or "substring", as in `search_expenses`.
+    :param limit: Maximum number of ranked matches per title.
+    :return: Dict of title -> list of matching expenses (JSON) or error message.
+    """
+    url = url_for("/api/expenses/search/bulk")  # API Endpoint
+    data = {"titles": titles, "mode": mode, "limit": limit}
+
+    try:
+        response = get_session().post(url, json=data, timeout=TIMEOUT)
+        response.raise_for_status()  # Raise exception for HTTP errors (4xx, 5xx)
+        return response.json()  # Return matches per title
+    except requests.exceptions.RequestException as e:
+        return {"error": str(e)}
+
+
+# Async variants, same arguments and return values as the functions above.
+
+
+async def add_expense_async(title: str, amount: float, category: str):
+    """Async version of `add_expense`."""
+    data = {"title": title, "amount": amount, "category": category}
+
+    try:
+        response = await async_request("POST", "/api/expenses", json=data)
+        response.raise_for_status()
+        expense = response.json()
+    except httpx.HTTPError as e:
+        tool_memo.invalidate()
+        return {"error": str(e)}
+
+    tool_memo.invalidate([expense])
+    return expense
+
+
+@tool_memo.cached(in_filters, tool="get_all_expenses")
+async def get_all_expenses_async(
+    limit: int = 50,
+    offset: int = 0,
+    fields: list[ExpenseField] = None,
+    category: str = None,
+    start_date: str = None,
+    end_date: str = None,
+):
+    """Async version of `get_all_expenses`."""
+    params = _page_params(limit, offset, fields, category, start_date, end_date)
+
+    try:
+        response = await async_request("GET", "/api/expenses", params=params)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        return {"error": str(e)}
+
+
+@tool_memo.cached(in_filters, tool="get_expense_summary")
+async def get_expense_summary_async(
+    group_by: Literal["category", "month"] = "category",
+    category: str = None,
+    start_date: str = None,
+    end_date: str = None,
+):
+    """Async version of `get_expense_summary`."""
+    params = _filter_params(category, start_date, end_date)
+    params["group_by"] = group_by
+
+    try:
+        response = await async_request("GET", "/api/expenses/summary", params=params)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        return {"error": str(e)}
+
+
+@tool_memo.cached(in_period, tool="get_spending_summary")
+async def get_spending_summary_async(
+    period: Literal["day", "week", "month", "year", "all"] = "month",
+    date: str = None,
+    category: str = None,
+):
+    """Async version of `get_spending_summary`."""
+    params = {k: v for k, v in {"period": period, "date": date, "category": category}.items() if v}
+
+    try:
+        response = await async_request("GET", "/api/expenses/spending", params=params)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        return {"error": str(e)}
+
+
+@tool_memo.cached(in_search, tool="search_expenses")
+async def search_expenses_async(title: str, mode: SearchMode = "substring", limit: int = 10):
+    """Async version of `search_expenses`."""
+    try:
+        response = await async_request(
+            "GET", "/api/expenses/search", params={"title": title, "mode": mode, "limit": limit}
+        )
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        return {"error": str(e)}
+
+
+async def add_expenses_bulk_async(expenses: list[ExpenseItem]):
+    """Async version of `add_expenses_bulk`."""
+    try:
+        response = await async_request("POST", "/api/expenses/bulk", json={"expenses": expenses})
+        response.raise_for_status()
+        created = response.json()
+    except httpx.HTTPError as e:
+        tool_memo.invalidate()
+        return {"error": str(e)}
+
+    tool_memo.invalidate(created)
+    return created
+
+
+@tool_memo.cached(in_search, tool="search_expenses_multi")
+async def search_expenses_multi_async(titles: list[str], mode: SearchMode = "substring", limit: int = 10):
+    """Async version of `search_expenses_multi`."""
+    try:
+        response = await async_request(
+            "POST", "/api/expenses/search/bulk", json={"titles": titles, "mode": mode, "limit": limit}
+        )
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        return {"error": str(e)}
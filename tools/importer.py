@@ -0,0 +1,531 @@
+"""
+Streaming import of bank statements and exports: CSV, OFX/QFX and JSONL.
+
+    EXPENSE_STORE=sqlite python -m tools.importer statement.csv --user alice
+    python -m tools.importer export.ofx --api http://localhost:3030 --user alice
+
+Years of history go in with one command instead of a chat turn per expense.
+The file is read as a generator and handled `chunk_size` rows at a time, so
+the rows themselves are never all in memory (the duplicate hashes and known
+merchants still grow with the file and the user's history):
+
+1. parse       `read_csv` / `read_ofx` / `read_jsonl` yield raw rows
+2. normalize   dates to YYYY-MM-DD, amounts to positive numbers; money
+               coming in (credits, refunds) and unreadable rows are skipped.
+               A lone amount column is signed when it has negative amounts
+               (or "Dr"), see `import_expenses`
+3. dedupe      8-byte hashes of (date, amount, description) of the rows the
+               user already has. A row is a duplicate while the store holds
+               more copies of it than the file has shown so far, so
+               re-importing an overlapping statement only adds the new lines
+               and two identical coffees on one day both stay
+4. categorize  the file's category column, else the category the user gave
+               the same merchant before (or earlier in this import), else the
+               keyword rules of core/fastpath.py. Only the merchants still
+               unknown go to the LLM, `llm_batch` of them per request
+5. write       one `add_many` per chunk: a single transaction in SQLite, one
+               POST /api/expenses/bulk through the API
+"""
+
+import argparse
+import contextvars
+import csv
+import hashlib
+import html
+import json
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Literal
+
+from pydantic import BaseModel
+
+from core import clients
+from core.cache import llm_cache
+from core.config import env
+from core.fastpath import CATEGORIES, ITEM_CATEGORIES
+from core.models import model_router
+from core.prompts import register, render
+from core.repair import DateParser, parse_amount
+from core.scheduler import scheduler
+from core.tenants import DEFAULT_USER, as_user, check_user, current_user
+from tools.client import TIMEOUT, get_session, requests, url_for
+from tools.memo import tool_memo
+from tools.search import words
+
+FORMATS = {".csv": "csv", ".tsv": "csv", ".txt": "csv", ".ofx": "ofx", ".qfx": "ofx", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+OTHER = "Other"
+Category = Literal[(*CATEGORIES.values(), OTHER)]
+
+# CSV header (lower-cased) -> field; banks name their columns every which way
+COLUMNS = {
+    "date": ("date", "transaction date", "txn date", "posted date", "posting date", "booking date", "value date"),
+    "title": ("title", "description", "payee", "merchant", "name", "narration", "particulars", "details"),
+    "amount": ("amount", "transaction amount", "amount (inr)", "value"),
+    "debit": ("debit", "debit amount", "withdrawal", "withdrawal amt.", "withdrawal amount", "money out", "paid out"),
+    "credit": ("credit", "credit amount", "deposit", "deposit amt.", "deposit amount", "money in", "paid in"),
+    "category": ("category",),
+    "note": ("note", "notes", "memo", "reference", "remarks"),
+}
+HEADERS = {name: column for column, names in COLUMNS.items() for name in names}
+MAX_PREAMBLE = 50  # lines to look through for the header
+
+OFX_FIELDS = {"DTPOSTED": "date", "TRNAMT": "amount", "NAME": "title", "PAYEE": "title", "MEMO": "note"}
+
+# words of bank descriptions that say nothing about the merchant
+NOISE = set("pos upi neft imps rtgs ach ecom card debit purchase payment txn ref to at by via www com in".split())
+
+
+def detect_format(name: str) -> str:
+    """The format of a file from its name, "csv" when it can't tell."""
+    suffix = name[name.rfind(".") :].lower() if "." in name else ""
+    return FORMATS.get(suffix, "csv")
+
+
+# -- parse --------------------------------------------------------------------
+
+
+def read_csv(lines):
+    """
+    Rows of a CSV/TSV statement as {field: text}, using the first line that
+    has a date and an amount column as the header (statements often start
+    with a few lines about the account).
+    """
+    lines = iter(lines)
+    for line in islice(lines, MAX_PREAMBLE):
+        try:
+            dialect = csv.Sniffer().sniff(line, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        columns = {}
+        for i, name in enumerate(next(csv.reader([line], dialect), [])):
+            column = HEADERS.get(" ".join(name.lower().split()))
+            if column is not None and column not in columns:
+                columns[column] = i
+        if "date" in columns and ("amount" in columns or "debit" in columns):
+            break
+    else:
+        return  # no header in sight, not a statement
+
+    for record in csv.reader(lines, dialect):
+        if any(cell.strip() for cell in record):
+            yield {column: record[i] for column, i in columns.items() if i < len(record)}
+
+
+def read_ofx(file, chunk_size: int = 64 * 1024):
+    """
+    Transactions of an OFX/QFX statement (SGML 1.x or XML 2.x). The file is
+    read in chunks and split on tags, 2.x files are often a single line.
+    """
+    transaction, tail = None, ""
+    for chunk in iter(lambda: file.read(chunk_size), ""):
+        parts = (tail + chunk).split("<")
+        tail = parts.pop()  # may be cut off, finished with the next chunk
+        for part in parts:
+            tag, _, value = part.partition(">")
+            tag = tag.strip().upper()
+            if tag == "STMTTRN":
+                transaction = {}
+            elif tag == "/STMTTRN":
+                if transaction is not None:
+                    yield transaction
+                transaction = None
+            elif transaction is not None and tag in OFX_FIELDS:
+                transaction.setdefault(OFX_FIELDS[tag], html.unescape(value.strip()))
+
+
+def read_jsonl(lines):
+    """One expense object per line, e.g. an export of this app; broken lines come out empty."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            row = None
+        yield row if isinstance(row, dict) else {}
+
+
+def read_rows(file, format: str):
+    if format == "ofx":
+        return read_ofx(file)
+    if format == "jsonl":
+        return read_jsonl(file)
+    return read_csv(file)
+
+
+# -- normalize ----------------------------------------------------------------
+
+
+def has_debits(rows: list) -> bool:
+    """True if a lone amount column of `rows` has a negative amount: the statement is signed."""
+    return any(
+        not raw.get("debit") and not raw.get("credit") and (parse_amount(raw.get("amount")) or 0) < 0 for raw in rows
+    )
+
+
+def normalize(raw: dict, signed: bool = False, dates: DateParser = None):
+    """
+    The expense of a raw row, None for rows that aren't spending.
+
+    With separate debit/credit columns only debits count. With one amount
+    column and `signed`, spending is negative (OFX, most bank CSVs) and
+    positive amounts are money coming in; otherwise every row is spending.
+    """
+    if raw.get("debit") or raw.get("credit"):
+        amount = parse_amount(raw.get("debit"))
+        amount = abs(amount) if amount else None
+    else:
+        amount = parse_amount(raw.get("amount"))
+        if amount is not None and signed:
+            amount = -amount if amount < 0 else None
+        elif amount is not None:
+            amount = abs(amount)
+    if not amount:
+        return None
+
+    date = (dates or DateParser())(str(raw.get("date") or ""))
+    if date is None:
+        return None
+
+    title = " ".join(str(raw.get("title") or "").split())
+    note = " ".join(str(raw.get("note") or "").split())
+    category = " ".join(str(raw.get("category") or "").split())
+    return {
+        "title": title or note,
+        "amount": round(amount, 2),
+        "category": CATEGORIES.get(category.lower(), category),
+        "date": date,
+        "note": note if title else "",
+    }
+
+
+def fingerprint(expense: dict) -> bytes:
+    """Hash of what makes two rows the same expense: date, amount in cents and the description's words."""
+    text = " ".join(words(expense.get("title") or expense.get("note") or ""))
+    key = f"{expense['date']}|{round(float(expense['amount']) * 100)}|{text}"
+    return hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+
+def merchant(expense: dict) -> str:
+    """First two meaningful words of the description, "UPI/SWIGGY/1234" -> "swiggy"."""
+    text = expense.get("title") or expense.get("note") or ""
+    kept = [w for w in words(text) if w not in NOISE and not any(ch.isdigit() for ch in w)]
+    return " ".join(kept[:2])
+
+
+# -- categorize ---------------------------------------------------------------
+
+
+class MerchantCategories(BaseModel):
+    categories: list[Category]
+
+
+CATEGORIZE_PROMPT = register(
+    "categorize",
+    f"""
+You file bank transactions into expense categories. The user message is a JSON list of
+merchant descriptions. Answer with one category per description, in the same order, from:
+{", ".join(Category.__args__)}. Use {OTHER} when none fits.
+""",
+)
+
+
+def create(**kwargs):
+    return clients.structured().chat.completions.create(**kwargs)
+
+
+class Categorizer:
+    """Category per row: the file's own, a known merchant's, a keyword rule's, then the LLM's in batches."""
+
+    def __init__(self, llm: bool = True, llm_batch: int = 100):
+        self.llm = llm
+        self.llm_batch = llm_batch
+        self.known = {}  # merchant -> category
+        self.requests = 0
+        self.stats = Counter()  # where the categories came from
+
+    def learn(self, expense: dict):
+        key = merchant(expense)
+        if key and expense.get("category"):
+            self.known[key] = expense["category"]
+
+    @staticmethod
+    def rule(expense: dict):
+        for word in words(f"{expense['title']} {expense['note']}"):
+            category = ITEM_CATEGORIES.get(word) or CATEGORIES.get(word)
+            if category:
+                return category
+        return None
+
+    def categorize(self, rows: list):
+        """Fills in the category of every row without one."""
+        unknown = {}  # merchant -> rows
+        for row in rows:
+            key = merchant(row)
+            if row["category"]:
+                self.stats["file"] += 1
+            elif key in self.known:
+                row["category"] = self.known[key]
+                self.stats["merchant"] += 1
+            else:
+                row["category"] = self.rule(row)
+                if row["category"] is None:
+                    unknown.setdefault(key, []).append(row)
+                    continue
+                self.stats["rule"] += 1
+            if key:
+                self.known.setdefault(key, row["category"])
+
+        keys = list(unknown)
+        for start in range(0, len(keys), self.llm_batch):
+            batch = keys[start : start + self.llm_batch]
+            answers = self.ask([unknown[key][0]["title"][:80] for key in batch]) if self.llm else []
+            for i, key in enumerate(batch):
+                category = answers[i] if i < len(answers) else OTHER
+                self.stats["llm" if category != OTHER else "other"] += len(unknown[key])
+                if key:
+                    self.known[key] = category
+                for row in unknown[key]:
+                    row["category"] = category
+
+    def ask(self, descriptions: list) -> list:
+        """Categories of `descriptions` from one LLM request, [] when it fails."""
+        from groq import APIError
+        from instructor.exceptions import InstructorRetryException
+
+        self.requests += 1
+        try:
+            res = llm_cache.cached_call(
+                # the small model first, the large one when it loses count
+                model_router.route(
+                    "classify",
+                    scheduler.budgeted(create),
+                    accept=lambda res: len(res.categories) == len(descriptions),
+                ),
+                model=model_router.model_name("classify"),
+                messages=[
+                    {"role": "system", "content": CATEGORIZE_PROMPT},
+                    {"role": "user", "content": render(descriptions)},
+                ],
+                response_model=MerchantCategories,
+            )
+        except (APIError, InstructorRetryException) as e:
+            print(f"categorizing {len(descriptions)} merchants failed: {e}", file=sys.stderr)
+            return []
+        return res.categories
+
+
+# -- write --------------------------------------------------------------------
+
+
+class StoreSink:
+    """The current user's store in a `tools.tenants.TenantStores`, in this process."""
+
+    def __init__(self, tenants):
+        self.tenants = tenants
+
+    def existing(self):
+        yield from self.tenants.read(current_user(), lambda db: db.read())
+
+    def write(self, rows: list) -> list:
+        created = self.tenants.write(current_user(), lambda db: db.add_many(rows))
+        tool_memo.invalidate(created)
+        return created
+
+
+class ApiSink:
+    """The current user's expenses behind the expense API (tools/client.py)."""
+
+    def __init__(self, page_size: int = 500):
+        self.page_size = page_size
+
+    def existing(self):
+        params = {"limit": self.page_size, "offset": 0, "fields": "title,amount,category,date,note"}
+        while params["offset"] is not None:
+            response = get_session().get(url_for("/api/expenses"), params=params, timeout=TIMEOUT)
+            response.raise_for_status()
+            page = response.json()
+            yield from page["data"]
+            params["offset"] = page["next_offset"]
+
+    def write(self, rows: list) -> list:
+        try:
+            response = get_session().post(url_for("/api/expenses/bulk"), json={"expenses": rows}, timeout=TIMEOUT)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            tool_memo.invalidate()  # the chunk may have been written anyway
+            raise
+        created = response.json()
+        tool_memo.invalidate(created)
+        return created
+
+
+# -- pipeline -----------------------------------------------------------------
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    llm_requests: int = 0
+    categories: Counter = field(default_factory=Counter)
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        sources = ", ".join(f"{n} {source}" for source, n in self.categories.most_common())
+        rate = self.read / self.seconds if self.seconds else 0.0
+        return (
+            f"{self.imported} imported, {self.duplicates} duplicates, {self.skipped} skipped of {self.read} rows "
+            f"in {self.seconds:.2f}s ({rate:.0f} rows/s, {self.chunks} chunks)\n"
+            f"categories: {sources or '-'} ({self.llm_requests} LLM requests)"
+        )
+
+
+def _chunks(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_expenses(
+    file,
+    sink,
+    format: str = "csv",
+    chunk_size: int = 500,
+    signed: bool = None,
+    day_first: bool = True,
+    llm: bool = True,
+    llm_batch: int = 100,
+    progress=None,
+) -> ImportStats:
+    """
+    Imports an open statement `file` into `sink` (StoreSink / ApiSink) for the
+    current user. `progress(stats)` is called after every chunk.
+
+    `signed` (see `normalize`) is True for OFX. For other formats it's worked
+    out from the file when not given: signed once a chunk has a negative
+    amount, so in an export with both signs the credits are skipped. The
+    first chunk decides for itself, a later one for the rest of the file.
+    """
+    start = time.perf_counter()
+    detect = signed is None and format != "ofx"
+    signed = format == "ofx" if signed is None else signed
+    stats = ImportStats()
+    categorizer = Categorizer(llm, llm_batch)
+    dates = DateParser(day_first)
+
+    existing = Counter()
+    for expense in sink.existing():
+        existing[fingerprint(expense)] += 1
+        categorizer.learn(expense)
+
+    seen = Counter()
+    # one chunk is written while the next one is parsed and categorized
+    writer = ThreadPoolExecutor(1, thread_name_prefix="import")
+    writing = None
+    try:
+        for chunk in _chunks(read_rows(file, format), chunk_size):
+            if detect and not signed:
+                signed = has_debits(chunk)
+            rows = []
+            for raw in chunk:
+                expense = normalize(raw, signed, dates)
+                if expense is None:
+                    stats.skipped += 1
+                    continue
+                key = fingerprint(expense)
+                seen[key] += 1
+                if seen[key] <= existing[key]:
+                    stats.duplicates += 1
+                    continue
+                rows.append(expense)
+            stats.read += len(chunk)
+
+            if rows:
+                categorizer.categorize(rows)
+                if writing is not None:
+                    stats.imported += len(writing.result())
+                writing = writer.submit(contextvars.copy_context().run, sink.write, rows)
+                stats.chunks += 1
+            stats.categories = categorizer.stats
+            stats.llm_requests = categorizer.requests
+            stats.seconds = time.perf_counter() - start
+            if progress is not None:
+                progress(stats)
+
+        if writing is not None:
+            stats.imported += len(writing.result())
+    finally:
+        writer.shutdown()
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def _open(path: str):
+    if path == "-":
+        return sys.stdin
+    # utf-8-sig: bank exports like to start with a BOM
+    return open(path, encoding="utf-8-sig", errors="replace", newline="")
+
+
+## import
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import bank statements and expense exports")
+    parser.add_argument("files", nargs="+", help="CSV, OFX/QFX or JSONL files, - for stdin")
+    parser.add_argument("--format", choices=["csv", "ofx", "jsonl"], help="default: from the file name")
+    parser.add_argument("--user", default=env("AGENT_USER", DEFAULT_USER), help="whose expenses to import into")
+    parser.add_argument("--api", help="import through the expense API at this URL instead of the local store")
+    parser.add_argument("--chunk-size", type=int, default=int(env("IMPORT_CHUNK_SIZE", "500")))
+    parser.add_argument(
+        "--signed",
+        action=argparse.BooleanOptionalAction,
+        help="negative amounts are spending, positive ones skipped (default: when the file has negative amounts)",
+    )
+    parser.add_argument("--month-first", action="store_true", help="read 03/04/2024 as March 4th")
+    parser.add_argument("--no-llm", action="store_true", help="file unknown merchants under Other")
+    parser.add_argument("--llm-batch", type=int, default=int(env("IMPORT_LLM_BATCH", "100")))
+    args = parser.parse_args()
+
+    tenants = None
+    if args.api:
+        import tools.client
+
+        tools.client.BASE_URL = args.api
+        sink = ApiSink()
+    else:
+        from tools.tenants import TenantStores
+
+        tenants = TenantStores.from_env()
+        if tenants.backend == "memory":
+            parser.error("the in-memory store ends with this command, set EXPENSE_STORE=sqlite or use --api")
+        sink = StoreSink(tenants)
+
+    try:
+        with as_user(check_user(args.user)):
+            for path in args.files:
+                with _open(path) as file:
+                    stats = import_expenses(
+                        file,
+                        sink,
+                        args.format or detect_format(path),
+                        chunk_size=args.chunk_size,
+                        signed=args.signed,
+                        day_first=not args.month_first,
+                        llm=not args.no_llm,
+                        llm_batch=args.llm_batch,
+                        progress=lambda s: print(f"\r{s.read} rows", end="", file=sys.stderr, flush=True),
+                    )
+                print(f"\r{path}: {stats.summary()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if tenants is not None:
+            tenants.close()
@@ -0,0 +1,258 @@
+"""
+Memoized results of the read tools, per user, dropped when a write touches them.
+
+    @tool_memo.cached(in_filters)
+    def get_all_expenses(...): ...
+
+    tool_memo.invalidate([created_expense])
+
+Entries are keyed on the user of the turn (core/tenants.py), the tool name
+and its arguments with the defaults filled in, so `limit=50` and no limit
+share an entry. Each entry keeps a predicate built from its arguments that
+says whether an expense row could be part of the result; `invalidate` gets
+the rows a write touched (old and new version of an update) and drops only
+the current user's entries whose predicate matches one of them. Adding a
+Travel expense leaves a cached Food summary alone.
+
+Results from an expense API that other clients write to as well can only be
+as fresh as TOOL_MEMO_TTL, the writes this process makes are seen at once.
+"""
+
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import date as Date
+
+from core.config import env
+from core.tenants import current_user
+from core.tracing import annotate, count
+from tools.aggregates import period_key
+from tools.search import SearchIndex
+
+
+def _lower(value) -> str:
+    return value.lower() if isinstance(value, str) else ""
+
+
+# -- predicates: rows that could change a result ------------------------------
+
+
+def in_filters(category: str = None, start_date: str = None, end_date: str = None, **_):
+    """Rows in the category and date range, for listings, pages and summaries."""
+    category = _lower(category)
+    start_date, end_date = start_date or "", end_date or "\uffff"
+
+    def matches(row: dict) -> bool:
+        if category and _lower(row.get("category")) != category:
+            return False
+        return start_date <= (row.get("date") or "") <= end_date
+
+    return matches
+
+
+def in_period(period: str = "month", date: str = None, category: str = None, **_):
+    """Rows in the period containing `date`, for the running spending totals."""
+    key = period_key(period, date)
+    category = _lower(category)
+
+    def matches(row: dict) -> bool:
+        if category and _lower(row.get("category")) != category:
+            return False
+        try:
+            return period_key(period, row.get("date") or "") == key
+        except ValueError:
+            return period == "all"
+
+    return matches
+
+
+def in_search(title: str = None, titles: list = None, mode: str = "substring", **_):
+    """Rows that one of the queries finds, the same way the store's search does."""
+    queries = [str(t) for t in (titles if titles is not None else [title or ""])]
+
+    def matches(row: dict) -> bool:
+        if mode == "substring":
+            return any(_lower(q) in _lower(row.get("title")) for q in queries)
+        index = SearchIndex.build([(0, row)])
+        return any(index.search(q, prefix=True) for q in queries)
+
+    return matches
+
+
+def _failed(result) -> bool:
+    return isinstance(result, dict) and ("error" in result or result.get("status") == "error")
+
+
+class ToolMemo:
+    """LRU of read tool results, bounded by entry count and `ttl` seconds."""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+
+        self._entries = OrderedDict()  # key -> (expires_at, result, matches)
+        self._users = {}  # user id -> keys of their entries
+        self._generations = {}  # user id -> writes seen, so a read racing a write isn't stored
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(env("TOOL_MEMO_MAX_ENTRIES", "512")),
+            ttl=float(env("TOOL_MEMO_TTL", "300")),
+            enabled=env("TOOL_MEMO_ENABLED", "1") == "1",
+        )
+
+    @staticmethod
+    def key(user_id: str, tool: str, arguments: dict) -> tuple:
+        # today's date is part of the key: "this month" of an entry made before midnight isn't today's
+        normalized = json.dumps(arguments, sort_keys=True, default=str)
+        return (user_id, tool, normalized, Date.today().isoformat())
+
+    # -- storage ----------------------------------------------------------
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key: tuple, result, matches, generation: int):
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return  # a write landed while the tool ran, the result may be stale
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, result, matches)
+            self._users.setdefault(key[0], set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _drop(self, key: tuple):
+        del self._entries[key]
+        keys = self._users[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._users[key[0]]
+
+    def invalidate(self, rows=None, user_id: str = None):
+        """
+        Drops the user's (default: current user's) entries that any of the
+        written `rows` could change; all of them when the rows aren't known.
+        """
+        user_id = user_id or current_user()
+        if rows is not None:
+            rows = [row for row in rows if isinstance(row, dict)]
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            stale = [
+                key
+                for key in self._users.get(user_id, ())
+                if rows is None or any(self._entries[key][2](row) for row in rows)
+            ]
+            for key in stale:
+                self._drop(key)
+            self.stats["invalidations"] += len(stale)
+        count("memo_invalidations", len(stale))
+
+    def clear(self, user_id: str = None):
+        with self._lock:
+            for key in [*self._entries] if user_id is None else [*self._users.get(user_id, ())]:
+                self._drop(key)
+
+    # -- calls ------------------------------------------------------------
+
+    def _lookup(self, tool: str, signature, args, kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        user_id = current_user()
+        key = self.key(user_id, tool, bound.arguments)
+        with self._lock:
+            generation = self._generations.get(user_id, 0)
+        return key, bound.arguments, generation
+
+    def _store(self, key, arguments, generation, result, matcher):
+        if _failed(result):
+            return
+        try:
+            matches = matcher(**arguments)
+        except (TypeError, ValueError):
+            return  # arguments the tool answered but we can't reason about, don't keep it
+        self.put(key, result, matches, generation)
+
+    def cached(self, matcher, tool: str = None):
+        """
+        Decorator for a read tool (sync or async): results are reused until a
+        write touches a row `matcher(**arguments)` accepts. `tool` names the
+        entry, so a sync tool and its async twin can share them.
+        """
+
+        def decorate(func):
+            name = tool or func.__name__
+            signature = inspect.signature(func)
+
+            if inspect.iscoroutinefunction(func):
+
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await func(*args, **kwargs)
+                    key, arguments, generation = self._lookup(name, signature, args, kwargs)
+                    result = self.get(key)
+                    self._record(result)
+                    if result is None:
+                        result = await func(*args, **kwargs)
+                        self._store(key, arguments, generation, result, matcher)
+                    return result
+
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                key, arguments, generation = self._lookup(name, signature, args, kwargs)
+                result = self.get(key)
+                self._record(result)
+                if result is None:
+                    result = func(*args, **kwargs)
+                    self._store(key, arguments, generation, result, matcher)
+                return result
+
+            return wrapper
+
+        return decorate
+
+    @staticmethod
+    def _record(result):
+        # on the tool's span, so hit rates end up next to the tool latencies in the traces
+        annotate(memo="hit" if result is not None else "miss")
+        count("memo_hits" if result is not None else "memo_misses")
+
+    def summary(self) -> str:
+        with self._lock:
+            entries, users = len(self._entries), len(self._users)
+        lookups = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / lookups if lookups else 0.0
+        return (
+            f"tool memo: {entries} entries for {users} users, {self.stats['hits']}/{lookups} hits ({rate:.0%}), "
+            f"{self.stats['invalidations']} invalidated, {self.stats['evictions']} evicted"
+        )
+
+
+# Shared by tools/db.py and chatbot.py
+tool_memo = ToolMemo.from_env()
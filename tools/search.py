@@ -0,0 +1,163 @@
+"""
+Ranked, typo-tolerant search over the title, category and note of expenses.
+
+- every word is indexed with its BM25 term frequency per expense (title
+  words count double, they're what people search for)
+- a trigram index over the vocabulary finds the indexed words close to a
+  misspelled query word ("starbuks" -> "starbucks"), scored by similarity
+- with `prefix`, the last query word also completes to the words starting
+  with it (bisect over the sorted vocabulary), for partial words like "cof"
+
+`add`/`remove` keep everything up to date, the stores call them next to
+their own indexes. Matching is per word and ranked, so an expense only
+needs one of the query words to show up; the best ones come first.
+"""
+
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+
+WORD = re.compile(r"\w+")
+
+# term frequency weight of each field
+FIELDS = {"title": 2, "category": 1, "note": 1}
+
+
+def words(text: str) -> list:
+    return WORD.findall(text.lower())
+
+
+def trigrams(word: str) -> set:
+    padded = f" {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, min_similarity: float = 0.5, max_expansions: int = 50):
+        self.k1 = k1
+        self.b = b
+        self.min_similarity = min_similarity
+        self.max_expansions = max_expansions
+        self._postings = {}  # word -> {doc id: term frequency}
+        self._docs = {}  # doc id -> its words, to remove it again
+        self._lengths = {}  # doc id -> sum of its term frequencies
+        self._total = 0
+        self._grams = {}  # trigram -> set of words
+        self._vocabulary = []  # sorted words, for prefix completion
+
+    def __len__(self):
+        return len(self._docs)
+
+    @classmethod
+    def build(cls, docs):
+        """Index of `(doc id, expense)` pairs."""
+        index = cls()
+        for doc_id, doc in docs:
+            index.add(doc_id, doc)
+        return index
+
+    def add(self, doc_id, doc: dict):
+        """Indexes an expense dict; re-adding a doc id replaces it."""
+        self.remove(doc_id)
+        counts = Counter()
+        for field, weight in FIELDS.items():
+            for word in words(doc.get(field) or ""):
+                counts[word] += weight
+
+        self._docs[doc_id] = tuple(counts)
+        self._lengths[doc_id] = sum(counts.values())
+        self._total += self._lengths[doc_id]
+        for word, tf in counts.items():
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                insort(self._vocabulary, word)
+                for gram in trigrams(word):
+                    self._grams.setdefault(gram, set()).add(word)
+            postings[doc_id] = tf
+
+    def remove(self, doc_id):
+        doc_words = self._docs.pop(doc_id, None)
+        if doc_words is None:
+            return
+        self._total -= self._lengths.pop(doc_id)
+        for word in doc_words:
+            postings = self._postings[word]
+            del postings[doc_id]
+            if postings:
+                continue
+            # last expense with this word
+            del self._postings[word]
+            del self._vocabulary[bisect_left(self._vocabulary, word)]
+            for gram in trigrams(word):
+                similar = self._grams[gram]
+                similar.discard(word)
+                if not similar:
+                    del self._grams[gram]
+
+    def expand(self, word: str, prefix: bool = False) -> dict:
+        """Indexed words that match query `word` -> weight (1 for itself, less for near misses and completions)."""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+
+        matches = {}
+        for other, n in shared.items():
+            similarity = 2 * n / (len(grams) + len(trigrams(other)))  # Dice coefficient
+            if similarity >= self.min_similarity:
+                matches[other] = similarity
+
+        if prefix:
+            i = bisect_left(self._vocabulary, word)
+            end = min(i + self.max_expansions, len(self._vocabulary))
+            while i < end and self._vocabulary[i].startswith(word):
+                completion = self._vocabulary[i]
+                matches[completion] = max(matches.get(completion, 0), 1.0 if completion == word else 0.8)
+                i += 1
+
+        if len(matches) > self.max_expansions:
+            matches = dict(heapq.nlargest(self.max_expansions, matches.items(), key=lambda m: m[1]))
+        return matches
+
+    def search(self, query: str, limit: int = None, prefix: bool = False, order=None, allowed=None) -> list:
+        """
+        [(doc id, score)] for `query`, best first. Ties keep `order(doc id)`
+        ascending when given; `prefix` completes the last query word and
+        `allowed` (a set of doc ids) restricts the hits, e.g. to a date range.
+        """
+        terms = words(query)
+        if not terms or not self._docs:
+            return []
+
+        n = len(self._docs)
+        lengths = self._lengths
+        # BM25: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average length))
+        base = self.k1 * (1 - self.b)
+        per_length = self.k1 * self.b / (self._total / n or 1)
+        scores = Counter()
+        for i, term in enumerate(terms):
+            # each query word counts once per expense, with its best matching word
+            best = {}
+            for word, weight in self.expand(term, prefix and i == len(terms) - 1).items():
+                postings = self._postings[word]
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                factor = weight * idf * (self.k1 + 1)
+                for doc_id, tf in postings.items():
+                    score = factor * tf / (tf + base + per_length * lengths[doc_id])
+                    if score > best.get(doc_id, 0):
+                        best[doc_id] = score
+            scores.update(best)
+
+        if allowed is not None:
+            scores = {doc_id: score for doc_id, score in scores.items() if doc_id in allowed}
+
+        hits = scores.items()
+        if limit and len(scores) > limit:
+            # only the hits that can make the cut get sorted
+            cutoff = heapq.nlargest(limit, scores.values())[-1]
+            hits = [hit for hit in hits if hit[1] >= cutoff]
+        key = (lambda hit: (-hit[1], order(hit[0]))) if order else (lambda hit: -hit[1])
+        return sorted(hits, key=key)[:limit]
@@ -0,0 +1,290 @@
+"""
+Local stand-in for the expense REST API that tools/db.py talks to.
+
+Run it with:  python -m tools.server --port 3030 [--store sqlite --db expenses.db] [--shards 4]
+
+Every user (X-User-Id header, "default" without one) has their own store,
+see tools/tenants.py. With TENANT_SECRET set the id also needs its
+X-User-Token, see core/tenants.py.
+"""
+
+import argparse
+import json
+import math
+import threading
+from datetime import datetime
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from core.config import env
+from core.tenants import DEFAULT_USER, TOKEN_HEADER, USER_HEADER, authenticate
+from tools.tenants import TenantStores
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+FIELDS = {"id", "title", "amount", "category", "date", "note"}
+SEARCH_MODES = ("substring", "ranked")
+DEFAULT_SEARCH_LIMIT = 10
+
+
+def _validate(data) -> str:
+    if not isinstance(data, dict):
+        return "Expected a JSON object"
+    missing = [key for key in ("title", "amount", "category") if key not in data]
+    if missing:
+        return f"Missing fields: {', '.join(missing)}"
+    # checked before the store sees them: a bad value fails halfway through its indexes
+    amount = data["amount"]
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not math.isfinite(amount):
+        return "amount must be a number"
+    wrong = [key for key in ("title", "category", "note") if not isinstance(data.get(key, ""), str)]
+    if wrong:
+        return f"Must be strings: {', '.join(wrong)}"
+    if data.get("date") is not None:
+        try:
+            datetime.strptime(data["date"], "%Y-%m-%d")
+        except (TypeError, ValueError):
+            return "date must be YYYY-MM-DD"
+    return None
+
+
+def _search_options(options: dict) -> tuple:
+    """(mode, limit, prefix) of a search request, ValueError when they're invalid."""
+    mode = options.get("mode") or "substring"
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+    try:
+        limit = min(int(options.get("limit") or DEFAULT_SEARCH_LIMIT), MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer") from None
+    prefix = str(options.get("prefix", "1")).lower() not in ("0", "false")
+    return mode, limit, prefix
+
+
+def _search(store, title: str, mode: str, limit: int, prefix: bool) -> list:
+    # "substring": every title containing `title`; "ranked": the best `limit` fuzzy matches
+    if mode == "ranked":
+        return store.search(title, limit, prefix)
+    return store.search_title(title)
+
+
+def _expense_fields(data: dict) -> dict:
+    return {
+        "amount": data["amount"],
+        "category": data["category"],
+        "date": data.get("date"),
+        "note": data.get("note", ""),
+        "title": data["title"],
+    }
+
+
+class ExpenseAPIHandler(BaseHTTPRequestHandler):
+    server_version = "ExpenseAPI/0.1"
+    protocol_version = "HTTP/1.1"  # keep-alive, matches the pooled client
+
+    # -- helpers ----------------------------------------------------------
+
+    def _send(self, status: int, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _tenant(self):
+        """
+        (read, write) running a `fn(store)` on the caller's store, ValueError
+        for a bad user id, PermissionError for a bad token.
+        """
+        user = authenticate(self.headers.get(USER_HEADER), self.headers.get(TOKEN_HEADER))
+        tenants = self.server.tenants
+        return partial(tenants.read, user), partial(tenants.write, user)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    # -- routes -----------------------------------------------------------
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            read, write = self._tenant()
+        except PermissionError as e:
+            return self._send(401, {"error": str(e)})
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+
+        if url.path == "/api/expenses":
+            if not query:
+                # no paging or filters: the whole table, as before
+                return self._send(200, read(lambda store: store.read()))
+
+            try:
+                limit = min(int(query.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+                offset = max(int(query.get("offset", 0)), 0)
+            except ValueError:
+                return self._send(400, {"error": "limit and offset must be integers"})
+
+            fields = [f for f in query.get("fields", "").split(",") if f]
+            unknown = set(fields) - FIELDS
+            if unknown:
+                return self._send(400, {"error": f"Unknown fields: {', '.join(sorted(unknown))}"})
+
+            rows, total = read(
+                lambda store: store.query(
+                    query.get("category"), query.get("start_date"), query.get("end_date"), limit, offset
+                )
+            )
+            if fields:
+                rows = [{f: row[f] for f in fields} for row in rows]
+
+            next_offset = offset + len(rows) if offset + len(rows) < total else None
+            return self._send(200, {"data": rows, "total": total, "next_offset": next_offset})
+
+        if url.path == "/api/expenses/summary":
+            group_by = query.get("group_by", "category")
+            if group_by not in ("category", "month"):
+                return self._send(400, {"error": "group_by must be 'category' or 'month'"})
+
+            groups = read(
+                lambda store: store.summary(
+                    group_by, query.get("category"), query.get("start_date"), query.get("end_date")
+                )
+            )
+            for group in groups:
+                group["total"] = round(group["total"], 2)
+            return self._send(
+                200,
+                {
+                    "group_by": group_by,
+                    "groups": groups,
+                    "total": round(sum(g["total"] for g in groups), 2),
+                    "count": sum(g["count"] for g in groups),
+                },
+            )
+
+        if url.path == "/api/expenses/spending":
+            try:
+                spending = read(
+                    lambda store: store.spending(
+                        query.get("period", "month"), query.get("date"), query.get("category")
+                    )
+                )
+            except ValueError as e:
+                return self._send(400, {"error": str(e)})
+            return self._send(200, spending)
+
+        if url.path == "/api/expenses/search":
+            try:
+                options = _search_options(query)
+            except ValueError as e:
+                return self._send(400, {"error": str(e)})
+            return self._send(200, read(lambda store: _search(store, query.get("title", ""), *options)))
+
+        self._send(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            read, write = self._tenant()
+        except PermissionError as e:
+            return self._send(401, {"error": str(e)})
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+
+        try:
+            data = self._read_json()
+        except json.JSONDecodeError:
+            return self._send(400, {"error": "Invalid JSON body"})
+
+        if url.path == "/api/expenses":
+            error = _validate(data)
+            if error:
+                return self._send(400, {"error": error})
+
+            expense = write(lambda store: store.add(**_expense_fields(data)))
+            return self._send(201, expense)
+
+        if url.path == "/api/expenses/bulk":
+            expenses = data.get("expenses")
+            if not isinstance(expenses, list):
+                return self._send(400, {"error": "Expected a list in 'expenses'"})
+            for i, item in enumerate(expenses):
+                error = _validate(item)
+                if error:
+                    return self._send(400, {"error": f"expenses[{i}]: {error}"})
+
+            # one transaction for the whole list
+            created = write(lambda store: store.add_many([_expense_fields(item) for item in expenses]))
+            return self._send(201, created)
+
+        if url.path == "/api/expenses/search/bulk":
+            titles = data.get("titles")
+            if not isinstance(titles, list):
+                return self._send(400, {"error": "Expected a list in 'titles'"})
+
+            try:
+                options = _search_options(data)
+            except ValueError as e:
+                return self._send(400, {"error": str(e)})
+            matches = read(lambda store: {title: _search(store, str(title), *options) for title in titles})
+            return self._send(200, matches)
+
+        self._send(404, {"error": "Not found"})
+
+
+def make_server(
+    host: str = "127.0.0.1", port: int = 3030, store=None, quiet: bool = False, tenants: TenantStores = None
+):
+    """
+    Builds the API server, bound but not yet serving (use `port=0` for a free port).
+
+    `store`, when given, is the default user's store.
+    """
+    server = ThreadingHTTPServer((host, port), ExpenseAPIHandler)
+    server.daemon_threads = True
+    server.tenants = tenants or TenantStores.from_env()
+    if store is not None:
+        server.tenants.store(DEFAULT_USER, store)
+    server.quiet = quiet
+    return server
+
+
+def serve_in_background(**kwargs):
+    """Starts the API server on a daemon thread and returns it (handy for tests/benchmarks)."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local expense API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3030)
+    parser.add_argument("--store", choices=["memory", "sqlite", "columnar"], default=None)
+    parser.add_argument("--db", default=None, help="SQLite file of the default user for --store sqlite")
+    parser.add_argument("--db-dir", default=None, help="directory for the other users' SQLite files")
+    parser.add_argument(
+        "--shards", type=int, default=int(env("EXPENSE_SHARDS", "4")), help="store shards, each with its own writer"
+    )
+    args = parser.parse_args()
+
+    tenants = TenantStores(args.shards, args.store, args.db, args.db_dir)
+    server = make_server(args.host, args.port, tenants=tenants)
+    print(f"Expense API listening on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.tenants.close()
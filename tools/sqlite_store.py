@@ -0,0 +1,390 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from tools.aggregates import period_key, period_keys, summarize
+from tools.search import SearchIndex
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL DEFAULT '',
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    date TEXT NOT NULL,
+    note TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date);
+CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS spending (
+    period TEXT NOT NULL,
+    key TEXT NOT NULL,
+    category TEXT NOT NULL COLLATE NOCASE,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (period, key, category)
+);
+-- every row a write touches, whoever makes it, so each process's search index can catch up
+CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, id INTEGER NOT NULL);
+CREATE TRIGGER IF NOT EXISTS expenses_inserted AFTER INSERT ON expenses
+BEGIN INSERT INTO changes (id) VALUES (new.id); END;
+CREATE TRIGGER IF NOT EXISTS expenses_updated AFTER UPDATE ON expenses
+BEGIN INSERT INTO changes (id) VALUES (new.id); END;
+CREATE TRIGGER IF NOT EXISTS expenses_deleted AFTER DELETE ON expenses
+BEGIN INSERT INTO changes (id) VALUES (old.id); END;
+"""
+
+COLUMNS = "id, title, amount, category, date, note"
+
+# Statements are kept as constants so sqlite3's statement cache reuses the
+# prepared form across calls.
+INSERT = "INSERT INTO expenses (title, amount, category, date, note) VALUES (?, ?, ?, ?, ?)"
+SELECT_ONE = f"SELECT {COLUMNS} FROM expenses WHERE id = ?"
+SELECT_ALL = f"SELECT {COLUMNS} FROM expenses ORDER BY id"
+UPDATE = """
+UPDATE expenses SET
+    title = COALESCE(?, title),
+    amount = COALESCE(?, amount),
+    category = COALESCE(?, category),
+    date = COALESCE(?, date),
+    note = COALESCE(?, note)
+WHERE id = ?
+"""
+DELETE = "DELETE FROM expenses WHERE id = ?"
+SEARCH_TITLE = f"SELECT {COLUMNS} FROM expenses WHERE instr(lower(title), ?) > 0 ORDER BY id"
+IDS_IN_RANGE = "SELECT id FROM expenses WHERE date BETWEEN ? AND ?"
+BY_CATEGORY = f"SELECT {COLUMNS} FROM expenses WHERE category = ? COLLATE NOCASE ORDER BY id"
+# running totals in `spending`, maintained next to every write (see tools/aggregates.py)
+ADD_SPENDING = """
+INSERT INTO spending (period, key, category, total, count) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (period, key, category) DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+"""
+DROP_EMPTY_SPENDING = "DELETE FROM spending WHERE count <= 0"
+SPENDING = "SELECT category, total, count FROM spending WHERE period = ? AND key = ?"
+CHANGE_RANGE = "SELECT COALESCE(MAX(seq), 0), COALESCE(MIN(seq), 1) FROM changes"
+CHANGED_SINCE = "SELECT DISTINCT id FROM changes WHERE seq > ?"
+PRUNE_CHANGES = "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?"
+
+KEEP_CHANGES = 100_000  # an index further behind than this is rebuilt
+MAX_CATCH_UP = 10_000  # changed rows applied one by one, above that the index is rebuilt
+
+
+def _row_to_dict(row) -> dict:
+    return {
+        "id": str(row[0]),
+        "title": row[1],
+        "amount": row[2],
+        "category": row[3],
+        "date": row[4],
+        "note": row[5],
+    }
+
+
+class SQLiteExpenseStore:
+    """
+    SQLite expense store, same interface as `tools.store.ExpenseStore`.
+
+    The database runs in WAL mode so readers never block the writer and a
+    crash mid-write can't corrupt committed rows. Each thread gets its own
+    connection; ids come from AUTOINCREMENT so concurrent sessions can't
+    hand out the same id.
+
+    Every write commits on its own unless it runs inside `batch()`, which
+    coalesces all writes of the block into one transaction. The `spending`
+    totals are updated in the same transaction as the write they count.
+
+    The ranked `search()` index lives in memory: it's built from the table
+    on the first search and, before every search, catches up with the rows
+    in `changes` (filled by triggers, so writes from other processes on the
+    same file count too). Hits are read back from the table so a rolled-back
+    row never shows up.
+    """
+
+    thread_safe = True
+    optimistic_reads = False
+
+    def __init__(self, path: str = "expenses.db", timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []  # of every thread, for close()
+        self._connections_lock = threading.Lock()
+        self._search = None
+        self._search_seq = 0  # last row of `changes` the index has seen
+        self._search_lock = threading.Lock()
+
+        self._connect().executescript(SCHEMA)
+        self._backfill()
+        self._connect().execute(PRUNE_CHANGES, (KEEP_CHANGES,))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit mode, transactions are opened explicitly below
+            # used by its own thread only, but closed by whichever thread calls close()
+            conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None, cached_statements=64, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        if self._local.depth:
+            # already inside batch(), the outer block commits
+            yield conn
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    @contextmanager
+    def batch(self):
+        """Runs every write inside the block in a single transaction."""
+        with self._transaction():
+            self._local.depth += 1
+            try:
+                yield self
+            finally:
+                self._local.depth -= 1
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def _count(self, conn, expense: dict, sign: int = 1):
+        conn.executemany(
+            ADD_SPENDING,
+            [
+                (period, key, expense["category"], sign * expense["amount"], sign)
+                for period, key in period_keys(expense["date"]).items()
+            ],
+        )
+        if sign < 0:
+            conn.execute(DROP_EMPTY_SPENDING)
+
+    def _backfill(self):
+        """Builds the totals for a database written before `spending` existed."""
+        if self._connect().execute("SELECT 1 FROM spending LIMIT 1").fetchone() or not len(self):
+            return
+        with self._transaction() as conn:
+            for row in conn.execute(SELECT_ALL).fetchall():
+                self._count(conn, _row_to_dict(row))
+
+    # -- operations -------------------------------------------------------
+
+    def add(
+        self, amount: float, category: str, date: str = None, note: str = "", title: str = ""
+    ) -> dict:
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")  # Default to today's date
+
+        expense = {"title": title, "amount": amount, "category": category, "date": date, "note": note}
+        with self._transaction() as conn:
+            cursor = conn.execute(INSERT, (title, amount, category, date, note))
+            self._count(conn, expense)
+
+        return {"id": str(cursor.lastrowid), **expense}
+
+    def add_many(self, expenses: list) -> list:
+        """Adds the expenses in one transaction, with one `spending` upsert per bucket instead of per row."""
+        today = datetime.now().strftime("%Y-%m-%d")
+        created = []
+        totals = {}  # (period, key, lower-cased category) -> [category, total, count]
+        with self._transaction() as conn:
+            for expense in expenses:
+                date = expense.get("date")
+                expense = {
+                    "title": expense.get("title", ""),
+                    "amount": expense["amount"],
+                    "category": expense["category"],
+                    "date": today if date is None else date,
+                    "note": expense.get("note", ""),
+                }
+                cursor = conn.execute(INSERT, tuple(expense.values()))
+                created.append({"id": str(cursor.lastrowid), **expense})
+                for period, key in period_keys(expense["date"]).items():
+                    bucket = totals.setdefault((period, key, expense["category"].lower()), [expense["category"], 0.0, 0])
+                    bucket[1] += expense["amount"]
+                    bucket[2] += 1
+            conn.executemany(
+                ADD_SPENDING,
+                [(period, key, category, total, n) for (period, key, _), (category, total, n) in totals.items()],
+            )
+            conn.execute(PRUNE_CHANGES, (KEEP_CHANGES,))
+        return created
+
+    def get(self, expense_id: str):
+        row = self._connect().execute(SELECT_ONE, (expense_id,)).fetchone()
+        return _row_to_dict(row) if row else None
+
+    def update(self, expense_id: str, **fields) -> dict:
+        """Applies the non-None fields to an expense, returns None if it doesn't exist."""
+        params = (
+            fields.get("title"),
+            fields.get("amount"),
+            fields.get("category"),
+            fields.get("date"),
+            fields.get("note"),
+            expense_id,
+        )
+        with self._transaction() as conn:
+            old = conn.execute(SELECT_ONE, (expense_id,)).fetchone()
+            if old is None:
+                return None
+            conn.execute(UPDATE, params)
+            row = conn.execute(SELECT_ONE, (expense_id,)).fetchone()
+            self._count(conn, _row_to_dict(old), -1)
+            self._count(conn, _row_to_dict(row))
+        return _row_to_dict(row)
+
+    def delete(self, expense_id: str) -> bool:
+        with self._transaction() as conn:
+            row = conn.execute(SELECT_ONE, (expense_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute(DELETE, (expense_id,))
+            self._count(conn, _row_to_dict(row), -1)
+        return True
+
+    def by_category(self, category: str) -> list:
+        rows = self._connect().execute(BY_CATEGORY, (category,))
+        return [_row_to_dict(row) for row in rows]
+
+    def read(self, filter: str = None, date_range: tuple = None) -> list:
+        """Returns expenses matching the keyword filter and date range, in insertion order."""
+        if not filter and not date_range:
+            rows = self._connect().execute(SELECT_ALL)
+            return [_row_to_dict(row) for row in rows]
+
+        where, params = [], []
+        if filter:
+            where.append("(instr(lower(category), ?) > 0 OR instr(lower(note), ?) > 0)")
+            params += [filter.lower(), filter.lower()]
+        if date_range:
+            where.append("date BETWEEN ? AND ?")
+            params += list(date_range)
+
+        sql = f"SELECT {COLUMNS} FROM expenses WHERE {' AND '.join(where)} ORDER BY id"
+        return [_row_to_dict(row) for row in self._connect().execute(sql, params)]
+
+    @staticmethod
+    def _where(category=None, start_date=None, end_date=None) -> tuple:
+        where, params = [], []
+        if category:
+            where.append("category = ? COLLATE NOCASE")
+            params.append(category)
+        if start_date:
+            where.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            where.append("date <= ?")
+            params.append(end_date)
+        return (f"WHERE {' AND '.join(where)}" if where else ""), params
+
+    def query(
+        self,
+        category: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        limit: int = None,
+        offset: int = 0,
+    ) -> tuple:
+        """Returns (page of expenses, total matches) for exact filters, in insertion order."""
+        where, params = self._where(category, start_date, end_date)
+        conn = self._connect()
+
+        total = conn.execute(f"SELECT COUNT(*) FROM expenses {where}", params).fetchone()[0]
+        sql = f"SELECT {COLUMNS} FROM expenses {where} ORDER BY id LIMIT ? OFFSET ?"
+        rows = conn.execute(sql, [*params, -1 if limit is None else limit, offset])
+        return [_row_to_dict(row) for row in rows], total
+
+    def summary(
+        self, group_by: str = "category", category: str = None, start_date: str = None, end_date: str = None
+    ) -> list:
+        """Returns [{"key", "total", "count"}] grouped by "category" or "month"."""
+        key = "category" if group_by == "category" else "substr(date, 1, 7)"
+        where, params = self._where(category, start_date, end_date)
+        sql = f"SELECT {key} AS key, SUM(amount), COUNT(*) FROM expenses {where} GROUP BY key ORDER BY key"
+        return [
+            {"key": row[0], "total": row[1], "count": row[2]}
+            for row in self._connect().execute(sql, params)
+        ]
+
+    def spending(self, period: str = "month", date: str = None, category: str = None) -> dict:
+        """Totals of the `period` containing `date`, read from the `spending` table."""
+        key = period_key(period, date)
+        rows = self._connect().execute(SPENDING, (period, key))
+        groups = [{"category": row[0], "total": row[1], "count": row[2]} for row in rows]
+        return summarize(period, key, groups, category)
+
+    def search_title(self, title: str) -> list:
+        rows = self._connect().execute(SEARCH_TITLE, (title.lower(),))
+        return [_row_to_dict(row) for row in rows]
+
+    def _sync_index(self, conn):
+        """Brings the search index up to date with `changes`, builds it on first use. Needs `_search_lock`."""
+        snapshot = not conn.in_transaction  # inside batch() the open transaction already is one
+        if snapshot:
+            conn.execute("BEGIN")
+        try:
+            last, first = conn.execute(CHANGE_RANGE).fetchone()
+            if last == self._search_seq and self._search is not None:
+                return
+            ids = [] if self._search is None else [row[0] for row in conn.execute(CHANGED_SINCE, (self._search_seq,))]
+            if self._search is None or self._search_seq < first - 1 or len(ids) > MAX_CATCH_UP:
+                rows = conn.execute(SELECT_ALL)
+                self._search = SearchIndex.build((row[0], _row_to_dict(row)) for row in rows)
+            else:
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start : start + 500]
+                    sql = f"SELECT {COLUMNS} FROM expenses WHERE id IN ({', '.join('?' * len(chunk))})"
+                    rows = {row[0]: row for row in conn.execute(sql, chunk)}
+                    for expense_id in chunk:
+                        if expense_id in rows:
+                            self._search.add(expense_id, _row_to_dict(rows[expense_id]))
+                        else:
+                            self._search.remove(expense_id)
+            self._search_seq = last
+        finally:
+            if snapshot:
+                conn.execute("COMMIT")
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True, date_range: tuple = None) -> list:
+        """Best `limit` matches for `query` in title/category/note, typos allowed, each with its "score"."""
+        allowed = None
+        if date_range:
+            rows = self._connect().execute(IDS_IN_RANGE, date_range)
+            allowed = {row[0] for row in rows}
+        with self._search_lock:
+            self._sync_index(self._connect())
+            hits = self._search.search(query, limit, prefix, int, allowed)
+        if not hits:
+            return []
+
+        sql = f"SELECT {COLUMNS} FROM expenses WHERE id IN ({', '.join('?' * len(hits))})"
+        rows = {row[0]: _row_to_dict(row) for row in self._connect().execute(sql, [i for i, _ in hits])}
+        return [{**rows[i], "score": round(score, 3)} for i, score in hits if i in rows]
+
+    def close(self):
+        """Closes the connections of every thread, a later call opens new ones."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
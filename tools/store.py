@@ -0,0 +1,278 @@
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from datetime import datetime
+
+from core.config import env
+from tools.aggregates import SpendingAggregates, period_key, summarize
+from tools.search import SearchIndex
+
+
+def _tokens(text: str) -> set:
+    return set(text.lower().split())
+
+
+class ExpenseStore:
+    """
+    In-memory expense store with indexes for the chatbot tools.
+
+    - `_rows`: hash index, expense id -> expense dict (keeps insertion order)
+    - `_dates`: sorted list of (date, seq, id) for range queries with bisect
+    - `_categories`: lower-cased category -> set of ids
+    - `_tokens`: whitespace token of category/note -> set of ids
+    - `aggregates`: running totals per period and category (tools/aggregates.py)
+    - `_search`: ranked fuzzy search index (tools/search.py), built on the first `search()`
+
+    Keyword filters keep the old substring semantics: every word of the
+    filter has to be a substring of some indexed token, so only the token
+    vocabulary is scanned and the matching rows are checked afterwards.
+
+    Not thread-safe, callers sharing it across threads need their own lock.
+    Writes never change a row dict that was handed out (updates replace it),
+    so readers can run next to a single writer and retry when they overlap
+    one (`optimistic_reads`, see tools/tenants.py).
+    """
+
+    thread_safe = False
+    optimistic_reads = True
+
+    def __init__(self):
+        self._rows = {}
+        self._seq = {}
+        self._dates = []
+        self._categories = {}
+        self._tokens = {}
+        self.aggregates = SpendingAggregates()
+        self._search = None
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self._rows)
+
+    # -- indexing ---------------------------------------------------------
+
+    def _index(self, expense: dict):
+        expense_id = expense["id"]
+        insort(self._dates, (expense["date"], self._seq[expense_id], expense_id))
+        self._categories.setdefault(expense["category"].lower(), set()).add(expense_id)
+        for token in _tokens(expense["category"]) | _tokens(expense["note"]):
+            self._tokens.setdefault(token, set()).add(expense_id)
+        self.aggregates.add(expense)
+        if self._search is not None:
+            self._search.add(expense_id, expense)
+
+    def _unindex(self, expense: dict):
+        expense_id = expense["id"]
+        key = (expense["date"], self._seq[expense_id], expense_id)
+        i = bisect_left(self._dates, key)
+        if i < len(self._dates) and self._dates[i] == key:
+            del self._dates[i]
+
+        category = expense["category"].lower()
+        self._discard(self._categories, category, expense_id)
+        for token in _tokens(expense["category"]) | _tokens(expense["note"]):
+            self._discard(self._tokens, token, expense_id)
+        self.aggregates.remove(expense)
+        if self._search is not None:
+            self._search.remove(expense_id)
+
+    @staticmethod
+    def _discard(index: dict, key: str, expense_id: str):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(expense_id)
+            if not ids:
+                del index[key]
+
+    # -- operations -------------------------------------------------------
+
+    def add(
+        self, amount: float, category: str, date: str = None, note: str = "", title: str = ""
+    ) -> dict:
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")  # Default to today's date
+
+        expense = {
+            "id": str(self._next_id),
+            "title": title,
+            "amount": amount,
+            "category": category,
+            "date": date,
+            "note": note,
+        }
+        self._seq[expense["id"]] = self._next_id
+        self._next_id += 1
+
+        self._rows[expense["id"]] = expense
+        self._index(expense)
+        return expense
+
+    def get(self, expense_id: str):
+        return self._rows.get(expense_id)
+
+    def update(self, expense_id: str, **fields) -> dict:
+        """Applies the non-None fields to an expense, returns None if it doesn't exist."""
+        expense = self._rows.get(expense_id)
+        if expense is None:
+            return None
+
+        changes = {k: v for k, v in fields.items() if v is not None}
+        self._unindex(expense)
+        expense = self._rows[expense_id] = {**expense, **changes}
+        self._index(expense)
+        return expense
+
+    def delete(self, expense_id: str) -> bool:
+        expense = self._rows.pop(expense_id, None)
+        if expense is None:
+            return False
+        self._unindex(expense)
+        del self._seq[expense_id]
+        return True
+
+    def add_many(self, expenses: list) -> list:
+        return [self.add(**expense) for expense in expenses]
+
+    @contextmanager
+    def batch(self):
+        # nothing to coalesce in memory, kept for parity with SQLiteExpenseStore
+        yield self
+
+    def close(self):
+        pass
+
+    def by_category(self, category: str) -> list:
+        ids = self._categories.get(category.lower(), ())
+        return self._ordered(ids)
+
+    def read(self, filter: str = None, date_range: tuple = None) -> list:
+        """Returns expenses matching the keyword filter and date range, in insertion order."""
+        if not filter and not date_range:
+            return list(self._rows.values())
+
+        ids = None
+        if filter:
+            ids = self._match_keyword(filter.lower())
+        if date_range:
+            in_range = self._match_dates(*date_range)
+            ids = in_range if ids is None else ids & in_range
+
+        return self._ordered(ids)
+
+    def query(
+        self,
+        category: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        limit: int = None,
+        offset: int = 0,
+    ) -> tuple:
+        """Returns (page of expenses, total matches) for exact filters, in insertion order."""
+        ids = None
+        if category:
+            ids = set(self._categories.get(category.lower(), ()))
+        if start_date or end_date:
+            in_range = self._match_dates(start_date or "", end_date or "\uffff")
+            ids = in_range if ids is None else ids & in_range
+
+        rows = list(self._rows.values()) if ids is None else self._ordered(ids)
+        end = None if limit is None else offset + limit
+        return rows[offset:end], len(rows)
+
+    def summary(
+        self, group_by: str = "category", category: str = None, start_date: str = None, end_date: str = None
+    ) -> list:
+        """Returns [{"key", "total", "count"}] grouped by "category" or "month"."""
+        rows, _ = self.query(category, start_date, end_date)
+        groups = {}
+        for exp in rows:
+            key = exp["category"] if group_by == "category" else exp["date"][:7]
+            group = groups.setdefault(key, {"key": key, "total": 0.0, "count": 0})
+            group["total"] += exp["amount"]
+            group["count"] += 1
+        return sorted(groups.values(), key=lambda g: g["key"])
+
+    def spending(self, period: str = "month", date: str = None, category: str = None) -> dict:
+        """Totals of the `period` containing `date`, from the running aggregates."""
+        key = period_key(period, date)
+        return summarize(period, key, self.aggregates.groups(period, key), category)
+
+    def search_title(self, title: str) -> list:
+        needle = title.lower()
+        return [exp for exp in self._rows.values() if needle in exp["title"].lower()]
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True, date_range: tuple = None) -> list:
+        """Best `limit` matches for `query` in title/category/note, typos allowed, each with its "score"."""
+        if self._search is None:
+            # kept up to date by _index/_unindex from here on
+            self._search = SearchIndex.build(self._rows.items())
+        allowed = self._match_dates(*date_range) if date_range else None
+        hits = self._search.search(query, limit, prefix, self._seq.__getitem__, allowed)
+        return [{**self._rows[expense_id], "score": round(score, 3)} for expense_id, score in hits]
+
+    # -- lookups ----------------------------------------------------------
+
+    def _match_keyword(self, needle: str) -> set:
+        words = needle.split()
+        if not words:
+            # whitespace-only filter, fall back to a plain scan
+            return {
+                exp["id"]
+                for exp in self._rows.values()
+                if needle in exp["category"].lower() or needle in exp["note"].lower()
+            }
+
+        candidates = None
+        for word in words:
+            ids = set()
+            for token, postings in self._tokens.items():
+                if word in token:
+                    ids |= postings
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+
+        if len(words) == 1 and needle == words[0]:
+            return set(candidates)
+
+        # multi-word filters can match across fields, check the real text
+        return {
+            expense_id
+            for expense_id in candidates
+            if needle in self._rows[expense_id]["category"].lower()
+            or needle in self._rows[expense_id]["note"].lower()
+        }
+
+    def _match_dates(self, start_date: str, end_date: str) -> set:
+        lo = bisect_left(self._dates, (start_date,))
+        hi = bisect_right(self._dates, (end_date, float("inf")))
+        return {expense_id for _, _, expense_id in self._dates[lo:hi]}
+
+    def _ordered(self, ids) -> list:
+        if len(ids) * 8 > len(self._rows):
+            # large result, a membership pass is cheaper than sorting
+            return [exp for key, exp in self._rows.items() if key in ids]
+        return [self._rows[i] for i in sorted(ids, key=self._seq.__getitem__)]
+
+
+def open_store(backend: str = None, path: str = None):
+    """
+    Opens the expense store selected by `backend` or the EXPENSE_STORE env var.
+
+    - "memory" (default): `ExpenseStore`, lost on restart
+    - "sqlite": `SQLiteExpenseStore` at `path` or EXPENSE_DB_PATH (expenses.db)
+    - "columnar": `ColumnarExpenseStore`, in memory at a fraction of the size per row
+    """
+    backend = backend or env("EXPENSE_STORE", "memory")
+
+    if backend == "memory":
+        return ExpenseStore()
+    if backend == "sqlite":
+        from tools.sqlite_store import SQLiteExpenseStore
+
+        return SQLiteExpenseStore(path or env("EXPENSE_DB_PATH", "expenses.db"))
+    if backend == "columnar":
+        from tools.columnar import ColumnarExpenseStore
+
+        return ColumnarExpenseStore()
+
+    raise ValueError(f"Unknown expense store backend: {backend}")
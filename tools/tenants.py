@@ -0,0 +1,200 @@
+"""
+An expense store per user, grouped into shards.
+
+Users are assigned to shards with the consistent-hash ring of
+core/tenants.py. Each shard holds the stores of its users and has
+
+- one writer thread: every write of its users runs there, one at a time,
+  so writers never wait on each other's locks
+- lock-free reads: readers run straight against the store and check a
+  sequence number the writer bumps before and after each write; a read that
+  overlapped a write is run again (a seqlock). SQLite stores are safe to read
+  from any thread anyway, and the columnar store's arrays can't be resized
+  while a reader holds them, so its reads queue behind the writes.
+
+With EXPENSE_STORE=sqlite the default user keeps EXPENSE_DB_PATH and every
+other user gets a file of their own in EXPENSE_DB_DIR. At most
+EXPENSE_MAX_OPEN_STORES (256) of them are kept open, the least recently used
+idle ones are closed and opened again when needed, so thousands of users
+don't hold thousands of WAL connections per pool thread.
+"""
+
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from core.config import env
+from core.tenants import DEFAULT_USER, HashRing
+from tools.store import open_store
+
+
+class Shard:
+    """
+    The stores of a shard's users. With `max_open` set (stores that can be
+    opened again, i.e. SQLite files) the least recently used ones past it
+    are closed once no read or write is using them.
+    """
+
+    def __init__(self, name: str, opener, max_open: int = None):
+        self.name = name
+        self.retries = 0
+        self.evictions = 0
+        self.max_open = max_open
+        self._open = opener
+        self._stores = OrderedDict()  # user id -> store, least recently used first
+        self._pinned = set()  # users whose store was handed in, it can't be opened again
+        self._in_use = Counter()  # user id -> reads and writes running on their store
+        self._lock = threading.Lock()
+        self._seq = 0  # odd while a write is running
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix=f"store-{name}")
+
+    def __len__(self):
+        return len(self._stores)
+
+    def store(self, user_id: str, store=None):
+        """The user's store, opened (or set to `store`) on first use."""
+        with self._lock:
+            found = self._stores.get(user_id)
+        if found is None or store is not None:
+            # on the writer thread, so readers never see a half-built store
+            found = self._writer.submit(self._create, user_id, store).result()
+        return found
+
+    @contextmanager
+    def _using(self, user_id: str):
+        """The user's store, kept open until the block ends."""
+        while True:
+            with self._lock:
+                store = self._stores.get(user_id)
+                if store is not None:
+                    self._stores.move_to_end(user_id)
+                    self._in_use[user_id] += 1
+                    break
+            self.store(user_id)  # evicted again before we got it: reopen
+        try:
+            yield store
+        finally:
+            with self._lock:
+                self._in_use[user_id] -= 1
+                if not self._in_use[user_id]:
+                    del self._in_use[user_id]
+
+    def _create(self, user_id: str, store=None):
+        if store is not None or user_id not in self._stores:
+            if store is not None:
+                self._pinned.add(user_id)
+            else:
+                store = self._open(user_id)
+            # build the lazy search index here: from now on writes keep it
+            # current, reads must never be the ones changing the store
+            store.search("")
+            with self._lock:
+                self._stores[user_id] = store
+                self._stores.move_to_end(user_id)
+        store = self._stores[user_id]
+        self._evict()
+        return store
+
+    def _evict(self):
+        """Closes least recently used idle stores past `max_open`, on the writer thread."""
+        if self.max_open is None:
+            return
+        with self._lock:
+            idle = [user for user in self._stores if user not in self._in_use and user not in self._pinned]
+            closing = [(user, self._stores.pop(user)) for user in idle[: max(len(self._stores) - self.max_open, 0)]]
+        for _, store in closing:
+            store.close()
+        self.evictions += len(closing)
+
+    def read(self, user_id: str, fn):
+        """`fn(store)` without a lock, retried if a write ran meanwhile."""
+        with self._using(user_id) as store:
+            if store.thread_safe:
+                return fn(store)
+            if not store.optimistic_reads:
+                return self._writer.submit(fn, store).result()
+
+            while True:
+                seq = self._seq
+                if seq % 2 == 0:
+                    try:
+                        result = fn(store)
+                    except Exception:
+                        # a half-applied write can break the read, only a clean one may raise
+                        if self._seq == seq:
+                            raise
+                    else:
+                        if self._seq == seq:
+                            return result
+                self.retries += 1
+                time.sleep(0)  # let the writer finish
+
+    def write(self, user_id: str, fn):
+        """`fn(store)` on the shard's writer thread."""
+        with self._using(user_id) as store:
+            return self._writer.submit(self._apply, fn, store).result()
+
+    def _apply(self, fn, store):
+        self._seq += 1
+        try:
+            return fn(store)
+        finally:
+            self._seq += 1
+
+    def close(self):
+        self._writer.shutdown()
+        for store in self._stores.values():
+            store.close()
+
+
+class TenantStores:
+    """The stores of every user, spread over `shards` shards."""
+
+    def __init__(
+        self, shards: int = 4, backend: str = None, path: str = None, directory: str = None, max_open: int = None
+    ):
+        self.backend = backend or env("EXPENSE_STORE", "memory")
+        self.path = path or env("EXPENSE_DB_PATH", "expenses.db")
+        self.directory = directory or env("EXPENSE_DB_DIR", "expenses")
+        # only SQLite stores can be closed and opened again, in-memory ones are all the user has
+        max_open = max_open or int(env("EXPENSE_MAX_OPEN_STORES", "256"))
+        per_shard = -(-max_open // shards) if self.backend == "sqlite" else None
+        self.shards = {name: Shard(name, self._open, per_shard) for name in (f"shard-{i}" for i in range(shards))}
+        self.ring = HashRing(list(self.shards))
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(int(env("EXPENSE_SHARDS", "4")), **kwargs)
+
+    def _open(self, user_id: str):
+        if self.backend != "sqlite":
+            return open_store(self.backend)
+        if user_id == DEFAULT_USER:
+            return open_store("sqlite", self.path)
+        os.makedirs(self.directory, exist_ok=True)
+        return open_store("sqlite", os.path.join(self.directory, f"{user_id}.db"))
+
+    def shard(self, user_id: str) -> Shard:
+        return self.shards[self.ring.shard(user_id)]
+
+    def store(self, user_id: str, store=None):
+        return self.shard(user_id).store(user_id, store)
+
+    def read(self, user_id: str, fn):
+        return self.shard(user_id).read(user_id, fn)
+
+    def write(self, user_id: str, fn):
+        return self.shard(user_id).write(user_id, fn)
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{s.name}: {len(s)} users open ({s.evictions} closed, {s.retries} read retries)"
+            for s in self.shards.values()
+        )
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.close()